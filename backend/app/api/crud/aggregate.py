@@ -0,0 +1,671 @@
+"""Aggregation of the values of time-series tables by time interval.
+
+The values of a table are grouped by time bucket and location with a single
+GROUP BY query: on PostgreSQL, buckets are computed by date_trunc or, for
+multiples of a unit, by date_bin, on sqlite with the equivalent date
+functions. Aggregated series can additionally be downsampled for plotting by
+Largest-Triangle-Three-Buckets (LTTB), which keeps the visual shape of a
+series with a fraction of its points.
+
+Rollups are materialized aggregates of a table by location and time bucket of
+one unit, declared by the rollups of a schema, e.g., daily. They are created
+together with the table and maintained incrementally: the buckets within the
+time range of each chunk loaded by ingest_rows are recomputed from the table,
+see refresh_rollups. Aggregates whose buckets are tiled by the buckets of a
+rollup are read from the coarsest such rollup, see find_rollup, e.g., a year of
+hourly values is aggregated from 365 daily rows per location instead of 8760.
+"""
+
+import math
+import re
+from collections.abc import Mapping, Sequence
+from datetime import UTC, datetime, timedelta
+from itertools import groupby
+from typing import Any
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    ColumnElement,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    Select,
+    Table,
+    cast,
+    delete,
+    func,
+    insert,
+    inspect,
+    literal_column,
+    select,
+    type_coerce,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from sqlmodel import Session
+
+from app.api.crud.query import data_filters, data_table, resolve_time_field
+from app.schema_manager import SchemaManager
+from app.schema_manager.mappings import map_db_types
+from app.schema_manager.schema_manager import sql_identifier
+from app.schema_manager.validator import PARSERS
+
+__all__ = [
+    "AGGREGATE_STATS",
+    "FREQUENCY_INTERVALS",
+    "ROLLUP_UNITS",
+    "aggregate_query",
+    "aggregate_rows",
+    "create_rollups",
+    "find_rollup",
+    "lttb",
+    "parse_interval",
+    "refresh_rollups",
+    "rollup_table",
+]
+
+AGGREGATE_STATS = ("min", "max", "mean", "sum", "count", "last")
+# interval of the buckets by frequency of a time field, see timeFields
+FREQUENCY_INTERVALS = {
+    "minutely": "minute",
+    "quarter-hourly": "15 minutes",
+    "hourly": "hour",
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month",
+    "yearly": "year",
+}
+# approximate length of the units in seconds to compare intervals
+UNIT_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30 * 86400,
+    "year": 365 * 86400,
+}
+# units of which multiples are binned, i.e., units of a fixed length
+BIN_UNITS = ("minute", "hour", "day")
+# truncation of sqlite times to the units
+SQLITE_TRUNC = {
+    "minute": ("strftime", "%Y-%m-%d %H:%M:00"),
+    "hour": ("strftime", "%Y-%m-%d %H:00:00"),
+    "day": ("datetime", "start of day"),
+    "week": ("datetime", "-6 days", "weekday 1", "start of day"),
+    "month": ("datetime", "start of month"),
+    "year": ("datetime", "start of year"),
+}
+# unit of the buckets of a rollup by its interval, see rollups of the schema
+ROLLUP_UNITS = {
+    "hourly": "hour",
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month",
+    "yearly": "year",
+}
+# statistics stored per bucket of a rollup. The mean is sum / count and "last"
+# is the value at "last_time", the latest time of the bucket.
+ROLLUP_STATS = ("min", "max", "sum", "count", "last", "last_time")
+# units of the rollups whose buckets tile the buckets of a unit
+COVERING_UNITS = {
+    "minute": (),
+    "hour": ("hour",),
+    "day": ("hour", "day"),
+    "week": ("hour", "day", "week"),
+    "month": ("hour", "day", "month"),
+    "year": ("hour", "day", "month", "year"),
+}
+_INTERVAL = re.compile(r"(?:(\d+) )?(minute|hour|day|week|month|year)s?")
+
+
+def parse_interval(interval: str) -> tuple[int, str]:
+    """Parse an interval like "day" or "15 minutes"
+
+    Args:
+        interval (str): A unit or a multiple of minutes, hours or days
+
+    Returns:
+        tuple[int, str]: The number of units and the unit
+
+    Raises:
+        ValueError: If the interval is invalid
+    """
+    match = _INTERVAL.fullmatch(interval.strip().lower())
+    if match is None:
+        raise ValueError(
+            f"Invalid interval {interval}. Use one of {list(UNIT_SECONDS)} or "
+            "a multiple of minutes, hours or days, e.g., 15 minutes"
+        )
+    count, unit = int(match.group(1) or 1), match.group(2)
+    if count < 1 or (count > 1 and unit not in BIN_UNITS):
+        raise ValueError(f"Invalid interval {interval}. Only {BIN_UNITS} are binned")
+    return count, unit
+
+
+def time_bucket(
+    time_column: ColumnElement[Any], count: int, unit: str, dialect: str
+) -> ColumnElement[datetime]:
+    """Start of the time bucket of each row
+
+    Args:
+        time_column (ColumnElement[Any]): The datetime or date column
+        count (int): Number of units per bucket
+        unit (str): Unit of the bucket, see parse_interval
+        dialect (str): Database dialect
+
+    Returns:
+        ColumnElement[datetime]: The start of the bucket
+    """
+    if dialect == "postgresql":
+        # count and unit are checked by parse_interval. They are inlined,
+        # i.e., the bucket is the same expression in SELECT and GROUP BY.
+        if count == 1:
+            bucket = func.date_trunc(literal_column(f"'{unit}'"), time_column)
+        else:
+            step: ColumnElement[Any] = literal_column(f"INTERVAL '{count} {unit}s'")
+            origin: ColumnElement[Any] = literal_column("TIMESTAMP '1970-01-01'")
+            bucket = func.date_bin(step, time_column, origin)
+    elif count == 1:
+        name, *arguments = SQLITE_TRUNC[unit]
+        if name == "strftime":
+            bucket = func.strftime(arguments[0], time_column)
+        else:
+            bucket = func.datetime(time_column, *arguments)
+    else:
+        # integer division of the seconds since the epoch
+        seconds = count * UNIT_SECONDS[unit]
+        epoch = cast(func.strftime("%s", time_column), Integer)
+        bucket = func.datetime(epoch // seconds * seconds, "unixepoch")
+    return type_coerce(bucket, DateTime)
+
+
+def _x(value: Any) -> float:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=value.tzinfo or UTC).timestamp()
+    return float(value)
+
+
+def lttb(x: Sequence[float], y: Sequence[float | None], n_out: int) -> list[int]:
+    """Downsample a series by Largest-Triangle-Three-Buckets
+
+    The first and the last point are kept. The points in between are split
+    into n_out - 2 buckets and the point of each bucket is kept that forms the
+    largest triangle with the point kept of the previous bucket and the mean
+    of the next bucket.
+
+    Args:
+        x (Sequence[float]): Ascending x values
+        y (Sequence[float | None]): The y values. Missing values are never kept
+            unless they are the first or the last point.
+        n_out (int): Number of points to keep
+
+    Returns:
+        list[int]: Ascending indexes of the kept points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return list(range(n))
+    ys = [math.nan if v is None else float(v) for v in y]
+    every = (n - 2) / (n_out - 2)
+    kept = [0]
+    a = 0
+    for i in range(n_out - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        following = [j for j in range(end, next_end) if not math.isnan(ys[j])]
+        if following:
+            mean_x = sum(x[j] for j in following) / len(following)
+            mean_y = sum(ys[j] for j in following) / len(following)
+        else:
+            mean_x, mean_y = x[n - 1], ys[n - 1]
+        best, largest = start, -1.0
+        for j in range(start, end):
+            area = abs(
+                (x[a] - mean_x) * (ys[j] - ys[a]) - (x[a] - x[j]) * (mean_y - ys[a])
+            )
+            if area > largest:
+                best, largest = j, area
+        a = best
+        kept.append(a)
+    kept.append(n - 1)
+    return kept
+
+
+def aggregate_query(
+    *,
+    dialect: str,
+    source: Any,
+    filters: Sequence[ColumnElement[bool]],
+    location_fields: Sequence[str],
+    bucket: ColumnElement[Any],
+    measures: Mapping[str, ColumnElement[Any]],
+    latest: ColumnElement[Any],
+    stats: Sequence[str],
+    partial: bool = False,
+) -> Select[Any]:
+    """Select statistics of values grouped by location and time bucket
+
+    Args:
+        dialect (str): Database dialect
+        source (Any): Table of the values
+        filters (Sequence[ColumnElement[bool]]): Conditions on the rows
+        location_fields (Sequence[str]): Names of the location columns
+        bucket (ColumnElement[Any]): Start of the bucket of each row, see
+            time_bucket
+        measures (Mapping[str, ColumnElement[Any]]): Column aggregated by
+            "min", "max", "sum", "count" and "last", i.e., the values or, if
+            partial, the statistics of a rollup
+        latest (ColumnElement[Any]): Time by which "last" is the latest value
+        stats (Sequence[str]): Statistics, see AGGREGATE_STATS, and
+            "last_time", the latest time of a bucket
+        partial (bool): The measures are statistics of finer buckets, see
+            ROLLUP_STATS. Defaults to False.
+
+    Returns:
+        Select[Any]: The locations, the bucket start labelled "bucket" and the
+            statistics ordered by location and bucket
+    """
+    locs = [source.c[name] for name in location_fields]
+    groups: list[ColumnElement[Any]] = [*locs, bucket.label("bucket")]
+    last: ColumnElement[Any] | None = None
+    if "last" in stats and dialect != "postgresql":
+        # the latest value of each bucket by a window over the filtered rows
+        window = func.first_value(measures["last"]).over(
+            partition_by=[*locs, bucket], order_by=latest.desc()
+        )
+        inner = (
+            select(
+                *groups,
+                *(measure.label(f"_{name}") for name, measure in measures.items()),
+                latest.label("_latest"),
+                window.label("_latest_value"),
+            )
+            .where(*filters)
+            .subquery()
+        )
+        source, filters = inner, []
+        groups = [*(inner.c[name] for name in location_fields), inner.c.bucket]
+        measures = {name: inner.c[f"_{name}"] for name in measures}
+        latest = inner.c._latest
+        last = func.max(inner.c._latest_value)
+    elif "last" in stats:
+        last = array_agg(aggregate_order_by(measures["last"], latest.desc()))[1]
+    aggregates: dict[str, Any] = {
+        "min": func.min(measures["min"]),
+        "max": func.max(measures["max"]),
+        "sum": func.sum(measures["sum"]),
+        "last": last,
+        "last_time": func.max(latest),
+    }
+    if partial:
+        count = func.sum(measures["count"])
+        aggregates["count"] = cast(count, BigInteger)
+        aggregates["mean"] = func.sum(measures["sum"]) / cast(
+            func.nullif(count, 0), Float
+        )
+    else:
+        aggregates["count"] = func.count(measures["count"])
+        aggregates["mean"] = func.avg(measures["sum"])
+    return (
+        select(*groups, *(aggregates[s].label(s) for s in stats))
+        .select_from(source)
+        .where(*filters)
+        .group_by(*groups)
+        .order_by(*groups)
+    )
+
+
+def aggregate_rows(
+    *,
+    db: Session,
+    schema: dict[str, Any],
+    interval: str | None = None,
+    stats: Sequence[str] | None = None,
+    time_field: str | None = None,
+    start: Any = None,
+    end: Any = None,
+    locations: Mapping[str, Sequence[Any]] | None = None,
+    points: int | None = None,
+) -> dict[str, Any]:
+    """Aggregate the values of a time-series table by time bucket and location
+
+    The values are read from the coarsest rollup that tiles the buckets, if
+    any, otherwise from the table, see find_rollup.
+
+    Args:
+        db (Session): Database session
+        schema (dict[str, Any]): Schema with a value field and a datetime or
+            date time field
+        interval (str | None): Interval of the buckets, e.g., "day" or
+            "15 minutes", see parse_interval. It must not be shorter than the
+            frequency of the time field. Defaults to None, which uses the
+            frequency of the time field, see FREQUENCY_INTERVALS.
+        stats (Sequence[str] | None): Statistics of the values of a bucket, see
+            AGGREGATE_STATS. "last" is the value with the latest time. Defaults
+            to None, which computes all.
+        time_field (str | None): Time field to bucket. Defaults to None, which
+            uses the main time field.
+        start (Any): Rows from this time on (inclusive). Defaults to None.
+        end (Any): Rows before this time (exclusive). Defaults to None.
+        locations (Mapping[str, Sequence[Any]] | None): Values by location
+            field. Only rows with one of the values are aggregated. Defaults to
+            None.
+        points (int | None): Downsample each location's series to at most this
+            number of buckets by LTTB on the mean, otherwise the first
+            statistic. Defaults to None, which keeps all buckets.
+
+    Returns:
+        dict[str, Any]: The "table", "time_field", "interval" and "unit" of the
+            value field and the "columns", i.e., lists of the bucket starts,
+            the location fields and the statistics ordered by location and time
+
+    Raises:
+        ValueError: If the schema has no value field, the time field is not a
+            datetime or date field or the interval or the statistics are invalid
+    """
+    value_field = (schema.get("valueField") or {}).get("field")
+    if value_field is None:
+        raise ValueError("Only tables with a value field are aggregated")
+    time_field = resolve_time_field(schema, time_field)
+    by_name = {f["name"]: f for f in schema["fields"]}
+    if by_name[time_field]["type"] not in ("datetime", "date"):
+        raise ValueError("Only datetime and date fields are aggregated")
+    frequency = next(
+        t.get("frequency")
+        for t in schema.get("timeFields") or []
+        if t["field"] == time_field
+    )
+    interval = interval or FREQUENCY_INTERVALS.get(frequency or "", "day")
+    count, unit = parse_interval(interval)
+    if minimum := FREQUENCY_INTERVALS.get(frequency or ""):
+        shortest, shortest_unit = parse_interval(minimum)
+        if count * UNIT_SECONDS[unit] < shortest * UNIT_SECONDS[shortest_unit]:
+            raise ValueError(f"Interval must not be shorter than {minimum}")
+    stats = list(stats or AGGREGATE_STATS)
+    if unknown := [s for s in stats if s not in AGGREGATE_STATS]:
+        raise ValueError(f"Unknown statistics {unknown}. Use {AGGREGATE_STATS}")
+
+    dialect = db.get_bind().dialect.name
+    location_fields = [loc["field"] for loc in schema.get("locationFields") or []]
+    rollup = None
+    if time_field == SchemaManager.main_time_field(schema):
+        rollup = find_rollup(db, schema, count, unit, start=start, end=end)
+    source: Any
+    if rollup is None:
+        source = data_table(db, schema)
+        value: ColumnElement[Any] = cast(source.c[value_field], Float)
+        measures = dict.fromkeys(("min", "max", "sum", "count", "last"), value)
+        latest = source.c[time_field]
+    else:
+        source = rollup
+        measures = {name: rollup.c[name] for name in ROLLUP_STATS[:-1]}
+        latest = rollup.c.last_time
+    filters = data_filters(
+        schema, source, time_field=time_field, start=start, end=end, locations=locations
+    )
+    query = aggregate_query(
+        dialect=dialect,
+        source=source,
+        filters=filters,
+        location_fields=location_fields,
+        bucket=time_bucket(source.c[time_field], count, unit, dialect),
+        measures=measures,
+        latest=latest,
+        stats=stats,
+        partial=rollup is not None,
+    )
+    rows = db.connection().execute(query).all()
+    if points is not None:
+        y = len(location_fields) + 1 + (stats.index("mean") if "mean" in stats else 0)
+        downsampled = []
+        for _, series in groupby(rows, key=lambda row: row[: len(location_fields)]):
+            part = list(series)
+            kept = lttb(
+                [_x(r[len(location_fields)]) for r in part],
+                [r[y] for r in part],
+                points,
+            )
+            downsampled += [part[i] for i in kept]
+        rows = downsampled
+    names = [*location_fields, time_field, *stats]
+    return {
+        "table": schema["name"],
+        "time_field": time_field,
+        "interval": interval,
+        "unit": schema["valueField"].get("unit"),
+        "columns": {name: [row[i] for row in rows] for i, name in enumerate(names)},
+    }
+
+
+def rollup_units(schema: dict[str, Any]) -> list[str]:
+    """Units of the buckets of the rollups of a schema, see ROLLUP_UNITS"""
+    return [ROLLUP_UNITS[interval] for interval in schema.get("rollups") or []]
+
+
+def rollup_table(
+    schema: dict[str, Any],
+    unit: str,
+    dialect: str,
+    metadata: MetaData | None = None,
+) -> Table:
+    """Table of a rollup of a schema
+
+    The rollup has the location fields, the start of the bucket named like
+    the main time field and the statistics, see ROLLUP_STATS.
+
+    Args:
+        schema (dict[str, Any]): Schema with rollups
+        unit (str): Unit of the buckets
+        dialect (str): Database dialect
+        metadata (MetaData | None): Metadata the table is defined in. Defaults
+            to None, which uses a new metadata.
+
+    Returns:
+        Table: The table named {table}_rollup_{unit}
+    """
+    db_types: dict[str, Any] = map_db_types[dialect]  # type: ignore[index, assignment]
+    by_name = {f["name"]: f for f in schema["fields"]}
+    location_fields = [loc["field"] for loc in schema.get("locationFields") or []]
+    time_field = SchemaManager.main_time_field(schema) or ""
+    name = sql_identifier(schema["name"], "rollup", unit)
+    return Table(
+        name,
+        metadata if metadata is not None else MetaData(),
+        *(Column(f, db_types[by_name[f]["type"]]) for f in location_fields),
+        Column(time_field, DateTime, nullable=False),
+        Column("min", Float),
+        Column("max", Float),
+        Column("sum", Float),
+        Column("count", BigInteger, nullable=False),
+        Column("last", Float),
+        Column("last_time", DateTime),
+        # buckets are replaced by location and time, see refresh_rollups
+        Index(sql_identifier(name, "idx"), time_field, *location_fields, unique=True),
+    )
+
+
+def _truncate(value: datetime, unit: str) -> datetime:
+    """Start of the bucket of a time, like time_bucket"""
+    value = value.replace(second=0, microsecond=0)
+    if unit == "minute":
+        return value
+    value = value.replace(minute=0)
+    if unit == "hour":
+        return value
+    value = value.replace(hour=0)
+    if unit == "day":
+        return value
+    if unit == "week":
+        return value - timedelta(days=value.weekday())
+    value = value.replace(day=1)
+    return value if unit == "month" else value.replace(month=1)
+
+
+def _next_bucket(value: datetime, unit: str) -> datetime:
+    """Start of the bucket after the one starting at value"""
+    if unit == "month":
+        return (value + timedelta(days=32)).replace(day=1)
+    if unit == "year":
+        return value.replace(year=value.year + 1)
+    return value + timedelta(seconds=UNIT_SECONDS[unit])
+
+
+def create_rollups(db: Session, schema: dict[str, Any]) -> list[str]:
+    """Create the missing rollups of a schema and compute them from its table
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        schema (dict[str, Any]): Schema with rollups. Its table must exist.
+
+    Returns:
+        list[str]: Names of the created rollups
+    """
+    dialect = db.get_bind().dialect.name
+    existing = set(inspect(db.connection()).get_table_names())
+    created = []
+    for unit in rollup_units(schema):
+        rollup = rollup_table(schema, unit, dialect)
+        if rollup.name in existing:
+            continue
+        rollup.create(bind=db.connection())
+        refresh_rollups(db, schema, units=[unit])
+        created.append(rollup.name)
+    return created
+
+
+def lock_rollups(db: Session, table_name: str) -> None:
+    """Serialize the refreshes of the rollups of a table until the end of the
+    transaction
+
+    A refresh does not see the rows of concurrent uncommitted loads, i.e., two
+    concurrent refreshes could both replace a bucket by an aggregate missing
+    the rows of the other. On sqlite, the write lock of the database already
+    serializes loads.
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table of the rollups
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    key = func.hashtext(f"rollups {table_name}")
+    db.connection().execute(select(func.pg_advisory_xact_lock(key)))
+
+
+def refresh_rollups(
+    db: Session,
+    schema: dict[str, Any],
+    start: datetime | None = None,
+    end: datetime | None = None,
+    units: Sequence[str] | None = None,
+) -> None:
+    """Recompute the buckets of the rollups of a schema that overlap a time
+    range from its table. Concurrent refreshes wait for each other, see
+    lock_rollups.
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        schema (dict[str, Any]): Schema with rollups
+        start (datetime | None): Earliest changed time. Defaults to None, i.e.,
+            all buckets up to end are recomputed.
+        end (datetime | None): Latest changed time (inclusive). Defaults to
+            None, i.e., all buckets from start on are recomputed.
+        units (Sequence[str] | None): Units of the rollups to refresh.
+            Defaults to None, which refreshes all.
+    """
+    dialect = db.get_bind().dialect.name
+    lock_rollups(db, schema["name"])
+    time_field = SchemaManager.main_time_field(schema) or ""
+    value_field = schema["valueField"]["field"]
+    location_fields = [loc["field"] for loc in schema.get("locationFields") or []]
+    target = data_table(db, schema)
+    time_column = target.c[time_field]
+    value: ColumnElement[Any] = cast(target.c[value_field], Float)
+    for unit in units or rollup_units(schema):
+        rollup = rollup_table(schema, unit, dialect)
+        conditions: list[ColumnElement[bool]] = []
+        stale: list[ColumnElement[bool]] = []
+        if start is not None:
+            low = _truncate(start, unit)
+            conditions.append(time_column >= low)
+            stale.append(rollup.c[time_field] >= low)
+        if end is not None:
+            high = _next_bucket(_truncate(end, unit), unit)
+            conditions.append(time_column < high)
+            stale.append(rollup.c[time_field] < high)
+        bucket = time_bucket(time_column, 1, unit, dialect)
+        if dialect != "postgresql":
+            # buckets are stored in the format of bound datetimes, i.e., they
+            # compare equal to them
+            bucket = type_coerce(
+                func.strftime("%Y-%m-%d %H:%M:%S.000000", bucket), DateTime
+            )
+        query = aggregate_query(
+            dialect=dialect,
+            source=target,
+            filters=conditions,
+            location_fields=location_fields,
+            bucket=bucket,
+            measures=dict.fromkeys(("min", "max", "sum", "count", "last"), value),
+            latest=time_column,
+            stats=ROLLUP_STATS,
+        )
+        db.connection().execute(delete(rollup).where(*stale))
+        db.connection().execute(
+            insert(rollup).from_select(
+                [*location_fields, time_field, *ROLLUP_STATS], query
+            )
+        )
+
+
+def find_rollup(
+    db: Session,
+    schema: dict[str, Any],
+    count: int,
+    unit: str,
+    start: Any = None,
+    end: Any = None,
+) -> Table | None:
+    """Find the coarsest rollup of a schema that tiles the buckets of an
+    aggregate of its main time field
+
+    A rollup is only used if its buckets fit into the buckets of the aggregate
+    and the time range starts and ends at the start of a bucket of the rollup.
+
+    Args:
+        db (Session): Database session
+        schema (dict[str, Any]): Schema of the table
+        count (int): Number of units per bucket of the aggregate
+        unit (str): Unit of the buckets of the aggregate, see parse_interval
+        start (Any): Start of the time range. Defaults to None.
+        end (Any): End of the time range. Defaults to None.
+
+    Returns:
+        Table | None: The rollup or None if no rollup exists that can be used
+    """
+    units = rollup_units(schema)
+    if not units:
+        return None
+    covering = COVERING_UNITS[unit] if count == 1 else (unit,)
+    bounds = []
+    for bound in (start, end):
+        if bound is None:
+            continue
+        try:
+            bounds.append(PARSERS["datetime"](bound))
+        except (TypeError, ValueError):
+            # invalid bounds are reported by data_filters
+            return None
+    dialect = db.get_bind().dialect.name
+    existing = set(inspect(db.get_bind()).get_table_names())
+    for candidate in sorted(units, key=UNIT_SECONDS.__getitem__, reverse=True):
+        if candidate not in covering:
+            continue
+        if any(_truncate(b, candidate) != b for b in bounds):
+            continue
+        rollup = rollup_table(schema, candidate, dialect)
+        if rollup.name in existing:
+            return rollup
+    return None
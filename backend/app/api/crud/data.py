@@ -0,0 +1,502 @@
+"""Bulk loading of data into the tables created from schemas.
+
+Uploads are read as a stream of rows, checked against the fields of the schema
+by its compiled row validator and written in chunks of bounded size, i.e.,
+memory does not grow with the size of the upload. On PostgreSQL, each chunk
+is loaded with COPY ... FROM STDIN, on other dialects with a single
+executemany INSERT.
+
+All chunks are loaded in one transaction: if a row is invalid, nothing is
+loaded and the errors of the first invalid chunk are reported.
+
+Re-delivered data can be upserted: each chunk is staged in a temporary table
+and merged into the table with one INSERT ... ON CONFLICT DO UPDATE on the key
+of the schema.
+
+Every change of the data increments the write version of the table in the same
+transaction, see bump_data_version. Cached results of a table are valid as
+long as its version is unchanged.
+"""
+
+import csv
+import io
+import json
+import uuid
+from collections.abc import Callable, Generator, Iterable, Iterator, Sequence
+from datetime import date, datetime, time
+from itertools import islice
+from typing import IO, Any, Literal, cast
+
+from sqlalchemy import column, insert, table
+from sqlmodel import Session, inspect, text
+
+from app.api.crud.aggregate import refresh_rollups, rollup_units
+from app.api.crud.partition import ensure_partitions, partition_interval
+from app.core.config import settings
+from app.schema_manager import SchemaManager
+from app.schema_manager.mappings import map_db_types
+from app.schema_manager.schema_manager import sql_identifier
+
+DataFormat = Literal["csv", "ndjson"]
+IngestMode = Literal["append", "upsert"]
+
+DATA_SUFFIXES: dict[str, DataFormat] = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+DATA_CONTENT_TYPES: dict[str, DataFormat] = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class DataValidationError(ValueError):
+    """Raised if rows of an upload do not comply with the schema"""
+
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+    def __reduce__(self):
+        return (self.__class__, (self.errors,))
+
+
+def detect_data_format(filename: str, content_type: str | None = None) -> DataFormat:
+    """Detect the format of a data file from its name or content type
+
+    Args:
+        filename (str): Name of the file
+        content_type (str | None): Content type of the upload. Defaults to None.
+
+    Returns:
+        DataFormat: Either "csv" or "ndjson"
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    for suffix, data_format in DATA_SUFFIXES.items():
+        if filename.lower().endswith(suffix):
+            return data_format
+    media_type = (content_type or "").split(";")[0].strip()
+    if media_type in DATA_CONTENT_TYPES:
+        return DATA_CONTENT_TYPES[media_type]
+    raise ValueError(f"Unsupported data format. Use one of {list(DATA_SUFFIXES)}")
+
+
+def read_rows(
+    stream: IO[bytes], data_format: DataFormat
+) -> Generator[dict[str, Any], None, None]:
+    """Read the rows of a CSV or NDJSON file one by one
+
+    Args:
+        stream (IO[bytes]): Binary file object
+        data_format (DataFormat): Either "csv" or "ndjson"
+
+    Yields:
+        dict[str, Any]: The rows. Values of CSV files are strings.
+
+    Raises:
+        DataValidationError: If a line of an NDJSON file is not a JSON object
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if data_format == "csv":
+            yield from csv.DictReader(text)
+            return
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise DataValidationError([f"Row {number}: {e}"]) from e
+            if not isinstance(row, dict):
+                raise DataValidationError([f"Row {number}: not a JSON object"])
+            yield row
+    finally:
+        # the stream is owned by the caller
+        text.detach()
+
+
+def chunked(rows: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _copy_value(value: Any) -> Any:
+    if isinstance(value, datetime | date | time | uuid.UUID):
+        return str(value)
+    return value
+
+
+def copy_rows(db: Session, table_name: str, fields: list[str], rows: list[tuple]):
+    """Load rows into a table with COPY ... FROM STDIN (PostgreSQL only)
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        table_name (str): Name of the table
+        fields (list[str]): Names of the columns
+        rows (list[tuple]): The values of the rows in the order of the fields
+    """
+    quote = db.bind.dialect.identifier_preparer.quote  # type: ignore[union-attr]
+    buffer = io.StringIO()
+    # all values but nulls are quoted: COPY reads unquoted empty fields as null
+    # and quoted empty fields as empty strings
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NOTNULL, lineterminator="\n")
+    writer.writerows([_copy_value(v) for v in row] for row in rows)
+    buffer.seek(0)
+    columns = ", ".join(quote(f) for f in fields)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def insert_rows(
+    db: Session,
+    table_name: str,
+    fields: list[str],
+    rows: list[tuple],
+    types: Sequence[Any] | None = None,
+):
+    """Insert rows into a table with a single executemany statement
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        table_name (str): Name of the table
+        fields (list[str]): Names of the columns
+        rows (list[tuple]): The values of the rows in the order of the fields
+        types (Sequence[Any] | None): Column types used to bind the values.
+            Defaults to None, which binds the values as they are.
+    """
+    types = types or [None] * len(fields)
+    target = table(
+        table_name, *(column(f, t) for f, t in zip(fields, types, strict=True))
+    )
+    db.connection().execute(
+        insert(target), [dict(zip(fields, row, strict=True)) for row in rows]
+    )
+
+
+def _dedup(rows: list[tuple], key: list[int]) -> list[tuple]:
+    """Keep the last row per key"""
+    return list({tuple(row[i] for i in key): row for row in rows}.values())
+
+
+def create_stage(db: Session, table_name: str, fields: list[str]) -> str:
+    """Create an empty temporary table with the columns of a table
+
+    Temporary tables are neither logged nor visible to other sessions. On
+    PostgreSQL, the table is dropped at the end of the transaction, on other
+    dialects by drop_stage.
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table
+        fields (list[str]): Columns of the table to copy
+
+    Returns:
+        str: Name of the temporary table
+    """
+    quote = db.bind.dialect.identifier_preparer.quote  # type: ignore[union-attr]
+    stage = sql_identifier("stage", table_name)
+    columns = ", ".join(quote(f) for f in fields)
+    if db.bind.dialect.name == "postgresql":  # type: ignore[union-attr]
+        db.exec(  # type: ignore[call-overload]
+            text(
+                f"CREATE TEMP TABLE {quote(stage)} ON COMMIT DROP AS "
+                f"SELECT {columns} FROM {quote(table_name)} WITH NO DATA"
+            )
+        )
+    else:
+        drop_stage(db, stage)
+        db.exec(  # type: ignore[call-overload]
+            text(
+                f"CREATE TEMP TABLE {quote(stage)} AS "
+                f"SELECT {columns} FROM {quote(table_name)} WHERE 0"
+            )
+        )
+    return stage
+
+
+def drop_stage(db: Session, stage: str) -> None:
+    """Drop a temporary table created by create_stage (not PostgreSQL)"""
+    quote = db.bind.dialect.identifier_preparer.quote  # type: ignore[union-attr]
+    db.exec(text(f"DROP TABLE IF EXISTS temp.{quote(stage)}"))  # type: ignore[call-overload]
+
+
+def has_unique_key(db: Session, table_name: str, key: Sequence[str]) -> bool:
+    """Check whether a table has a unique constraint or index on exactly the
+    columns of a key, which upserts need as their conflict target. Tables
+    created before keys were derived from the value field lack it, see
+    SchemaManager.natural_key.
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table
+        key (Sequence[str]): Columns of the key
+
+    Returns:
+        bool: True if the table has such a constraint or index
+    """
+    inspector = inspect(db.connection())
+    columns = set(key)
+    unique: list[Sequence[str | None]] = [
+        c["column_names"] for c in inspector.get_unique_constraints(table_name)
+    ]
+    unique += [
+        ix["column_names"] for ix in inspector.get_indexes(table_name) if ix["unique"]
+    ]
+    return any(set(names) == columns for names in unique)
+
+
+def merge_stage(
+    db: Session, table_name: str, stage: str, fields: list[str], key: list[str]
+) -> dict[str, int]:
+    """Insert the rows of a temporary table into a table or update the rows
+    with the same key. Rows that are equal to the stored row are not updated.
+
+    On PostgreSQL, this is a single INSERT ... ON CONFLICT DO UPDATE that
+    reports the inserted and updated rows. On other dialects, the counts are
+    queried before the merge.
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        table_name (str): Name of the table
+        stage (str): Name of the temporary table. It must not contain
+            duplicate keys.
+        fields (list[str]): Columns to merge
+        key (list[str]): Columns of the unique constraint of the table
+
+    Returns:
+        dict[str, int]: Number of "inserted", "updated" and "unchanged" rows
+    """
+    quote = db.bind.dialect.identifier_preparer.quote  # type: ignore[union-attr]
+    target, source = quote(table_name), quote(stage)
+    columns = ", ".join(quote(f) for f in fields)
+    conflict = ", ".join(quote(k) for k in key)
+    values = [quote(f) for f in fields if f not in key]
+    if values:
+        update = ", ".join(f"{v} = excluded.{v}" for v in values)
+        action = f"DO UPDATE SET {update}"
+    else:
+        action = "DO NOTHING"
+    n_rows = db.exec(text(f"SELECT COUNT(*) FROM {source}")).one()[0]  # type: ignore[call-overload]
+
+    if db.bind.dialect.name == "postgresql":  # type: ignore[union-attr]
+        if values:
+            stored = ", ".join(f"{target}.{v}" for v in values)
+            loaded = ", ".join(f"excluded.{v}" for v in values)
+            action += f" WHERE ({stored}) IS DISTINCT FROM ({loaded})"
+        # xmax is 0 for inserted rows and the id of the transaction otherwise
+        inserted, updated = db.exec(  # type: ignore[call-overload]
+            text(
+                f"WITH merged AS (INSERT INTO {target} ({columns}) "
+                f"SELECT {columns} FROM {source} "
+                f"ON CONFLICT ({conflict}) {action} "
+                "RETURNING xmax = 0 AS inserted) "
+                "SELECT COUNT(*) FILTER (WHERE inserted), "
+                "COUNT(*) FILTER (WHERE NOT inserted) FROM merged"
+            )
+        ).one()
+    else:
+        on = " AND ".join(f"{target}.{k} = {source}.{k}" for k in map(quote, key))
+        equal = " AND ".join(f"{target}.{v} IS {source}.{v}" for v in values) or "1"
+        existing, unchanged = db.exec(  # type: ignore[call-overload]
+            text(
+                f"SELECT COUNT(*), COALESCE(SUM(CASE WHEN {equal} THEN 1 END), 0) "
+                f"FROM {source} JOIN {target} ON {on}"
+            )
+        ).one()
+        if values:
+            changed = " OR ".join(f"{target}.{v} IS NOT excluded.{v}" for v in values)
+            action += f" WHERE {changed}"
+        # WHERE true tells the ON CONFLICT clause apart from a join condition
+        db.exec(  # type: ignore[call-overload]
+            text(
+                f"INSERT INTO {target} ({columns}) "
+                f"SELECT {columns} FROM {source} WHERE true "
+                f"ON CONFLICT ({conflict}) {action}"
+            )
+        )
+        inserted, updated = n_rows - existing, existing - unchanged
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": n_rows - inserted - updated,
+    }
+
+
+def data_version(db: Session, table_name: str) -> int:
+    """Get the write version of a table
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table
+
+    Returns:
+        int: The version. 0 if the data has never changed.
+    """
+    version = db.exec(  # type: ignore[call-overload]
+        text("SELECT version FROM dataversion WHERE table_name = :table_name"),
+        params={"table_name": table_name},
+    ).first()
+    return version[0] if version is not None else 0
+
+
+def bump_data_version(db: Session, table_name: str) -> None:
+    """Increment the write version of a table in the current transaction
+
+    Concurrent writers are serialized by the row lock of the version, i.e.,
+    the version is incremented once per committed change.
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        table_name (str): Name of the table
+    """
+    db.exec(  # type: ignore[call-overload]
+        text(
+            "INSERT INTO dataversion (table_name, version) VALUES (:table_name, 1) "
+            "ON CONFLICT (table_name) "
+            "DO UPDATE SET version = dataversion.version + 1"
+        ),
+        params={"table_name": table_name},
+    )
+
+
+def ingest_rows(
+    *,
+    db: Session,
+    schema: dict[str, Any],
+    rows: Iterable[dict[str, Any]],
+    chunk_size: int | None = None,
+    mode: IngestMode = "append",
+    on_chunk: Callable[[dict[str, int]], None] | None = None,
+) -> dict[str, int]:
+    """Validate rows against a schema and load them into the schema's table
+
+    The missing partitions of each chunk are created before it is loaded, see
+    ensure_partitions. The buckets of the rollups of the schema within the
+    time range of each chunk are recomputed in the same transaction, see
+    refresh_rollups.
+
+    Args:
+        db (Session): Database session. The session is committed if all rows
+            are loaded and rolled back otherwise.
+        schema (dict[str, Any]): Schema of the table
+        rows (Iterable[dict[str, Any]]): The rows by field name
+        chunk_size (int | None): Number of rows per chunk. Defaults to
+            settings.DATA_INGEST_CHUNK_SIZE.
+        mode (IngestMode): "append" inserts all rows and fails on duplicate
+            keys. "upsert" stages each chunk in a temporary table and merges
+            it into the table by the key of the schema, see
+            SchemaManager.natural_key. Rows with the same key as a later row of
+            the same chunk count as unchanged. Defaults to "append".
+        on_chunk (Callable[[dict[str, int]], None] | None): Called with the
+            counts after each loaded chunk, e.g., to report progress. The
+            chunks are not committed yet. Defaults to None.
+
+    Returns:
+        dict[str, int]: Number of loaded "rows" and "chunks" and of
+            "inserted", "updated" and "unchanged" rows
+
+    Raises:
+        DataValidationError: If rows are invalid. The errors of the first
+            invalid chunk are reported by field and error with the numbers of
+            the invalid rows, up to settings.DATA_INGEST_MAX_ERRORS messages.
+        ValueError: If rows are upserted into a table without key or without
+            a unique constraint on its key
+    """
+    chunk_size = chunk_size or settings.DATA_INGEST_CHUNK_SIZE
+    validator = SchemaManager.row_validator(schema)
+    fields = validator.fields
+    dialect = db.bind.dialect.name  # type: ignore[union-attr]
+    quote = db.bind.dialect.identifier_preparer.quote  # type: ignore[union-attr]
+    db_types = cast(dict[str, Any], map_db_types[dialect])  # type: ignore[index]
+    types = [db_types[f["type"]] for f in schema["fields"]]
+
+    def load(table_name: str, values: list[tuple]) -> None:
+        if dialect == "postgresql":
+            copy_rows(db, table_name, fields, values)
+        else:
+            insert_rows(db, table_name, fields, values, types)
+
+    key = SchemaManager.natural_key(schema) if mode == "upsert" else []
+    if mode == "upsert" and not key:
+        raise ValueError("Rows can only be upserted into tables with a key")
+    key_index = [fields.index(k) for k in key]
+    time_index = (
+        fields.index(SchemaManager.main_time_field(schema) or "")
+        if rollup_units(schema)
+        else None
+    )
+    counts = dict.fromkeys(["rows", "chunks", "inserted", "updated", "unchanged"], 0)
+    stage = None
+    try:
+        interval = partition_interval(db, schema)
+        partition_index = (
+            fields.index(SchemaManager.partition_from_schema(schema)["column"])
+            if interval is not None
+            else None
+        )
+        partitions: set[datetime] = set()
+        if mode == "upsert":
+            if not has_unique_key(db, schema["name"], key):
+                raise ValueError(
+                    f"The table {schema['name']} has no unique constraint on "
+                    f"its key {', '.join(key)}. Update the schema to add it."
+                )
+            stage = create_stage(db, schema["name"], fields)
+        for chunk in chunked(rows, chunk_size):
+            values, report = validator.validate_rows(chunk)
+            if not report.valid:
+                # rows are numbered from 1 on
+                messages = report.messages(
+                    counts["rows"] + 1, settings.DATA_INGEST_MAX_ERRORS
+                )
+                raise DataValidationError(messages)
+            if interval is not None and partition_index is not None:
+                ensure_partitions(
+                    db,
+                    schema["name"],
+                    interval,
+                    (v[partition_index] for v in values),
+                    known=partitions,
+                )
+            if stage is None:
+                load(schema["name"], values)
+                counts["inserted"] += len(values)
+            else:
+                unique = _dedup(values, key_index)
+                load(stage, unique)
+                merged = merge_stage(db, schema["name"], stage, fields, key)
+                merged["unchanged"] += len(values) - len(unique)
+                db.exec(text(f"DELETE FROM {quote(stage)}"))  # type: ignore[call-overload]
+                for name, count in merged.items():
+                    counts[name] += count
+            if time_index is not None:
+                times = [v[time_index] for v in values if v[time_index] is not None]
+                if times:
+                    refresh_rollups(db, schema, start=min(times), end=max(times))
+            counts["rows"] += len(chunk)
+            counts["chunks"] += 1
+            if on_chunk is not None:
+                on_chunk(dict(counts))
+        if stage is not None and dialect != "postgresql":
+            drop_stage(db, stage)
+        if counts["inserted"] or counts["updated"]:
+            bump_data_version(db, schema["name"])
+        db.commit()
+    except Exception:
+        # a temporary table left behind is dropped by the next create_stage
+        db.rollback()
+        raise
+    return counts
@@ -0,0 +1,347 @@
+"""Streaming export of the tables created from schemas.
+
+Rows are fetched from a server-side cursor in batches of bounded size, see
+fetch_batches, and each batch is encoded and handed on before the next one is
+fetched, i.e., memory does not grow with the size of the table.
+
+Columnar formats are written by pyarrow, which is an optional dependency
+(pip install backend[arrow]): Arrow IPC streams are written one record batch
+and Parquet files one row group per batch. The Arrow type of each column
+follows from its database type, see map_db_types.
+
+NDJSON and CSV are encoded with the standard library. Any format can be
+compressed on the fly with gzip or, with zstandard installed
+(pip install backend[zstd]) or on Python 3.14+, with zstd.
+"""
+
+import csv
+import io
+import json
+import uuid
+import zlib
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Literal
+
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    ColumnElement,
+    Date,
+    DateTime,
+    Engine,
+    Float,
+    Integer,
+    Numeric,
+    Row,
+    Select,
+    String,
+    Text,
+    Time,
+    Uuid,
+    cast,
+)
+
+from app.core.config import settings
+
+ExportFormat = Literal["arrow", "parquet", "ndjson", "csv"]
+Compression = Literal["gzip", "zstd"]
+
+EXPORT_MEDIA_TYPES: dict[str, str] = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "gzip": "application/gzip",
+    "zstd": "application/zstd",
+}
+EXPORT_SUFFIXES: dict[str, str] = {
+    "arrow": ".arrows",
+    "parquet": ".parquet",
+    "ndjson": ".ndjson",
+    "csv": ".csv",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+# Arrow types by database type. Decimals, UUIDs and JSON are converted to
+# float and text by the database, see export_columns.
+ARROW_TYPES: list[tuple[type, str, tuple[Any, ...]]] = [
+    (Boolean, "bool_", ()),
+    (Integer, "int64", ()),
+    (Float, "float64", ()),
+    (DateTime, "timestamp", ("us",)),
+    (Date, "date32", ()),
+    (Time, "time64", ("us",)),
+    (String, "string", ()),
+]
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "Arrow and Parquet exports require pyarrow. "
+            "Install it with: pip install backend[arrow]"
+        ) from e
+    return pyarrow
+
+
+def export_columns(query: Select[Any]) -> Select[Any]:
+    """Convert the columns without Arrow type in the database
+
+    Decimals are converted to float, UUIDs and JSON to text.
+
+    Args:
+        query (Select[Any]): Query of the rows, see select_rows
+
+    Returns:
+        Select[Any]: The query with the converted columns
+    """
+    columns: list[ColumnElement[Any]] = []
+    for column in query.selected_columns:
+        if isinstance(column.type, Numeric) and not isinstance(column.type, Float):
+            columns.append(cast(column, Float).label(column.name))
+        elif isinstance(column.type, Uuid | JSON):
+            columns.append(cast(column, Text).label(column.name))
+        else:
+            columns.append(column)
+    return query.with_only_columns(*columns)
+
+
+def arrow_schema(query: Select[Any]) -> Any:
+    """Derive the Arrow schema of the rows of a query from the column types
+
+    Args:
+        query (Select[Any]): Query with columns converted by export_columns
+
+    Returns:
+        pyarrow.Schema: The schema
+
+    Raises:
+        ImportError: If pyarrow is not installed
+        ValueError: If a column has no Arrow type
+    """
+    pa = _import_pyarrow()
+    fields = []
+    for column in query.selected_columns:
+        for db_type, name, arguments in ARROW_TYPES:
+            if isinstance(column.type, db_type):
+                fields.append(pa.field(column.name, getattr(pa, name)(*arguments)))
+                break
+        else:
+            raise ValueError(
+                f"Column {column.name} of type {column.type} not supported"
+            )
+    return pa.schema(fields)
+
+
+def fetch_batches(
+    engine: Engine, query: Select[Any], batch_size: int | None = None
+) -> Iterator[Sequence[Row[Any]]]:
+    """Fetch the rows of a query in batches from a server-side cursor
+
+    Args:
+        engine (Engine): Database engine. The rows are fetched on a connection
+            of their own, i.e., the export outlives the session of a request.
+        query (Select[Any]): The query
+        batch_size (int | None): Number of rows per batch. Defaults to
+            settings.DATA_EXPORT_BATCH_SIZE.
+
+    Yields:
+        Sequence[Row[Any]]: The batches of rows
+    """
+    batch_size = batch_size or settings.DATA_EXPORT_BATCH_SIZE
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, yield_per=batch_size
+        ).execute(query)
+        yield from result.partitions()
+
+
+class _Sink:
+    """Writable file object whose content is drained after each write"""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def export_arrow(
+    engine: Engine,
+    query: Select[Any],
+    data_format: ExportFormat = "arrow",
+    batch_size: int | None = None,
+) -> Iterator[bytes]:
+    """Encode the rows of a query as Arrow IPC stream or Parquet file
+
+    The schema is derived before the first row is fetched, i.e., unsupported
+    columns fail before the export starts.
+
+    Args:
+        engine (Engine): Database engine
+        query (Select[Any]): Query of the rows, see select_rows
+        data_format (ExportFormat): Either "arrow" or "parquet". Defaults to
+            "arrow".
+        batch_size (int | None): Rows per record batch or row group. Defaults
+            to settings.DATA_EXPORT_BATCH_SIZE.
+
+    Returns:
+        Iterator[bytes]: The encoded file in parts
+
+    Raises:
+        ImportError: If pyarrow is not installed
+        ValueError: If a column has no Arrow type
+    """
+    pa = _import_pyarrow()
+    query = export_columns(query)
+    schema = arrow_schema(query)
+
+    def encode() -> Iterator[bytes]:
+        sink = _Sink()
+        if data_format == "parquet":
+            writer = pa.parquet.ParquetWriter(sink, schema)
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+        try:
+            for rows in fetch_batches(engine, query, batch_size):
+                arrays = [
+                    pa.array(values, type=field.type)
+                    for values, field in zip(
+                        zip(*rows, strict=True), schema, strict=True
+                    )
+                ]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    return encode()
+
+
+def _text_value(value: Any) -> Any:
+    """Value of a row as written to NDJSON or CSV files"""
+    if isinstance(value, datetime | date | time):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def export_text(
+    engine: Engine,
+    query: Select[Any],
+    data_format: ExportFormat = "ndjson",
+    batch_size: int | None = None,
+) -> Iterator[bytes]:
+    """Encode the rows of a query as NDJSON or CSV file
+
+    Times are written in ISO format, i.e., the files can be loaded again, see
+    read_rows. Nulls are written as null in NDJSON and as empty values in CSV.
+    JSON values are written as JSON text in CSV files.
+
+    Args:
+        engine (Engine): Database engine
+        query (Select[Any]): Query of the rows, see select_rows
+        data_format (ExportFormat): Either "ndjson" or "csv". Defaults to
+            "ndjson".
+        batch_size (int | None): Rows fetched and encoded at once. Defaults
+            to settings.DATA_EXPORT_BATCH_SIZE.
+
+    Yields:
+        bytes: The encoded file in parts, one per batch
+    """
+    names = [c.name for c in query.selected_columns]
+    if data_format == "csv":
+        query = export_columns(query)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(names)
+        for rows in fetch_batches(engine, query, batch_size):
+            writer.writerows([_text_value(v) for v in row] for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+        return
+    encoder = json.JSONEncoder(ensure_ascii=False, default=_text_value)
+    for rows in fetch_batches(engine, query, batch_size):
+        lines = [encoder.encode(dict(zip(names, row, strict=True))) for row in rows]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _zstd_compressor() -> Any:
+    try:
+        from compression import zstd  # Python 3.14+
+
+        return zstd.ZstdCompressor()
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "zstd compression requires zstandard. "
+            "Install it with: pip install backend[zstd]"
+        ) from e
+    return zstandard.ZstdCompressor().compressobj()
+
+
+def compress(
+    parts: Iterable[bytes], compression: Compression | None = None
+) -> Iterator[bytes]:
+    """Compress a stream of bytes part by part
+
+    Args:
+        parts (Iterable[bytes]): The stream
+        compression (Compression | None): Either "gzip" or "zstd". Defaults to
+            None, i.e., the parts are passed on as they are.
+
+    Returns:
+        Iterator[bytes]: The compressed stream
+
+    Raises:
+        ImportError: If zstd is not available
+    """
+    if compression is None:
+        return iter(parts)
+    if compression == "gzip":
+        # wbits 31 writes a gzip header and trailer
+        compressor = zlib.compressobj(wbits=31)
+    else:
+        compressor = _zstd_compressor()
+
+    def encode() -> Iterator[bytes]:
+        for part in parts:
+            if data := compressor.compress(part):
+                yield data
+        yield compressor.flush()
+
+    return encode()
@@ -0,0 +1,509 @@
+"""Queue of data ingestion jobs.
+
+Uploads are saved to the data storage and recorded as queued jobs. Workers
+claim the oldest queued job with SELECT ... FOR UPDATE SKIP LOCKED, i.e., any
+number of workers in any number of processes share the queue without a job
+being handed out twice. A worker loads the data in chunks, see ingest_rows,
+and records the progress of the job.
+
+A running job is leased to its worker: the worker sends heartbeats and the
+other workers queue jobs again whose heartbeat is older than the lease, e.g.,
+as their worker was killed, see requeue_expired_jobs. The data of a job is
+loaded in a single transaction, i.e., the rows of an interrupted job are
+rolled back and loaded again by the next attempt.
+
+Workers run as threads of the API process (settings.INGEST_WORKERS) or in
+separate processes (from the backend directory):
+    python -m app.api.crud.job --workers 4
+"""
+
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import closing
+from datetime import UTC, datetime, timedelta
+from multiprocessing import get_context
+from typing import IO, Any
+
+from sqlalchemy import Engine, func, update
+from sqlmodel import Session, select
+
+from app.api.crud.data import (
+    DataFormat,
+    DataValidationError,
+    IngestMode,
+    ingest_rows,
+    read_rows,
+)
+from app.api.crud.schema import read_schema
+from app.core.config import settings
+from app.filestorage import FileStorageProtocol
+from app.models.job import IngestionJob
+
+logger = logging.getLogger(__name__)
+
+
+# values of a job that is queued again
+_RESET = {
+    "status": "queued",
+    "worker": None,
+    "started_at": None,
+    "heartbeat_at": None,
+    **dict.fromkeys(["rows", "chunks", "inserted", "updated", "unchanged"], 0),
+}
+
+
+class JobInterrupted(Exception):
+    """The worker was stopped while running a job"""
+
+
+def _now() -> datetime:
+    return datetime.now(UTC)
+
+
+def create_job(
+    *,
+    db: Session,
+    storage: FileStorageProtocol,
+    schema_id: int,
+    file: IO[bytes],
+    data_format: DataFormat,
+    mode: IngestMode = "append",
+    chunk_size: int | None = None,
+) -> IngestionJob:
+    """Save an upload to the data storage and queue its ingestion
+
+    Args:
+        db (Session): Database session
+        storage (FileStorageProtocol): Storage of the uploaded files
+        schema_id (int): Schema of the table to load the data into
+        file (IO[bytes]): The uploaded CSV or NDJSON file. It is copied to the
+            storage in chunks.
+        data_format (DataFormat): Either "csv" or "ndjson"
+        mode (IngestMode): Either "append" or "upsert". Defaults to "append".
+        chunk_size (int | None): Number of rows per chunk. Defaults to None,
+            which uses settings.DATA_INGEST_CHUNK_SIZE.
+
+    Returns:
+        IngestionJob: The queued job
+    """
+    key = storage.save_stream(f"ingest_{os.urandom(16).hex()}.{data_format}", file)
+    job = IngestionJob(
+        schema_id=schema_id,
+        file_key=key,
+        data_format=data_format,
+        mode=mode,
+        chunk_size=chunk_size,
+    )
+    try:
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+    except Exception:
+        db.rollback()
+        storage.delete(key)
+        raise
+    return job
+
+
+def read_job(*, db: Session, job_id: int) -> IngestionJob:
+    """Read a job by its id
+
+    Args:
+        db (Session): Database session
+        job_id (int): The job id
+
+    Returns:
+        IngestionJob: The job
+
+    Raises:
+        ValueError: If the job does not exist
+    """
+    job = db.get(IngestionJob, job_id)
+    if job is None:
+        raise ValueError("Job not found")
+    return job
+
+
+def list_jobs(
+    *,
+    db: Session,
+    schema_id: int | None = None,
+    status: str | None = None,
+    limit: int = 100,
+) -> list[IngestionJob]:
+    """List the most recent jobs
+
+    Args:
+        db (Session): Database session
+        schema_id (int | None): Only jobs of this schema. Defaults to None.
+        status (str | None): Only jobs with this status. Defaults to None.
+        limit (int): Maximum number of jobs. Defaults to 100.
+
+    Returns:
+        list[IngestionJob]: The jobs, the most recent first
+    """
+    query = select(IngestionJob)
+    if schema_id is not None:
+        query = query.where(IngestionJob.schema_id == schema_id)
+    if status is not None:
+        query = query.where(IngestionJob.status == status)
+    query = query.order_by(IngestionJob.id.desc()).limit(limit)  # type: ignore[union-attr]
+    return list(db.exec(query).all())
+
+
+def claim_job(*, db: Session, worker: str) -> IngestionJob | None:
+    """Claim the oldest queued job and mark it as running
+
+    Queued jobs locked by other workers are skipped. The status is only
+    changed if the job is still queued, i.e., on dialects without row locks
+    a job is never claimed twice either.
+
+    Args:
+        db (Session): Database session. The session is committed.
+        worker (str): Name of the claiming worker
+
+    Returns:
+        IngestionJob | None: The claimed job or None if no job is queued
+    """
+    query = (
+        select(IngestionJob)
+        .where(IngestionJob.status == "queued")
+        .order_by(IngestionJob.id)  # type: ignore[arg-type]
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    try:
+        job = db.exec(query).first()
+        if job is None:
+            db.rollback()
+            return None
+        claimed = db.exec(  # type: ignore[call-overload]
+            update(IngestionJob)
+            .where(IngestionJob.id == job.id)  # type: ignore[arg-type]
+            .where(IngestionJob.status == "queued")  # type: ignore[arg-type]
+            .values(
+                status="running",
+                worker=worker,
+                started_at=_now(),
+                heartbeat_at=_now(),
+                attempts=IngestionJob.attempts + 1,
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if claimed.rowcount != 1:
+        return None
+    db.refresh(job)
+    return job
+
+
+def update_job(
+    engine: Engine, job_id: int, owner: str | None = None, **values: Any
+) -> bool:
+    """Update a job in its own transaction, e.g., to report progress
+
+    Args:
+        engine (Engine): Database engine
+        job_id (int): The job id
+        owner (str | None): Only update the job while it is run by this
+            worker, i.e., not after it was queued again. Defaults to None.
+        **values: Columns to update
+
+    Returns:
+        bool: True if the job was updated
+    """
+    query = update(IngestionJob).where(IngestionJob.id == job_id)  # type: ignore[arg-type]
+    if owner is not None:
+        query = query.where(
+            IngestionJob.status == "running",  # type: ignore[arg-type]
+            IngestionJob.worker == owner,  # type: ignore[arg-type]
+        )
+    with Session(engine) as db:
+        result = db.exec(query.values(**values))  # type: ignore[call-overload]
+        db.commit()
+    return result.rowcount == 1
+
+
+def requeue_expired_jobs(
+    *, db: Session, lease: float | None = None, max_attempts: int | None = None
+) -> dict[str, int]:
+    """Queue running jobs again whose worker missed its heartbeats
+
+    The rows loaded by the lost worker were rolled back, i.e., the progress
+    of the job is reset. Jobs that were claimed max_attempts times are failed
+    instead, e.g., as they kill their worker.
+
+    Args:
+        db (Session): Database session. The session is committed.
+        lease (float | None): Seconds since the last heartbeat after which a
+            job is expired. Defaults to settings.INGEST_LEASE.
+        max_attempts (int | None): Maximum number of attempts of a job.
+            Defaults to settings.INGEST_MAX_ATTEMPTS.
+
+    Returns:
+        dict[str, int]: Number of "requeued" and "failed" jobs
+    """
+    lease = settings.INGEST_LEASE if lease is None else lease
+    max_attempts = max_attempts or settings.INGEST_MAX_ATTEMPTS
+    cutoff = _now() - timedelta(seconds=lease)
+    expired = (
+        IngestionJob.status == "running",
+        func.coalesce(IngestionJob.heartbeat_at, IngestionJob.started_at) < cutoff,
+    )
+    try:
+        failed = db.exec(  # type: ignore[call-overload]
+            update(IngestionJob)
+            .where(*expired, IngestionJob.attempts >= max_attempts)  # type: ignore[arg-type]
+            .values(
+                status="failed",
+                finished_at=_now(),
+                errors=[f"The worker was lost {max_attempts} times"],
+            )
+        )
+        requeued = db.exec(  # type: ignore[call-overload]
+            update(IngestionJob).where(*expired).values(**_RESET)  # type: ignore[arg-type]
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"requeued": requeued.rowcount, "failed": failed.rowcount}
+
+
+def _send_heartbeats(
+    engine: Engine, job_id: int, worker: str, done: threading.Event
+) -> None:
+    """Update the heartbeat of a running job until it is done"""
+    while not done.wait(settings.INGEST_HEARTBEAT_INTERVAL):
+        try:
+            update_job(engine, job_id, owner=worker, heartbeat_at=_now())
+        except Exception:
+            logger.warning(f"Heartbeat of ingestion job {job_id} failed", exc_info=True)
+
+
+def run_job(
+    *,
+    engine: Engine,
+    storage: FileStorageProtocol,
+    job: IngestionJob,
+    stop: threading.Event | None = None,
+) -> str:
+    """Load the data of a claimed job and record the result
+
+    On PostgreSQL, the counts are updated after each chunk and heartbeats are
+    sent every settings.INGEST_HEARTBEAT_INTERVAL seconds. sqlite only allows
+    a single writer, i.e., the counts are only updated at the end of the job.
+    The uploaded file is deleted from the storage if the job succeeds.
+
+    Args:
+        engine (Engine): Database engine
+        storage (FileStorageProtocol): Storage of the uploaded files
+        job (IngestionJob): The job claimed by claim_job
+        stop (threading.Event | None): Interrupts the job after the current
+            chunk once set. The job is queued again. Defaults to None.
+
+    Returns:
+        str: Final status of the job, i.e., "succeeded", "failed" or "queued"
+            if it was interrupted
+    """
+    job_id, worker = job.id, job.worker
+    assert job_id is not None and worker is not None
+    postgres = engine.dialect.name == "postgresql"
+
+    def on_chunk(counts: dict[str, int]) -> None:
+        if postgres:
+            update_job(engine, job_id, owner=worker, **counts)
+        if stop is not None and stop.is_set():
+            raise JobInterrupted
+
+    done = threading.Event()
+    if postgres:
+        threading.Thread(
+            target=_send_heartbeats,
+            args=(engine, job_id, worker, done),
+            name=f"heartbeat-{job_id}",
+            daemon=True,
+        ).start()
+    result: dict[str, Any]
+    try:
+        with Session(engine) as db:
+            schema = read_schema(db=db, schema_id=job.schema_id)
+            # the file is read in a stream of rows, not into memory. The rows
+            # are closed before the file if the job is interrupted.
+            with (
+                storage.load_stream(job.file_key) as stream,
+                closing(read_rows(stream, job.data_format)) as rows,  # type: ignore[arg-type]
+            ):
+                counts = ingest_rows(
+                    db=db,
+                    schema=schema.jsonschema,
+                    rows=rows,
+                    chunk_size=job.chunk_size,
+                    mode=job.mode,  # type: ignore[arg-type]
+                    on_chunk=on_chunk,
+                )
+        result = {"status": "succeeded", "finished_at": _now(), **counts}
+    except JobInterrupted:
+        # an interrupted attempt does not count, see requeue_expired_jobs
+        result = {**_RESET, "attempts": IngestionJob.attempts - 1}
+    except DataValidationError as e:
+        result = {"status": "failed", "finished_at": _now(), "errors": e.errors}
+    except Exception as e:
+        logger.exception(f"Ingestion job {job_id} failed")
+        result = {"status": "failed", "finished_at": _now(), "errors": [str(e)]}
+    finally:
+        done.set()
+    if not update_job(engine, job_id, owner=worker, **result):
+        logger.warning(f"Ingestion job {job_id} was queued again while running")
+    if result["status"] == "succeeded":
+        storage.delete(job.file_key)
+    return result["status"]
+
+
+def work(
+    engine: Engine,
+    storage: FileStorageProtocol,
+    stop: threading.Event | None = None,
+    worker: str | None = None,
+    max_jobs: int | None = None,
+) -> int:
+    """Run queued jobs until stopped
+
+    Args:
+        engine (Engine): Database engine
+        storage (FileStorageProtocol): Storage of the uploaded files
+        stop (threading.Event | None): Stops the worker once set. Defaults to
+            None, which runs until max_jobs are done.
+        worker (str | None): Name of the worker. Defaults to host, process and
+            thread.
+        max_jobs (int | None): Stop after this number of jobs or if the queue
+            is empty. Defaults to None, which polls the queue every
+            settings.INGEST_POLL_INTERVAL seconds.
+
+    Returns:
+        int: Number of jobs run
+    """
+    stop = stop or threading.Event()
+    worker = worker or (
+        f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+    )
+    # heartbeats are only sent on PostgreSQL, see run_job
+    reap = engine.dialect.name == "postgresql"
+    reaped_at = 0.0
+    n_jobs = 0
+    while not stop.is_set() and (max_jobs is None or n_jobs < max_jobs):
+        if reap and time.monotonic() - reaped_at > settings.INGEST_LEASE / 2:
+            reaped_at = time.monotonic()
+            try:
+                with Session(engine) as db:
+                    reaped = requeue_expired_jobs(db=db)
+                if reaped["requeued"] or reaped["failed"]:
+                    logger.warning(f"Expired ingestion jobs: {reaped}")
+            except Exception:
+                logger.exception("Expired ingestion jobs could not be requeued")
+        with Session(engine) as db:
+            job = claim_job(db=db, worker=worker)
+        if job is None:
+            if max_jobs is not None:
+                break
+            stop.wait(settings.INGEST_POLL_INTERVAL)
+            continue
+        status = run_job(engine=engine, storage=storage, job=job, stop=stop)
+        logger.info(f"Ingestion job {job.id} {status}")
+        n_jobs += 1
+    return n_jobs
+
+
+class WorkerThreads:
+    """Worker threads of the current process, see start_workers"""
+
+    def __init__(
+        self, engine: Engine, storage: FileStorageProtocol, n_workers: int
+    ) -> None:
+        self._stop = threading.Event()
+        self.threads = [
+            threading.Thread(
+                target=work,
+                args=(engine, storage, self._stop),
+                name=f"ingest-{i}",
+                daemon=True,
+            )
+            for i in range(n_workers)
+        ]
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """Stop the workers and wait for them to finish
+
+        Running jobs are interrupted after their current chunk and queued
+        again. Jobs of workers that do not finish in time are queued again
+        once their lease expires, see requeue_expired_jobs.
+
+        Args:
+            timeout (float | None): Seconds to wait for all workers. Defaults
+                to None, which waits until they finished.
+
+        Returns:
+            bool: True if all workers finished
+        """
+        self._stop.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            if thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                thread.join(None if remaining is None else max(remaining, 0))
+        return not any(thread.is_alive() for thread in self.threads)
+
+
+def start_workers(
+    engine: Engine, storage: FileStorageProtocol, n_workers: int
+) -> WorkerThreads:
+    """Start worker threads in the current process
+
+    Args:
+        engine (Engine): Database engine
+        storage (FileStorageProtocol): Storage of the uploaded files
+        n_workers (int): Number of worker threads
+
+    Returns:
+        WorkerThreads: The running workers. Stop them by WorkerThreads.stop.
+    """
+    workers = WorkerThreads(engine, storage, n_workers)
+    workers.start()
+    return workers
+
+
+def _work_in_process() -> None:
+    from app.api.deps import get_data_storage
+    from app.core.db import engine
+
+    try:
+        work(engine, get_data_storage())
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run data ingestion workers")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    context = get_context("spawn")
+    processes = [context.Process(target=_work_in_process) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,631 @@
+"""Evolution of data tables when their schema changes.
+
+The planner compares two versions of a schema and generates the DDL that
+turns the table of the old version into the table of the new one. All
+statements are chosen to hold strong locks only briefly:
+
+- added fields are added as nullable columns without a default, which only
+  changes the catalog. NOT NULL of added key and required fields is validated
+  afterwards, i.e., it only succeeds for tables without rows.
+- indexes are created and dropped CONCURRENTLY (PostgreSQL)
+- a changed field type is migrated via a new column that is filled in batches
+  by a background backfill and swapped with the old column afterwards. A
+  trigger keeps the new column in sync with rows written meanwhile. The key
+  constraint and NOT NULL of the new column are validated before the swap.
+- the stored schema is replaced in the transaction of the swap, i.e., it never
+  describes a half-migrated table. If the migration fails before, the columns
+  and triggers added for it are dropped again.
+
+Changes that cannot be done online (renaming the table, changing foreign keys
+or, on sqlite, the primary key and the type of its fields) are reported as
+errors.
+"""
+
+import logging
+from collections.abc import Callable
+from contextlib import AbstractContextManager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any, cast
+
+from sqlalchemy import Connection, Engine, MetaData, Table, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.types import to_instance
+from sqlmodel import Session, col, select
+
+from app.api.crud.aggregate import create_rollups
+from app.api.crud.data import bump_data_version
+from app.api.crud.schema import schema_cache, update_schema
+from app.core.config import settings
+from app.models.schema import TableMigration
+from app.schema_manager import SchemaManager
+from app.schema_manager.mappings import map_db_types
+from app.schema_manager.schema_manager import DbDialect, sql_identifier
+
+logger = logging.getLogger(__name__)
+
+_DIALECTS = {"postgresql": postgresql.dialect(), "sqlite": sqlite.dialect()}
+
+
+@dataclass(frozen=True)
+class Backfill:
+    """Fill a column of a table in batches of the key column
+
+    Attributes:
+        table (str): Name of the table
+        column (str): Name of the column to fill
+        expression (str): SQL expression computing the value of the column
+        key_column (str): Integer column used to split the table into batches
+    """
+
+    table: str
+    column: str
+    expression: str
+    key_column: str
+
+
+@dataclass
+class MigrationPlan:
+    """DDL turning the table of one schema version into that of another
+
+    Attributes:
+        table (str): Name of the table
+        statements (list[str]): Statements run before the backfills
+        backfills (list[Backfill]): Columns to fill in batches
+        prepare (list[str]): Statements run after the backfills, e.g., to
+            validate the constraints of the new columns
+        swap (list[str]): Statements run in a single transaction after
+            prepare, which replace the old columns by the new ones
+        finalize (list[str]): Statements run after the swap
+        rollback (list[str]): Statements undoing statements and prepare if
+            the migration fails before the swap
+        errors (list[str]): Changes that cannot be migrated
+    """
+
+    table: str
+    statements: list[str] = field(default_factory=list)
+    backfills: list[Backfill] = field(default_factory=list)
+    prepare: list[str] = field(default_factory=list)
+    swap: list[str] = field(default_factory=list)
+    finalize: list[str] = field(default_factory=list)
+    rollback: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.statements
+            or self.backfills
+            or self.prepare
+            or self.swap
+            or self.finalize
+        )
+
+    @property
+    def is_complete(self) -> bool:
+        """True if nothing is left to do after apply_migration"""
+        return not (self.backfills or self.prepare or self.swap or self.finalize)
+
+
+def _fields(schema: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    return {f["name"]: f for f in schema.get("fields", [])}
+
+
+def _foreign_keys(schema: dict[str, Any]) -> list[Any]:
+    return sorted(
+        (repr(fkey["fields"]), repr(fkey["reference"]))
+        for fkey in schema.get("foreignKeys") or []
+    )
+
+
+def plan_migration(
+    old: dict[str, Any],
+    new: dict[str, Any],
+    db_dialect: DbDialect = "postgresql",
+    id_column: str = "id_",
+    partitioned: bool = False,
+    key_constraint: bool = True,
+) -> MigrationPlan:
+    """Plan the migration of a table from one schema version to another
+
+    Args:
+        old (dict[str, Any]): The schema the table was created from
+        new (dict[str, Any]): The new version of the schema
+        db_dialect (DbDialect): Database dialect. Defaults to "postgresql".
+        id_column (str): Integer primary key of the table used to backfill in
+            batches. Defaults to "id_".
+        partitioned (bool): The table is partitioned. PostgreSQL cannot
+            create or drop indexes of partitioned tables concurrently, i.e.,
+            they are created while locking writes. Defaults to False.
+        key_constraint (bool): The table has the unique constraint of the key
+            of the old schema. Tables created before keys were derived from
+            the value field lack it, i.e., it is added even if the key is
+            unchanged, see has_unique_key. Defaults to True.
+
+    Returns:
+        MigrationPlan: The statements to run. Check errors before applying it.
+    """
+    dialect = _DIALECTS[db_dialect]
+    quote = dialect.identifier_preparer.quote
+    db_types = cast(dict[str, Any], map_db_types[db_dialect])
+    table_name = old["name"]
+    table = quote(table_name)
+    plan = MigrationPlan(table=table_name)
+    postgres = db_dialect == "postgresql"
+    concurrently = postgres and not partitioned
+
+    if new["name"] != old["name"]:
+        plan.errors.append(f"The table cannot be renamed to {new['name']}")
+    if _foreign_keys(old) != _foreign_keys(new):
+        plan.errors.append("Foreign keys cannot be changed")
+    if plan.errors:
+        return plan
+
+    def column_type(f: dict[str, Any]) -> str:
+        return to_instance(db_types[f["type"]]).compile(dialect=dialect)
+
+    old_fields, new_fields = _fields(old), _fields(new)
+    retyped = [
+        name
+        for name, new_field in new_fields.items()
+        if name in old_fields and old_fields[name]["type"] != new_field["type"]
+    ]
+    old_key = SchemaManager.natural_key(old)
+    new_key = SchemaManager.natural_key(new)
+    key_retyped = bool(set(retyped) & set(new_key))
+    if not postgres and old_key != new_key:
+        plan.errors.append("The primary key can only be changed on PostgreSQL")
+    if not postgres and set(retyped) & {*old_key, *new_key}:
+        plan.errors.append(
+            "Fields of the primary key can only be retyped on PostgreSQL"
+        )
+    if partitioned and retyped:
+        column = SchemaManager.partition_from_schema(old)["column"]
+        if column in retyped:
+            plan.errors.append(f"The partitioning field {column} cannot be retyped")
+    if plan.errors:
+        return plan
+
+    # indexes and NOT NULL columns are taken from tables of both versions
+    manager = SchemaManager()
+    model = manager.model_from_schema(
+        new, db_dialect=db_dialect, create_id_column=id_column
+    )
+    new_table = Table(table_name, MetaData(), *model["columns"], *model["indexes"])
+    old_model = manager.model_from_schema(
+        old, db_dialect=db_dialect, create_id_column=id_column
+    )
+    old_table = Table(table_name, MetaData(), *old_model["columns"])
+    loosened = [
+        name
+        for name in new_fields.keys() & old_fields.keys()
+        if name not in retyped
+        and not old_table.c[name].nullable
+        and new_table.c[name].nullable
+    ]
+    if loosened and not postgres:
+        plan.errors.append("Required fields can only become optional on PostgreSQL")
+        return plan
+
+    synced: dict[str, tuple[str, str]] = {}
+    added: list[str] = []
+    for name, new_field in new_fields.items():
+        if name not in old_fields:
+            # nullable and without default, i.e., no rewrite of the table
+            plan.statements.append(
+                f"ALTER TABLE {table} ADD COLUMN {quote(name)} {column_type(new_field)}"
+            )
+            added.append(quote(name))
+            # there are no values to fill in, i.e., this fails if the table
+            # has rows
+            if not new_table.c[name].nullable:
+                plan.prepare += _not_null(
+                    quote, table_name, quote(name), name, db_dialect, concurrently
+                )
+        elif name in retyped:
+            tmp = quote(sql_identifier(name, "new"))
+            new_type = column_type(new_field)
+            synced[name] = (tmp, new_type)
+            added.append(tmp)
+            plan.statements.append(f"ALTER TABLE {table} ADD COLUMN {tmp} {new_type}")
+            plan.backfills.append(
+                Backfill(
+                    table=table_name,
+                    column=sql_identifier(name, "new"),
+                    expression=f"CAST({quote(name)} AS {new_type})",
+                    key_column=id_column,
+                )
+            )
+            if not new_table.c[name].nullable:
+                plan.prepare += _not_null(
+                    quote, table_name, tmp, name, db_dialect, concurrently
+                )
+            plan.swap += [
+                f"ALTER TABLE {table} DROP COLUMN {quote(name)}",
+                f"ALTER TABLE {table} RENAME COLUMN {tmp} TO {quote(name)}",
+            ]
+        elif old_table.c[name].nullable and not new_table.c[name].nullable:
+            # e.g., the field became required, which fails for null values
+            column = quote(name)
+            plan.prepare += _not_null(
+                quote, table_name, column, name, db_dialect, concurrently
+            )
+            if postgres:
+                check = quote(sql_identifier(table_name, name, "not_null"))
+                plan.rollback += [
+                    f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}",
+                    f"ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL",
+                ]
+        elif name in loosened:
+            plan.statements.append(
+                f"ALTER TABLE {table} ALTER COLUMN {quote(name)} DROP NOT NULL"
+            )
+    if synced:
+        create, drop = _sync_triggers(
+            quote, table_name, synced, quote(id_column), db_dialect
+        )
+        plan.statements += create
+        plan.swap[:0] = drop
+        plan.rollback += drop
+    for name in old_fields.keys() - new_fields.keys():
+        plan.finalize.append(f"ALTER TABLE {table} DROP COLUMN {quote(name)}")
+
+    old_indexes = {
+        str(ix.name) for ix in SchemaManager.indexes_from_schema(old, db_dialect)
+    }
+    for index in sorted(new_table.indexes, key=lambda ix: str(ix.name)):
+        # indexes of retyped columns are dropped together with the old column
+        include = index.dialect_options["postgresql"]["include"] or []
+        indexed = {*index.columns.keys(), *include}
+        if index.name in old_indexes and not set(retyped) & indexed:
+            continue
+        index.dialect_options["postgresql"]["concurrently"] = concurrently
+        create_index = CreateIndex(index, if_not_exists=True)
+        plan.finalize.append(str(create_index.compile(dialect=dialect)))
+    new_index_names = {str(ix.name) for ix in new_table.indexes}
+    for index_name in sorted(old_indexes - new_index_names):
+        option = "CONCURRENTLY " if concurrently else ""
+        plan.statements.append(f"DROP INDEX {option}IF EXISTS {quote(index_name)}")
+
+    # the key constraint is replaced in the swap, i.e., while the old schema
+    # is stored, its upserts find the old constraint. It is dropped together
+    # with a retyped column of the key.
+    if old_key and old_key != new_key:
+        old_name = quote(f"unique_{table_name}_{'_'.join(old_key)}")
+        plan.swap.append(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {old_name}")
+    if new_key and (old_key != new_key or key_retyped or not key_constraint):
+        new_name = f"unique_{table_name}_{'_'.join(new_key)}"
+        option = "CONCURRENTLY " if concurrently else ""
+        # the index is built on the new columns and attached in the swap
+        index_name = quote(sql_identifier(new_name, "new"))
+        columns = ", ".join(synced[c][0] if c in synced else quote(c) for c in new_key)
+        plan.prepare.append(
+            f"CREATE UNIQUE INDEX {option}IF NOT EXISTS {index_name} "
+            f"ON {table} ({columns})"
+        )
+        plan.swap.append(
+            f"ALTER TABLE {table} ADD CONSTRAINT {quote(new_name)} "
+            f"UNIQUE USING INDEX {index_name}"
+        )
+        plan.rollback.append(f"DROP INDEX {option}IF EXISTS {index_name}")
+    plan.rollback += [f"ALTER TABLE {table} DROP COLUMN {column}" for column in added]
+    return plan
+
+
+def _not_null(
+    quote: Callable[[str], str],
+    table_name: str,
+    column: str,
+    name: str,
+    db_dialect: DbDialect,
+    concurrently: bool,
+) -> list[str]:
+    """Statements making a filled column NOT NULL
+
+    A validated check constraint lets SET NOT NULL skip the scan of the table,
+    i.e., writes are not blocked while the table is scanned by VALIDATE.
+    sqlite cannot change the constraints of a column, i.e., required values
+    are only checked by the validation of the rows.
+    """
+    if db_dialect != "postgresql":
+        return []
+    table = quote(table_name)
+    if not concurrently:
+        return [f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"]
+    check = quote(sql_identifier(table_name, name, "not_null"))
+    return [
+        f"ALTER TABLE {table} ADD CONSTRAINT {check} "
+        f"CHECK ({column} IS NOT NULL) NOT VALID",
+        f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}",
+        f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL",
+        f"ALTER TABLE {table} DROP CONSTRAINT {check}",
+    ]
+
+
+def _sync_triggers(
+    quote: Callable[[str], str],
+    table_name: str,
+    columns: dict[str, tuple[str, str]],
+    key_column: str,
+    db_dialect: DbDialect,
+) -> tuple[list[str], list[str]]:
+    """Statements creating and dropping the triggers that set the new columns of
+    retyped fields on every insert and update, i.e., rows written during or
+    after the backfill are migrated, too.
+
+    Args:
+        quote (Callable[[str], str]): Quotes identifiers of the dialect
+        table_name (str): Name of the table
+        columns (dict[str, tuple[str, str]]): The quoted new column and its
+            type by retyped field
+        key_column (str): Quoted integer primary key of the table
+        db_dialect (DbDialect): Database dialect
+
+    Returns:
+        tuple[list[str], list[str]]: The statements creating and dropping the
+            triggers
+    """
+    table = quote(table_name)
+    if db_dialect == "postgresql":
+        function = quote(sql_identifier(table_name, "migrate"))
+        assignments = " ".join(
+            f"NEW.{tmp} := CAST(NEW.{quote(name)} AS {new_type});"
+            for name, (tmp, new_type) in columns.items()
+        )
+        drop_trigger = f"DROP TRIGGER IF EXISTS {function} ON {table}"
+        return [
+            f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$ "
+            f"BEGIN {assignments} RETURN NEW; END $$ LANGUAGE plpgsql",
+            drop_trigger,
+            f"CREATE TRIGGER {function} BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {function}()",
+        ], [drop_trigger, f"DROP FUNCTION IF EXISTS {function}()"]
+    # sqlite cannot change the row in a trigger but update it afterwards
+    assignments = ", ".join(
+        f"{tmp} = CAST(NEW.{quote(name)} AS {new_type})"
+        for name, (tmp, new_type) in columns.items()
+    )
+    update = f"UPDATE {table} SET {assignments} WHERE {key_column} = NEW.{key_column};"
+    fields = ", ".join(quote(name) for name in columns)
+    insert_trigger = quote(sql_identifier(table_name, "migrate_insert"))
+    update_trigger = quote(sql_identifier(table_name, "migrate_update"))
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {insert_trigger} AFTER INSERT ON {table} "
+        f"BEGIN {update} END",
+        f"CREATE TRIGGER IF NOT EXISTS {update_trigger} AFTER UPDATE OF {fields} "
+        f"ON {table} BEGIN {update} END",
+    ], [
+        f"DROP TRIGGER IF EXISTS {insert_trigger}",
+        f"DROP TRIGGER IF EXISTS {update_trigger}",
+    ]
+
+
+def _execute(
+    engine: Engine,
+    statements: list[str],
+    atomic: bool = False,
+    then: Callable[[Connection], None] | None = None,
+) -> None:
+    """Run each statement in its own transaction or all in a single one
+
+    On PostgreSQL, a lock timeout makes statements fail instead of queuing
+    behind long running transactions, which would block all other queries of
+    the table while waiting for the lock. then is called with the connection
+    after the statements, i.e., within the transaction if atomic.
+    """
+    if not statements and then is None:
+        return
+    milliseconds = round(settings.MIGRATION_LOCK_TIMEOUT * 1000)
+    context: AbstractContextManager[Connection]
+    if atomic:
+        context = engine.begin()
+    else:
+        context = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    with context as conn:
+        if conn.dialect.name == "postgresql":
+            scope = "LOCAL " if atomic else ""
+            conn.execute(text(f"SET {scope}lock_timeout = '{milliseconds}ms'"))
+        elif atomic:
+            # pysqlite only begins a transaction before DML, not before DDL
+            conn.exec_driver_sql("BEGIN")
+        for statement in statements:
+            logger.info(statement)
+            conn.execute(text(statement))
+        if then is not None:
+            then(conn)
+
+
+def run_backfill(
+    engine: Engine, backfill: Backfill, batch_size: int | None = None
+) -> int:
+    """Fill a column in batches. Each batch is committed on its own, i.e.,
+    rows are only locked for the duration of their batch.
+
+    Args:
+        engine (Engine): Database engine
+        backfill (Backfill): The column to fill
+        batch_size (int | None): Range of key values per batch.
+            Defaults to settings.MIGRATION_BATCH_SIZE.
+
+    Returns:
+        int: Number of updated rows
+    """
+    batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+    quote = engine.dialect.identifier_preparer.quote
+    table, key = quote(backfill.table), quote(backfill.key_column)
+    with engine.connect() as conn:
+        bounds = conn.execute(text(f"SELECT MIN({key}), MAX({key}) FROM {table}")).one()
+    if bounds[0] is None:
+        return 0
+    updated = 0
+    update = text(
+        f"UPDATE {table} SET {quote(backfill.column)} = {backfill.expression} "
+        f"WHERE {key} >= :lower AND {key} < :upper"
+    )
+    for lower in range(bounds[0], bounds[1] + 1, batch_size):
+        with engine.begin() as conn:
+            result = conn.execute(update, {"lower": lower, "upper": lower + batch_size})
+            updated += result.rowcount
+    return updated
+
+
+def apply_migration(engine: Engine, plan: MigrationPlan) -> None:
+    """Run the statements of a plan that come before the backfills
+
+    Args:
+        engine (Engine): Database engine
+        plan (MigrationPlan): The migration plan
+
+    Raises:
+        ValueError: If the plan contains errors
+    """
+    if plan.errors:
+        raise ValueError("; ".join(plan.errors))
+    _execute(engine, plan.statements)
+    if plan.statements:
+        _bump_version(engine, plan.table)
+
+
+def complete_migration(
+    engine: Engine,
+    plan: MigrationPlan,
+    schema_id: int | None = None,
+    schema: dict[str, Any] | None = None,
+) -> None:
+    """Run the backfills of a plan and the statements that follow them.
+    Meant to run in the background after apply_migration.
+
+    Args:
+        engine (Engine): Database engine
+        plan (MigrationPlan): The migration plan
+        schema_id (int | None): Id of the stored schema of the table. Defaults
+            to None, i.e., the stored schema is not changed.
+        schema (dict[str, Any] | None): New version of the schema. It replaces
+            the stored schema in the transaction of the swap and its missing
+            rollups are created afterwards. Defaults to None.
+
+    Raises:
+        Exception: If a step fails. If the swap was not committed, the columns
+            and triggers added by the plan are dropped again.
+    """
+
+    def write_schema(conn: Connection) -> None:
+        if schema_id is not None and schema is not None:
+            update_schema(db=Session(bind=conn), schema_id=schema_id, schema=schema)
+
+    try:
+        for backfill in plan.backfills:
+            rows = run_backfill(engine, backfill)
+            logger.info(f"Backfilled {rows} rows of {backfill.table}.{backfill.column}")
+        _execute(engine, plan.prepare)
+        _execute(engine, plan.swap, atomic=True, then=write_schema)
+    except Exception:
+        rollback_migration(engine, plan)
+        raise
+    if schema_id is not None and schema is not None:
+        # the schema may have been cached before the swap was committed
+        schema_cache.invalidate(schema_id=schema_id, schema_name=plan.table)
+        if schema.get("rollups"):
+            with Session(engine) as db:
+                create_rollups(db, schema)
+                db.commit()
+    _execute(engine, plan.finalize)
+    _bump_version(engine, plan.table)
+
+
+def rollback_migration(engine: Engine, plan: MigrationPlan) -> None:
+    """Drop the columns and triggers added by a plan that failed before its
+    swap. Statements that fail, e.g., as their step was never reached, are
+    skipped.
+
+    Args:
+        engine (Engine): Database engine
+        plan (MigrationPlan): The migration plan
+    """
+    for statement in plan.rollback:
+        try:
+            _execute(engine, [statement])
+        except Exception as e:
+            logger.warning(f"Rollback of the migration of {plan.table}: {e}")
+    if plan.rollback:
+        _bump_version(engine, plan.table)
+
+
+def start_migration(db: Session, table_name: str) -> int:
+    """Record that the migration of a table is completed in the background
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table
+
+    Returns:
+        int: Id of the running migration
+    """
+    migration = TableMigration(table_name=table_name)
+    db.add(migration)
+    db.commit()
+    db.refresh(migration)
+    return cast(int, migration.id)
+
+
+def read_migration(db: Session, table_name: str) -> TableMigration | None:
+    """Get the latest migration of a table
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table
+
+    Returns:
+        TableMigration | None: The migration or None if the table was never
+            migrated in the background
+    """
+    statement = (
+        select(TableMigration)
+        .where(TableMigration.table_name == table_name)
+        .order_by(col(TableMigration.id).desc())
+    )
+    return db.exec(statement).first()
+
+
+def run_migration(
+    engine: Engine,
+    plan: MigrationPlan,
+    migration_id: int,
+    schema_id: int | None = None,
+    schema: dict[str, Any] | None = None,
+) -> None:
+    """Complete a migration and record whether it succeeded. Errors are
+    recorded instead of raised, i.e., this is meant to run as background task.
+
+    Args:
+        engine (Engine): Database engine
+        plan (MigrationPlan): The migration plan
+        migration_id (int): Id of the TableMigration, see start_migration
+        schema_id (int | None): Id of the stored schema, see
+            complete_migration. Defaults to None.
+        schema (dict[str, Any] | None): New version of the schema, see
+            complete_migration. Defaults to None.
+    """
+    error = None
+    try:
+        complete_migration(engine, plan, schema_id=schema_id, schema=schema)
+    except Exception as e:
+        logger.exception(f"Migration of {plan.table} failed")
+        error = str(e)
+    with Session(engine) as db:
+        migration = db.get(TableMigration, migration_id)
+        if migration is None:
+            return
+        migration.status = "succeeded" if error is None else "failed"
+        migration.error = error
+        migration.finished_at = datetime.now(UTC)
+        db.add(migration)
+        db.commit()
+
+
+def _bump_version(engine: Engine, table_name: str) -> None:
+    """Invalidate the cached results of a migrated table"""
+    with Session(engine) as db:
+        bump_data_version(db, table_name)
+        db.commit()
@@ -0,0 +1,390 @@
+"""Maintenance of range partitioned time-series tables (PostgreSQL only).
+
+Data tables of time-series schemas can be partitioned by their main time
+field, see SchemaManager.partition_from_schema. Partitions are created ahead
+of time and partitions older than the retention window are detached, i.e.,
+they are kept as plain tables that can be archived or dropped. Detached
+partitions are renamed, so that the partition of their range can be created
+again for late rows. Partitions of rows outside of the window are created when
+the rows are loaded, see ensure_partitions.
+
+Run the maintenance for all partitioned tables, e.g., daily by cron
+(from the backend directory):
+    python -m app.api.crud.partition
+"""
+
+import logging
+import re
+from collections.abc import Iterable
+from datetime import UTC, date, datetime, timedelta
+from typing import Any
+
+from sqlmodel import Session, text
+
+from app.core.config import settings
+from app.schema_manager import SchemaManager
+from app.schema_manager.schema_manager import sql_identifier
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = ("day", "week", "month", "year")
+
+_BOUNDS = re.compile(r"FROM \('([^']*)'\) TO \('([^']*)'\)")
+
+
+def truncate(ts: datetime, interval: str) -> datetime:
+    """Truncate a timestamp to the start of its interval. Weeks start on Monday
+
+    Args:
+        ts (datetime): The timestamp
+        interval (str): One of INTERVALS
+
+    Returns:
+        datetime: Start of the interval containing the timestamp
+    """
+    ts = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "day":
+        return ts
+    if interval == "week":
+        return ts - timedelta(days=ts.weekday())
+    if interval == "month":
+        return ts.replace(day=1)
+    if interval == "year":
+        return ts.replace(month=1, day=1)
+    raise ValueError(f"Interval {interval} is not supported. Use one of {INTERVALS}")
+
+
+def shift(ts: datetime, interval: str, n: int = 1) -> datetime:
+    """Move the start of an interval by n intervals
+
+    Args:
+        ts (datetime): Start of an interval, see truncate
+        interval (str): One of INTERVALS
+        n (int): Number of intervals, may be negative. Defaults to 1.
+
+    Returns:
+        datetime: Start of the shifted interval
+    """
+    if interval == "day":
+        return ts + timedelta(days=n)
+    if interval == "week":
+        return ts + timedelta(weeks=n)
+    if interval == "month":
+        months = ts.year * 12 + ts.month - 1 + n
+        return ts.replace(year=months // 12, month=months % 12 + 1)
+    if interval == "year":
+        return ts.replace(year=ts.year + n)
+    raise ValueError(f"Interval {interval} is not supported. Use one of {INTERVALS}")
+
+
+def partition_name(table_name: str, lower: datetime) -> str:
+    """Name of the partition of a table starting at lower"""
+    return sql_identifier(table_name, f"p{lower:%Y%m%d}")
+
+
+def _as_datetime(value: datetime | date) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime(value.year, value.month, value.day)
+
+
+def partition_window(
+    interval: str,
+    now: datetime | None = None,
+    ahead: int | None = None,
+    behind: int | None = None,
+) -> tuple[datetime, datetime]:
+    """Range covered by the partitions around the current one
+
+    Args:
+        interval (str): Range of each partition. One of INTERVALS
+        now (datetime | None): Current time. Defaults to the current UTC time.
+        ahead (int | None): Number of future partitions. Defaults to
+            settings.DATA_PARTITIONS_AHEAD.
+        behind (int | None): Number of past partitions. Defaults to
+            settings.DATA_PARTITIONS_BEHIND.
+
+    Returns:
+        tuple[datetime, datetime]: Start and (exclusive) end of the window
+    """
+    now = now or datetime.now(UTC).replace(tzinfo=None)
+    ahead = settings.DATA_PARTITIONS_AHEAD if ahead is None else ahead
+    behind = settings.DATA_PARTITIONS_BEHIND if behind is None else behind
+    current = truncate(now, interval)
+    return shift(current, interval, -behind), shift(current, interval, ahead + 1)
+
+
+def list_partitions(
+    db: Session, table_name: str
+) -> list[tuple[str, datetime, datetime]]:
+    """List the attached range partitions of a table
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the partitioned table
+
+    Returns:
+        list[tuple[str, datetime, datetime]]: Name, lower bound (inclusive) and
+            upper bound (exclusive) of each partition ordered by lower bound
+    """
+    rows = db.exec(  # type: ignore[call-overload]
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table_name"
+        ),
+        params={"table_name": table_name},
+    )
+    partitions = []
+    for name, bound in rows:
+        # the default partition has no bounds
+        if match := _BOUNDS.search(bound or ""):
+            lower, upper = (datetime.fromisoformat(b) for b in match.groups())
+            partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partitions(
+    db: Session,
+    table_name: str,
+    interval: str,
+    start: datetime | date,
+    end: datetime | date,
+) -> list[str]:
+    """Create the missing partitions of a table covering [start, end)
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        table_name (str): Name of the partitioned table
+        interval (str): Range of each partition. One of INTERVALS
+        start (datetime | date): First timestamp to cover
+        end (datetime | date): End of the range to cover (exclusive)
+
+    Returns:
+        list[str]: Names of the created partitions
+    """
+    existing = {lower for _, lower, _ in list_partitions(db, table_name)}
+    created = []
+    lower = truncate(_as_datetime(start), interval)
+    while lower < _as_datetime(end):
+        if lower not in existing:
+            created.append(_create_partition(db, table_name, interval, lower))
+        lower = shift(lower, interval)
+    return created
+
+
+def ensure_partitions(
+    db: Session,
+    table_name: str,
+    interval: str,
+    times: Iterable[datetime | date],
+    known: set[datetime] | None = None,
+) -> list[str]:
+    """Create the missing partitions of a table that contain the given times,
+    e.g., before a chunk of rows is loaded into the table
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        table_name (str): Name of the partitioned table
+        interval (str): Range of each partition. One of INTERVALS
+        times (Iterable[datetime | date]): Times of the rows. None is ignored.
+        known (set[datetime] | None): Lower bounds of partitions known to
+            exist. The bounds of the given times are added, i.e., if the same
+            set is passed for all chunks, the partitions are only listed for
+            times outside the known partitions. Defaults to None.
+
+    Returns:
+        list[str]: Names of the created partitions
+    """
+    known = set() if known is None else known
+    lowers = {truncate(_as_datetime(t), interval) for t in times if t is not None}
+    lowers -= known
+    if not lowers:
+        return []
+    existing = {lower for _, lower, _ in list_partitions(db, table_name)}
+    created = [
+        _create_partition(db, table_name, interval, lower)
+        for lower in sorted(lowers - existing)
+    ]
+    known.update(lowers)
+    return created
+
+
+def _create_partition(
+    db: Session, table_name: str, interval: str, lower: datetime
+) -> str:
+    """Create the partition of a table starting at lower and return its name"""
+    quote = db.bind.dialect.identifier_preparer.quote  # type: ignore[union-attr]
+    name = partition_name(table_name, lower)
+    upper = shift(lower, interval)
+    db.exec(  # type: ignore[call-overload]
+        text(
+            f"CREATE TABLE IF NOT EXISTS {quote(name)} "
+            f"PARTITION OF {quote(table_name)} "
+            f"FOR VALUES FROM ('{lower.isoformat(sep=' ')}') "
+            f"TO ('{upper.isoformat(sep=' ')}')"
+        )
+    )
+    return name
+
+
+def detach_partitions(
+    db: Session, table_name: str, before: datetime, now: datetime | None = None
+) -> list[str]:
+    """Detach all partitions of a table that only contain data before a time
+
+    The detached partitions are kept as plain tables. They are renamed to
+    "{partition}_detached_{time of detachment}", i.e., the partition of their
+    range can be created again if rows of the range are loaded later on, see
+    ensure_partitions.
+
+    Args:
+        db (Session): Database session. The session is not committed.
+        table_name (str): Name of the partitioned table
+        before (datetime): Partitions ending at or before this are detached
+        now (datetime | None): Time of detachment. Defaults to the current
+            UTC time.
+
+    Returns:
+        list[str]: Names of the detached tables
+    """
+    quote = db.bind.dialect.identifier_preparer.quote  # type: ignore[union-attr]
+    now = now or datetime.now(UTC)
+    detached = []
+    for name, _, upper in list_partitions(db, table_name):
+        if upper <= before:
+            new_name = sql_identifier(name, "detached", f"{now:%Y%m%d%H%M%S}")
+            db.exec(  # type: ignore[call-overload]
+                text(f"ALTER TABLE {quote(table_name)} DETACH PARTITION {quote(name)}")
+            )
+            db.exec(  # type: ignore[call-overload]
+                text(f"ALTER TABLE {quote(name)} RENAME TO {quote(new_name)}")
+            )
+            detached.append(new_name)
+    return detached
+
+
+def maintain_partitions(
+    db: Session,
+    table_name: str,
+    interval: str,
+    now: datetime | None = None,
+    ahead: int | None = None,
+    behind: int | None = None,
+    retain: int | None = None,
+) -> dict[str, list[str]]:
+    """Create the partitions of the window around now and detach old ones
+
+    The data version of the table is incremented with the detachment, i.e.,
+    cached results of the table are invalidated.
+
+    Args:
+        db (Session): Database session. The session is committed.
+        table_name (str): Name of the partitioned table
+        interval (str): Range of each partition. One of INTERVALS
+        now (datetime | None): Current time. Defaults to the current UTC time.
+        ahead (int | None): Number of future partitions. Defaults to
+            settings.DATA_PARTITIONS_AHEAD.
+        behind (int | None): Number of past partitions. Defaults to
+            settings.DATA_PARTITIONS_BEHIND.
+        retain (int | None): Number of past partitions to keep attached. Older
+            partitions are detached. Defaults to settings.DATA_PARTITIONS_RETAIN.
+            If that is None as well, no partition is detached.
+
+    Returns:
+        dict[str, list[str]]: Names of the "created" partitions and of the
+            "detached" tables
+    """
+    from app.api.crud.data import bump_data_version
+
+    now = now or datetime.now(UTC).replace(tzinfo=None)
+    retain = settings.DATA_PARTITIONS_RETAIN if retain is None else retain
+    start, end = partition_window(interval, now, ahead, behind)
+    try:
+        created = create_partitions(db, table_name, interval, start, end)
+        detached = []
+        if retain is not None:
+            before = shift(truncate(now, interval), interval, -retain)
+            detached = detach_partitions(db, table_name, before, now)
+        if detached:
+            # the rows of the detached partitions are gone from the table
+            bump_data_version(db, table_name)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"created": created, "detached": detached}
+
+
+def partitioned_tables(db: Session) -> list[str]:
+    """Names of all partitioned tables of the database"""
+    rows = db.exec(  # type: ignore[call-overload]
+        text(
+            "SELECT c.relname FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid"
+        )
+    )
+    return sorted(name for (name,) in rows)
+
+
+def partition_interval(db: Session, schema: dict[str, Any]) -> str | None:
+    """Interval of the partitions of the table of a schema
+
+    Args:
+        db (Session): Database session
+        schema (dict[str, Any]): Schema of the table
+
+    Returns:
+        str | None: One of INTERVALS or None if the table is not partitioned
+    """
+    if db.bind.dialect.name != "postgresql":  # type: ignore[union-attr]
+        return None
+    if schema["name"] not in partitioned_tables(db):
+        return None
+    return SchemaManager.partition_from_schema(schema)["interval"]
+
+
+def maintain_all_partitions(db: Session, **kwargs: Any) -> dict[str, Any]:
+    """Maintain the partitions of all partitioned data tables
+
+    The interval of each table is derived from its schema.
+
+    Args:
+        db (Session): Database session
+        **kwargs: Passed to maintain_partitions
+
+    Returns:
+        dict[str, Any]: Created and detached partitions by table
+    """
+    # imported here as the schema crud module imports this module
+    from app.api.crud.schema import read_schema
+
+    result = {}
+    for table_name in partitioned_tables(db):
+        try:
+            schema = read_schema(db=db, schema_name=table_name)
+        except ValueError:
+            continue
+        partition = SchemaManager.partition_from_schema(schema.jsonschema)
+        result[table_name] = maintain_partitions(
+            db, table_name, partition["interval"], **kwargs
+        )
+    return result
+
+
+def main() -> None:
+    from app.core.db import engine
+
+    with Session(engine) as db:
+        for table_name, changes in maintain_all_partitions(db).items():
+            logger.info(
+                f"{table_name}: created {changes['created']}, "
+                f"detached {changes['detached']}"
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
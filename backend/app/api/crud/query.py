@@ -0,0 +1,264 @@
+"""Reading the data of the tables created from schemas.
+
+Rows are filtered by a range of a time field and by values of the location
+fields, i.e., by the columns indexed by SchemaManager.indexes_from_schema, and
+paginated by their id: a page is the next rows with an id greater than the
+last id of the previous page. Unlike OFFSET, no skipped rows are read, i.e.,
+every page costs the same however deep it is.
+"""
+
+from collections.abc import Mapping, Sequence
+from typing import Any, cast
+
+from sqlalchemy import (
+    ColumnClause,
+    ColumnElement,
+    Select,
+    TableClause,
+    column,
+    inspect,
+    select,
+    table,
+)
+from sqlalchemy.exc import NoSuchTableError
+from sqlmodel import Session
+
+from app.schema_manager import SchemaManager
+from app.schema_manager.mappings import map_db_types
+from app.schema_manager.validator import PARSERS
+
+
+def id_column(db: Session, table_name: str, fields: Sequence[str]) -> str:
+    """Get the id column of a table created by create_table_from_schema
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table
+        fields (Sequence[str]): Names of the fields of the schema
+
+    Returns:
+        str: Name of the id column, i.e., the primary key column that is not a
+            field of the schema
+
+    Raises:
+        ValueError: If the table does not exist or has no id column
+    """
+    try:
+        constraint = inspect(db.get_bind()).get_pk_constraint(table_name)
+    except NoSuchTableError:
+        raise ValueError(f"Table {table_name} not found") from None
+    primary_key = constraint["constrained_columns"]
+    ids = [c for c in primary_key if c not in fields]
+    if len(ids) != 1:
+        raise ValueError(f"Table {table_name} has no id column")
+    return ids[0]
+
+
+def data_table(
+    db: Session, schema: dict[str, Any], id_name: str | None = None
+) -> TableClause:
+    """Lightweight table of a schema with typed columns, i.e., without
+    reflecting the table
+
+    Args:
+        db (Session): Database session
+        schema (dict[str, Any]): Schema of the table
+        id_name (str | None): Name of the id column. Defaults to None, i.e.,
+            the table has the fields only.
+
+    Returns:
+        TableClause: The table with the id column and the fields
+    """
+    dialect = db.get_bind().dialect.name
+    db_types = cast(dict[str, Any], map_db_types[dialect])  # type: ignore[index]
+    columns: list[ColumnClause[Any]] = [
+        column(f["name"], db_types[f["type"]]) for f in schema["fields"]
+    ]
+    if id_name is not None:
+        columns.insert(0, column(id_name, db_types["integer"]))
+    return table(schema["name"], *columns)
+
+
+def _parse(field: dict[str, Any], value: Any) -> Any:
+    try:
+        return PARSERS[field["type"]](value)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"{field['name']}: {value!r} is not a {field['type']}") from e
+
+
+def resolve_time_field(schema: dict[str, Any], time_field: str | None = None) -> str:
+    """Check a time field of a schema or get its main time field
+
+    Args:
+        schema (dict[str, Any]): Schema of the table
+        time_field (str | None): Name of a time field. Defaults to None, which
+            uses the main time field, see SchemaManager.main_time_field.
+
+    Returns:
+        str: Name of the time field
+
+    Raises:
+        ValueError: If the field is not a time field or the schema has none
+    """
+    time_fields = [t["field"] for t in schema.get("timeFields") or []]
+    time_field = time_field or SchemaManager.main_time_field(schema)
+    if time_field is None or time_field not in time_fields:
+        raise ValueError(f"Time field must be one of {time_fields}")
+    return time_field
+
+
+def data_filters(
+    schema: dict[str, Any],
+    target: TableClause,
+    time_field: str | None = None,
+    start: Any = None,
+    end: Any = None,
+    locations: Mapping[str, Sequence[Any]] | None = None,
+) -> list[ColumnElement[bool]]:
+    """Conditions on the time range and the locations of rows
+
+    Args:
+        schema (dict[str, Any]): Schema of the table
+        target (TableClause): The table, see data_table
+        time_field (str | None): Time field filtered by start and end. Defaults
+            to None, which uses the main time field.
+        start (Any): Rows from this time on (inclusive). Raw values are parsed
+            by the type of the time field. Defaults to None.
+        end (Any): Rows before this time (exclusive). Defaults to None.
+        locations (Mapping[str, Sequence[Any]] | None): Values by location
+            field. Only rows with one of the values are read. Defaults to None.
+
+    Returns:
+        list[ColumnElement[bool]]: The conditions
+
+    Raises:
+        ValueError: If a field is not a time or location field of the schema or
+            a value cannot be parsed
+    """
+    by_name = {f["name"]: f for f in schema["fields"]}
+    conditions: list[ColumnElement[bool]] = []
+    if start is not None or end is not None:
+        time_field = resolve_time_field(schema, time_field)
+        time_column = target.c[time_field]
+        if start is not None:
+            conditions.append(time_column >= _parse(by_name[time_field], start))
+        if end is not None:
+            conditions.append(time_column < _parse(by_name[time_field], end))
+
+    location_fields = [loc["field"] for loc in schema.get("locationFields") or []]
+    for name, values in (locations or {}).items():
+        if name not in location_fields:
+            raise ValueError(f"Location field must be one of {location_fields}")
+        parsed = [_parse(by_name[name], v) for v in values]
+        conditions.append(target.c[name].in_(parsed))
+    return conditions
+
+
+def select_rows(
+    *,
+    db: Session,
+    schema: dict[str, Any],
+    fields: Sequence[str] | None = None,
+    time_field: str | None = None,
+    start: Any = None,
+    end: Any = None,
+    locations: Mapping[str, Sequence[Any]] | None = None,
+) -> Select[Any]:
+    """Select the id and the fields of the filtered rows ordered by id
+
+    Args:
+        db (Session): Database session
+        schema (dict[str, Any]): Schema of the table
+        fields (Sequence[str] | None): Fields to read. The id is always read
+            first. Defaults to None, which reads all fields.
+        time_field (str | None): Time field filtered by start and end. Defaults
+            to None, which uses the main time field.
+        start (Any): Rows from this time on (inclusive). Defaults to None.
+        end (Any): Rows before this time (exclusive). Defaults to None.
+        locations (Mapping[str, Sequence[Any]] | None): Values by location
+            field. Defaults to None.
+
+    Returns:
+        Select[Any]: The query
+
+    Raises:
+        ValueError: If the table does not exist, a field is not a field, time
+            field or location field of the schema or a value cannot be parsed
+    """
+    by_name = {f["name"]: f for f in schema["fields"]}
+    id_name = id_column(db, schema["name"], list(by_name))
+    target = data_table(db, schema, id_name)
+    selected = list(fields or by_name)
+    if unknown := [f for f in selected if f not in by_name]:
+        raise ValueError(f"Unknown fields {unknown}")
+    columns = [target.c[id_name], *(target.c[f] for f in selected if f != id_name)]
+    filters = data_filters(
+        schema, target, time_field=time_field, start=start, end=end, locations=locations
+    )
+    return select(*columns).where(*filters).order_by(target.c[id_name])
+
+
+def query_rows(
+    *,
+    db: Session,
+    schema: dict[str, Any],
+    fields: Sequence[str] | None = None,
+    time_field: str | None = None,
+    start: Any = None,
+    end: Any = None,
+    locations: Mapping[str, Sequence[Any]] | None = None,
+    after: int | None = None,
+    limit: int = 1000,
+) -> dict[str, Any]:
+    """Read a page of the rows of a schema's table ordered by id
+
+    Args:
+        db (Session): Database session
+        schema (dict[str, Any]): Schema of the table
+        fields (Sequence[str] | None): Fields to read. The id is always read.
+            Defaults to None, which reads all fields.
+        time_field (str | None): Time field filtered by start and end. Defaults
+            to None, which uses the main time field, i.e., the first datetime
+            field, otherwise the first date field.
+        start (Any): Rows from this time on (inclusive). Raw values are parsed
+            by the type of the time field. Defaults to None.
+        end (Any): Rows before this time (exclusive). Defaults to None.
+        locations (Mapping[str, Sequence[Any]] | None): Values by location
+            field. Only rows with one of the values are read. Defaults to None.
+        after (int | None): Id of the last row of the previous page. Defaults
+            to None, which reads the first page.
+        limit (int): Maximum number of rows. Defaults to 1000.
+
+    Returns:
+        dict[str, Any]: The "table", the "fields" read, the "rows" by field
+            and the id to read the next page "next_after", None on the last page
+
+    Raises:
+        ValueError: If the table does not exist, a field is not a field, time
+            field or location field of the schema or a value cannot be parsed
+    """
+    query = select_rows(
+        db=db,
+        schema=schema,
+        fields=fields,
+        time_field=time_field,
+        start=start,
+        end=end,
+        locations=locations,
+    )
+    id_ = query.selected_columns[0]
+    if after is not None:
+        query = query.where(id_ > after)
+    # one more row tells whether there is a next page
+    query = query.limit(limit + 1)
+    rows = [dict(row) for row in db.connection().execute(query).mappings()]
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1][id_.name]
+    return {
+        "table": schema["name"],
+        "fields": [c.name for c in query.selected_columns],
+        "rows": rows,
+        "next_after": next_after,
+    }
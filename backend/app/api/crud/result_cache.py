@@ -0,0 +1,217 @@
+"""Cache of the results of queries of the tables created from schemas.
+
+Results are cached as encoded JSON by the schema, the normalized query
+parameters and the write version of the table, see data_version. Every change
+of the data increments the version, i.e., a cached result is never stale and
+entries of older versions are simply not read again.
+
+Results are cached in two tiers: an in-process LRU cache bounded by the total
+size of the results and, optionally, a file storage shared by all processes,
+e.g., the API workers of a host. The keys start with the schema id and a digest
+of the version. Once a result of a new version of a table is cached, the shared
+results of its other versions are deleted, i.e., the shared storage holds about
+one version of each table.
+"""
+
+import hashlib
+import json
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from typing import Any
+
+from app.core.config import settings
+from app.filestorage import FileStorageProtocol, LocalFileStorage
+from app.schema_manager.cache import LRUCache
+
+
+class ResultCache:
+    """Process-wide cache of query results with hit counters per schema"""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        maxbytes: int = 64 * 1024 * 1024,
+        storage: FileStorageProtocol | None = None,
+    ) -> None:
+        """Initialize the cache
+
+        Args:
+            maxsize (int): Maximum number of results cached in process. 0
+                disables the cache. Defaults to 1024.
+            maxbytes (int): Maximum total size of the results cached in
+                process. Defaults to 64 MiB.
+            storage (FileStorageProtocol | None): Shared storage of the
+                results. Defaults to None, i.e., results are only cached in
+                process.
+        """
+        self._cache = (
+            LRUCache(maxsize=maxsize, weigh=len, maxweight=maxbytes)
+            if maxsize > 0
+            else None
+        )
+        self._storage = storage if maxsize > 0 else None
+        self._counts: dict[int, Counter[str]] = {}
+        # version of each schema last cached in the shared storage
+        self._versions: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache is not None
+
+    @staticmethod
+    def key(
+        schema_id: int, endpoint: str, params: Mapping[str, Any], version: Any
+    ) -> str:
+        """Key of a result
+
+        Args:
+            schema_id (int): Id of the schema
+            endpoint (str): Name of the query, e.g., "data"
+            params (Mapping[str, Any]): Parameters of the query. The values of
+                the "locations" are sorted, i.e., their order does not matter.
+            version (Any): Write version of the table and everything else the
+                result depends on, e.g., the hash of the schema
+
+        Returns:
+            str: The key, i.e., "{schema_id}_{version digest}_{digest}"
+        """
+        normalized = dict(params)
+        if isinstance(locations := params.get("locations"), Mapping):
+            normalized["locations"] = {
+                name: sorted(values, key=str) for name, values in locations.items()
+            }
+        text = json.dumps(
+            [schema_id, endpoint, normalized, version], sort_keys=True, default=str
+        )
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        version_text = json.dumps(version, sort_keys=True, default=str)
+        version_digest = hashlib.sha256(version_text.encode("utf-8")).hexdigest()
+        return f"{schema_id}_{version_digest[:16]}_{digest}"
+
+    def get(self, schema_id: int, key: str) -> bytes | None:
+        """Get a result from the process or the shared storage
+
+        Args:
+            schema_id (int): Id of the schema, for the hit counters
+            key (str): Key of the result, see key
+
+        Returns:
+            bytes | None: The result or None if it is not cached
+        """
+        if self._cache is None:
+            return None
+        content = self._cache.get(key)
+        if content is not None:
+            self._count(schema_id, "hits")
+            return content
+        if self._storage is not None:
+            try:
+                content = self._storage.load(f"{key}.json")
+            except FileNotFoundError:
+                pass
+            else:
+                self._cache.put(key, content)
+                self._count(schema_id, "shared_hits")
+                return content
+        self._count(schema_id, "misses")
+        return None
+
+    def put(self, key: str, content: bytes) -> None:
+        """Cache a result in process and in the shared storage. The shared
+        results of other versions of the table are deleted when the first
+        result of a version is cached by this process.
+
+        Args:
+            key (str): Key of the result, see key
+            content (bytes): The encoded result
+        """
+        if self._cache is None:
+            return
+        self._cache.put(key, content)
+        if self._storage is not None:
+            self._storage.save(f"{key}.json", content)
+            schema, version, _ = key.split("_", 2)
+            with self._lock:
+                previous = self._versions.get(schema)
+                self._versions[schema] = version
+            if previous != version:
+                self.evict(schema, keep=version)
+
+    def evict(self, schema: Any, keep: str | None = None) -> int:
+        """Delete the shared results of a table
+
+        Args:
+            schema (Any): Id of the schema
+            keep (str | None): Digest of the version whose results are kept.
+                Defaults to None, i.e., all results are deleted.
+
+        Returns:
+            int: Number of deleted results
+        """
+        if self._storage is None:
+            return 0
+        prefix, kept = f"{schema}_", f"{schema}_{keep}_"
+        deleted = 0
+        for name in self._storage.list():
+            name = str(name)
+            if not name.startswith(prefix) or not name.endswith(".json"):
+                continue
+            if keep is not None and name.startswith(kept):
+                continue
+            try:
+                deleted += self._storage.delete(name)
+            except FileNotFoundError:
+                # deleted by another process in the meantime
+                pass
+        return deleted
+
+    def stats(self, schema_id: int) -> dict[str, Any]:
+        """Hit counters of a schema
+
+        Args:
+            schema_id (int): Id of the schema
+
+        Returns:
+            dict[str, Any]: The "hits" in process, "shared_hits", "misses" and
+                the "hit_rate" of the schema
+        """
+        with self._lock:
+            counts = Counter(self._counts.get(schema_id))
+        hits, shared_hits, misses = (
+            counts["hits"],
+            counts["shared_hits"],
+            counts["misses"],
+        )
+        total = hits + shared_hits + misses
+        return {
+            "schema_id": schema_id,
+            "hits": hits,
+            "shared_hits": shared_hits,
+            "misses": misses,
+            "hit_rate": (hits + shared_hits) / total if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        """Remove all results cached in process and reset the counters"""
+        if self._cache is not None:
+            self._cache.clear()
+        with self._lock:
+            self._counts.clear()
+            self._versions.clear()
+
+    def _count(self, schema_id: int, name: str) -> None:
+        with self._lock:
+            self._counts.setdefault(schema_id, Counter())[name] += 1
+
+
+result_cache = ResultCache(
+    maxsize=settings.RESULT_CACHE_SIZE,
+    maxbytes=settings.RESULT_CACHE_MAX_BYTES,
+    storage=(
+        LocalFileStorage(settings.RESULT_CACHE_SHARED_PATH)
+        if settings.RESULT_CACHE_SHARED_PATH
+        else None
+    ),
+)
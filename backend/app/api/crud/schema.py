@@ -1,11 +1,180 @@
-from sqlmodel import Session, SQLModel, Table, inspect, or_, select
+import hashlib
+import threading
+from collections.abc import Sequence
+from copy import deepcopy
+from graphlib import CycleError, TopologicalSorter
+from typing import Any
 
+from sqlalchemy import Integer, String, and_, cast, column, event, exists, func, literal
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from sqlmodel import MetaData, Session, Table, inspect, select
+
+from app.api.crud.aggregate import create_rollups
+from app.api.crud.data import bump_data_version
+from app.api.crud.partition import create_partitions, partition_window
+from app.core.config import settings
+from app.core.invalidation import InvalidationChannel
 from app.models.schema import TableSchema, TableSchemaPublic
 from app.schema_manager import SchemaManager
+from app.schema_manager.cache import CacheInfo, LRUCache
+from app.schema_manager.schema_manager import SchemaFormat
+
+
+class SchemaCache:
+    """Process-wide cache of schemas by id and by name.
+
+    The cache holds copies of the schemas independent of the session they were
+    read with. Entries expire after a time to live, so that changes
+    by other processes are picked up eventually. With an invalidation channel,
+    invalidations are broadcast to all processes immediately.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = 60.0) -> None:
+        """Initialize the cache
+
+        Args:
+            maxsize (int): Maximum number of cached lookups. Each schema is
+                cached by id and by name, i.e., takes two entries.
+                Defaults to 256.
+            ttl (float | None): Seconds after which a schema is read from the
+                database again. None means never. Defaults to 60.
+        """
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._channel: InvalidationChannel | None = None
+        # incremented on every invalidation to detect reads that raced with it
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def connect(self, channel: InvalidationChannel) -> None:
+        """Broadcast invalidations via the channel and receive those of others
+
+        Args:
+            channel (InvalidationChannel): The invalidation channel
+        """
+        channel.subscribe(self._on_message)
+        self._channel = channel
+
+    def disconnect(self) -> None:
+        """Close the invalidation channel"""
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+    def get(
+        self,
+        db: Session,
+        *,
+        schema_id: int | None = None,
+        schema_name: str | None = None,
+    ) -> TableSchema:
+        """Get a schema by id or name. It is read from the database if not
+            cached.
+
+        Args:
+            db (Session): Database session
+            schema_id (int, optional): Schema id. Defaults to None.
+            schema_name (str, optional): Schema name. Defaults to None.
+
+        Returns:
+            TableSchema: The schema. A cached schema is merged into the session
+                without reading it from the database.
+
+        Raises:
+            ValueError: If schema is not found
+        """
+        key = ("id", schema_id) if schema_id is not None else ("name", schema_name)
+        data = self._cache.get(key)
+        if data is not None:
+            # the state of the session takes precedence over the cache
+            existing = db.identity_map.get(identity_key(TableSchema, data["id"]))
+            if existing is not None:
+                return existing
+            schema = TableSchema(**deepcopy(data))
+            make_transient_to_detached(schema)
+            return db.merge(schema, load=False)
+        generation = self._generation
+        schema = _query_schema(db=db, schema_id=schema_id, schema_name=schema_name)
+        data = deepcopy(schema.model_dump())
+        with self._lock:
+            # do not cache what was invalidated while reading
+            if generation == self._generation:
+                self._cache.put(("id", data["id"]), data)
+                self._cache.put(("name", data["name"]), data)
+        return schema
+
+    def invalidate(
+        self,
+        *,
+        schema_id: int | None = None,
+        schema_name: str | None = None,
+        publish: bool = True,
+    ) -> None:
+        """Remove a schema from the cache by id and/or name
+
+        Args:
+            schema_id (int, optional): Schema id. Defaults to None.
+            schema_name (str, optional): Schema name. Defaults to None.
+            publish (bool): Broadcast the invalidation via the channel.
+                Defaults to True.
+        """
+        with self._lock:
+            self._generation += 1
+            for key in [("id", schema_id), ("name", schema_name)]:
+                if key[1] is None:
+                    continue
+                data = self._cache.pop(key)
+                if data is not None:
+                    self._cache.pop(("id", data["id"]))
+                    self._cache.pop(("name", data["name"]))
+        if publish and self._channel is not None:
+            self._channel.publish(f"{_or_empty(schema_id)}:{_or_empty(schema_name)}")
+
+    def clear(self) -> None:
+        """Remove all schemas from the cache"""
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def info(self) -> CacheInfo:
+        """Get hit and miss counters as well as the size of the cache"""
+        return self._cache.info()
+
+    def _on_message(self, message: str) -> None:
+        """Invalidate a schema on behalf of another process"""
+        schema_id, _, schema_name = message.partition(":")
+        self.invalidate(
+            schema_id=int(schema_id) if schema_id else None,
+            schema_name=schema_name or None,
+            publish=False,
+        )
+
+
+def _or_empty(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+schema_cache = SchemaCache(
+    maxsize=settings.SCHEMA_CACHE_SIZE, ttl=settings.SCHEMA_CACHE_TTL or None
+)
+
+
+@event.listens_for(TableSchema, "after_update")
+@event.listens_for(TableSchema, "after_delete")
+def _invalidate_schema(mapper: Any, connection: Any, target: TableSchema) -> None:
+    """Drop schemas changed via the ORM from the cache of this process.
+    The crud functions invalidate again after committing and broadcast it."""
+    schema_cache.invalidate(schema_id=target.id, schema_name=target.name, publish=False)
 
 
 def create_schema(
-    *, db: Session, data: bytes, schema_manager: SchemaManager
+    *,
+    db: Session,
+    data: bytes,
+    schema_manager: SchemaManager,
+    file_format: SchemaFormat | None = None,
 ) -> TableSchemaPublic:
     """Writes a schema to the database. The schema is validated against the
         meta-schema. The schema is not activated by default.
@@ -14,15 +183,37 @@ def create_schema(
         db (Session): Database session
         data (bytes): Schema data in bytes
         schema_manager (SchemaManager): Schema manager
+        file_format (SchemaFormat | None): Format of the data ("json" or "yaml").
+            If None, the format is detected from the content. Defaults to None.
 
     Returns:
         TableSchemaPublic: Schema object
     """
-    schema = schema_manager.validate_schema(data)
+    schema = schema_manager.validate_schema(
+        schema_manager.read_schema_from_file(data, file_format)
+    )
+    return insert_schema(db=db, schema=schema)
+
+
+def insert_schema(*, db: Session, schema: dict[str, Any]) -> TableSchema:
+    """Writes an already validated schema to the database. The schema is not
+        activated by default.
+
+    Args:
+        db (Session): Database session
+        schema (dict[str, Any]): Schema that complies with the meta-schema
+
+    Returns:
+        TableSchema: Schema object
+
+    Raises:
+        ValueError: If the schema cannot be inserted, e.g., as the name exists
+    """
     db_schema = TableSchema(
         name=schema["name"],
         description=schema["description"],
         jsonschema=schema,
+        schema_hash=SchemaManager.schema_hash(schema),
     )
     try:
         db.add(db_schema)
@@ -31,11 +222,49 @@ def create_schema(
     except Exception as e:
         db.rollback()
         raise ValueError("Could not insert schema to db") from e
+    schema_cache.invalidate(schema_id=db_schema.id, schema_name=db_schema.name)
+    return db_schema
+
+
+def update_schema(
+    *, db: Session, schema_id: int, schema: dict[str, Any]
+) -> TableSchema:
+    """Replace the json schema of a stored schema by a new, validated version.
+        The table of the schema is not changed, see app.api.crud.migration.
+
+    Args:
+        db (Session): Database session
+        schema_id (int): Schema id
+        schema (dict[str, Any]): Schema that complies with the meta-schema
+
+    Returns:
+        TableSchema: The updated schema object
+
+    Raises:
+        ValueError: If the schema is not found or cannot be updated
+    """
+    db_schema = read_schema(db=db, schema_id=schema_id, use_cache=False)
+    old_name = db_schema.name
+    db_schema.name = schema["name"]
+    db_schema.description = schema["description"]
+    db_schema.jsonschema = schema
+    db_schema.schema_hash = SchemaManager.schema_hash(schema)
+    try:
+        db.commit()
+        db.refresh(db_schema)
+    except Exception as e:
+        db.rollback()
+        raise ValueError("Could not update schema") from e
+    schema_cache.invalidate(schema_id=schema_id, schema_name=old_name)
     return db_schema
 
 
 def read_schema(
-    *, db: Session, schema_id: int | None = None, schema_name: str | None = None
+    *,
+    db: Session,
+    schema_id: int | None = None,
+    schema_name: str | None = None,
+    use_cache: bool = True,
 ) -> TableSchema:
     """Read a schema from the database. Either the schema_id or schema_name must
         be provided but not both.
@@ -44,6 +273,9 @@ def read_schema(
         db (Session): Database session
         schema_id (int, optional): Schema id. Defaults to None.
         schema_name (str, optional): Schema name. Defaults to None.
+        use_cache (bool): Use the schema cache. A cached schema may be outdated
+            by up to the time to live of the cache. Use False to read the
+            current state, e.g., before changing the schema. Defaults to True.
 
     Returns:
         RawJsonSchema: Schema object
@@ -55,16 +287,207 @@ def read_schema(
         raise ValueError("Either schema_id or schema_name must be provided")
     if schema_id is not None and schema_name is not None:
         raise ValueError("Only one of schema_id or schema_name must be provided")
-    schema = db.exec(
-        select(TableSchema).filter(
-            or_(TableSchema.name == schema_name, TableSchema.id == schema_id)
-        )
-    ).first()
+    if use_cache:
+        return schema_cache.get(db, schema_id=schema_id, schema_name=schema_name)
+    return _query_schema(db=db, schema_id=schema_id, schema_name=schema_name)
+
+
+def _query_schema(
+    *, db: Session, schema_id: int | None = None, schema_name: str | None = None
+) -> TableSchema:
+    """Read a schema from the database by id or, if no id is given, by name"""
+    if schema_id is not None:
+        condition = TableSchema.id == schema_id
+    else:
+        condition = TableSchema.name == schema_name
+    schema = db.exec(select(TableSchema).where(condition)).first()
     if schema is None:
         raise ValueError("Schema not found")
     return schema
 
 
+def _etag(*parts: Any) -> str:
+    """Build a strong entity tag from the given parts"""
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def table_exists(db: Session, table_name: str) -> bool:
+    """Check whether a table exists in the database of a session
+
+    Args:
+        db (Session): Database session
+        table_name (str): Name of the table
+
+    Returns:
+        bool: True if the table exists
+    """
+    return inspect(db.get_bind()).has_table(table_name)
+
+
+def schema_etag(schema: Any) -> str:
+    """Entity tag of a schema.
+
+    The tag changes whenever the json schema or the activation state of the
+    schema changes.
+
+    Args:
+        schema (Any): Schema or row with the attributes id, is_active,
+            updated_at and schema_hash
+
+    Returns:
+        str: The quoted entity tag
+    """
+    return _etag(schema.id, schema.is_active, schema.updated_at, schema.schema_hash)
+
+
+def schemas_version(*, db: Session) -> str:
+    """Get a version token for all schemas.
+
+    The token changes whenever a schema is created, deleted, changed or
+    (de)activated. It is computed by a single aggregate query that joins the
+    id, activation state and hash of all schemas in the order of their ids,
+    i.e., only one string is sent to the client. The hash covers the name,
+    description and json schema, see SchemaManager.schema_hash. Timestamps are
+    not used, as they are too coarse on sqlite and PostgreSQL uses the start
+    time of the transaction.
+
+    Args:
+        db (Session): Database session
+
+    Returns:
+        str: The quoted version token
+    """
+    table = TableSchema.__table__  # type: ignore[attr-defined]
+    entry = (
+        cast(table.c.id, String)
+        + ":"
+        + cast(cast(table.c.is_active, Integer), String)
+        + ":"
+        + func.coalesce(table.c.schema_hash, "")
+    ).label("entry")
+    if db.bind.dialect.name == "postgresql":  # type: ignore[union-attr]
+        query = sa_select(
+            func.count(),
+            func.string_agg(entry, aggregate_order_by(literal(","), table.c.id)),
+        )
+    else:
+        # sqlite concatenates the rows in the order of the subquery
+        rows = sa_select(entry).order_by(table.c.id).subquery()
+        query = sa_select(func.count(), func.group_concat(rows.c.entry, ","))
+    return _etag(*db.exec(query).one())  # type: ignore[call-overload]
+
+
+def backfill_schemas(*, db: Session) -> int:
+    """Set the hash and update time of schemas stored before these columns
+    were added, see app.core.db.add_missing_columns
+
+    Args:
+        db (Session): Database session
+
+    Returns:
+        int: Number of updated schemas
+    """
+    schemas = db.exec(
+        select(TableSchema).where(TableSchema.schema_hash.is_(None))  # type: ignore[union-attr]
+    ).all()
+    for schema in schemas:
+        # updated_at is set on update
+        schema.schema_hash = SchemaManager.schema_hash(schema.jsonschema)
+    db.commit()
+    return len(schemas)
+
+
+def listing_etag(version: str, query: Sequence[tuple[str, str]]) -> str:
+    """Entity tag of a schema listing.
+
+    Args:
+        version (str): Version token of all schemas, see schemas_version
+        query (Sequence[tuple[str, str]]): Query parameters of the listing
+
+    Returns:
+        str: The quoted entity tag
+    """
+    return _etag(version, *sorted(query))
+
+
+# columns that can be selected when listing schemas
+SCHEMA_LIST_FIELDS = ("id", "name", "description", "is_active", "jsonschema")
+SCHEMA_LIST_DEFAULT_FIELDS = ("id", "name", "description", "is_active")
+
+
+def list_schemas(
+    *,
+    db: Session,
+    after_id: int | None = None,
+    limit: int = 100,
+    is_active: bool | None = None,
+    name_prefix: str | None = None,
+    tags: Sequence[str] = (),
+    fields: Sequence[str] = SCHEMA_LIST_DEFAULT_FIELDS,
+) -> list[dict[str, Any]]:
+    """List schemas ordered by id using keyset pagination.
+
+    Only the requested columns are loaded, i.e., the json schema is only read
+    from the database if it is part of the fields.
+
+    Args:
+        db (Session): Database session.
+        after_id (int | None): Only return schemas with an id larger than this.
+            Use the id of the last schema of a page to get the next page.
+            Defaults to None.
+        limit (int): Maximum number of schemas. Defaults to 100.
+        is_active (bool | None): Only return (in)active schemas.
+            Defaults to None.
+        name_prefix (str | None): Only return schemas whose name starts with
+            the prefix. Defaults to None.
+        tags (Sequence[str]): Only return schemas that have all of these tags.
+            Defaults to ().
+        fields (Sequence[str]): Columns to return. See SCHEMA_LIST_FIELDS.
+            Defaults to id, name, description and is_active.
+
+    Returns:
+        list[dict[str, Any]]: The schemas with the requested fields
+
+    Raises:
+        ValueError: If a field cannot be selected
+    """
+    if invalid := set(fields) - set(SCHEMA_LIST_FIELDS):
+        raise ValueError(f"Fields {sorted(invalid)} cannot be selected")
+    # the id is always needed for pagination
+    fields = ["id"] + [f for f in SCHEMA_LIST_FIELDS if f in fields and f != "id"]
+    table = TableSchema.__table__  # type: ignore[attr-defined]
+    query = sa_select(*[table.c[f] for f in fields])
+    if after_id is not None:
+        query = query.where(table.c.id > after_id)
+    if is_active is not None:
+        query = query.where(table.c.is_active == is_active)
+    if name_prefix:
+        query = query.where(table.c.name.startswith(name_prefix, autoescape=True))
+    if tags:
+        query = query.where(_has_tags(db.bind.dialect.name, tags))  # type: ignore[union-attr]
+    query = query.order_by(table.c.id).limit(limit)
+    return [dict(row) for row in db.exec(query).mappings()]  # type: ignore[call-overload]
+
+
+def _has_tags(dialect: str, tags: Sequence[str]) -> Any:
+    """Filter expression checking that the json schema has all the given tags"""
+    if dialect == "postgresql":
+        return cast(TableSchema.jsonschema["tags"], JSONB).contains(list(tags))
+    # sqlite: search the tags using the json functions
+    conditions = []
+    for tag in tags:
+        tag_values = func.json_each(TableSchema.jsonschema, "$.tags").table_valued(
+            "value"
+        )
+        conditions.append(
+            exists(
+                select(literal(1)).select_from(tag_values).where(column("value") == tag)
+            )
+        )
+    return and_(*conditions)
+
+
 def delete_schema(
     *, db: Session, schema_id: int | None = None, schema_name: str | None = None
 ) -> bool:
@@ -81,13 +504,17 @@ def delete_schema(
     # TODO: check if an associated table exists. If so, demand deleting the
     # table first
     try:
-        schema = read_schema(db=db, schema_id=schema_id, schema_name=schema_name)
+        schema = read_schema(
+            db=db, schema_id=schema_id, schema_name=schema_name, use_cache=False
+        )
+        deleted_id, deleted_name = schema.id, schema.name
         db.delete(schema)
         db.commit()
-        return True
     except Exception:
         db.rollback()
         return False
+    schema_cache.invalidate(schema_id=deleted_id, schema_name=deleted_name)
+    return True
 
 
 def toggle_schema(
@@ -104,13 +531,16 @@ def toggle_schema(
         bool: True if the schema was toggled, False otherwise.
     """
     try:
-        schema = read_schema(db=db, schema_id=schema_id, schema_name=schema_name)
+        schema = read_schema(
+            db=db, schema_id=schema_id, schema_name=schema_name, use_cache=False
+        )
         schema.is_active = not schema.is_active
         db.commit()
-        return True
     except Exception:
         db.rollback()
         return False
+    schema_cache.invalidate(schema_id=schema.id, schema_name=schema.name)
+    return True
 
 
 def create_table_from_schema(
@@ -120,9 +550,13 @@ def create_table_from_schema(
     schema_id: int | None = None,
     schema_name: str | None = None,
     id_column_name: str = "sweet_id",
+    partitioned: bool | None = None,
 ) -> None:
     """Create a table from a schema.
 
+    The rollups of the schema are created together with the table, see
+    create_rollups.
+
     Args:
         db (Session): Database session.
         schema_manager (SchemaManager): Schema manager.
@@ -130,37 +564,188 @@ def create_table_from_schema(
         schema_name Optional(str): Schema name. Either id or name must be provided.
         id_column_name (str): Name of the id column. Defaults to "id_".
             This column will be added to the table and defined as the primary key.
+        partitioned (bool | None): Range partition the table by its main time
+            field and create the partitions around the current time. Only
+            applies to PostgreSQL. Defaults to settings.DATA_PARTITIONING.
 
     Raises:
         ValueError: If the schema is not found or if the table already exists.
         ValueError: If the table could not be created.
+        ValueError: If the table should but cannot be partitioned.
     """
     schema = read_schema(db=db, schema_id=schema_id, schema_name=schema_name)
-    model_input = schema_manager.model_from_schema(
-        schema.jsonschema,
-        validate_schema=True,
-        db_dialect=db.bind.dialect.name,  # type: ignore[union-attr, arg-type]
-        create_id_column=id_column_name,
+    _create_tables(
+        db=db,
+        schema_manager=schema_manager,
+        schemas=[schema],
+        id_column_name=id_column_name,
+        partitioned=partitioned,
+    )
+
+
+def create_tables_from_schemas(
+    *,
+    db: Session,
+    schema_manager: SchemaManager,
+    schema_ids: Sequence[int],
+    id_column_name: str = "sweet_id",
+    partitioned: bool | None = None,
+) -> list[list[str]]:
+    """Create the tables of several schemas in the order of their foreign keys
+
+    The tables are sorted topologically by the tables they reference, i.e.,
+    referenced tables are created first. Tables referenced but not part of the
+    batch have to exist and are reflected once for all tables. All tables are
+    created in one transaction, i.e., either all of them or none exist
+    afterwards.
+
+    Args:
+        db (Session): Database session
+        schema_manager (SchemaManager): Schema manager
+        schema_ids (Sequence[int]): Ids of the schemas
+        id_column_name (str): Name of the id column of each table. Defaults to
+            "sweet_id".
+        partitioned (bool | None): Range partition the time-series tables, see
+            create_table_from_schema. Defaults to settings.DATA_PARTITIONING.
+
+    Returns:
+        list[list[str]]: Names of the created tables by level of the dependency
+            graph. Tables of a level only reference tables of earlier levels,
+            i.e., they are independent of each other.
+
+    Raises:
+        ValueError: If a schema is not found, a table already exists, the
+            foreign keys form a cycle, a referenced table neither exists nor is
+            part of the batch or the tables could not be created
+    """
+    schemas = {}
+    for schema_id in schema_ids:
+        schema = read_schema(db=db, schema_id=schema_id)
+        schemas[schema.name] = schema
+    return _create_tables(
+        db=db,
+        schema_manager=schema_manager,
+        schemas=list(schemas.values()),
+        id_column_name=id_column_name,
+        partitioned=partitioned,
+    )
+
+
+def _begin_sqlite(db: Session) -> None:
+    """Begin the transaction of a session on sqlite explicitly. pysqlite only
+    begins a transaction before DML, i.e., DDL like CREATE TABLE would be
+    committed on its own and not be rolled back."""
+    connection = db.connection()
+    if not connection.connection.driver_connection.in_transaction:  # type: ignore[union-attr]
+        connection.exec_driver_sql("BEGIN")
+
+
+def _create_tables(
+    *,
+    db: Session,
+    schema_manager: SchemaManager,
+    schemas: Sequence[TableSchema],
+    id_column_name: str,
+    partitioned: bool | None,
+) -> list[list[str]]:
+    """Create the tables of schemas in one transaction, see
+    create_tables_from_schemas. DDL is transactional on PostgreSQL and sqlite,
+    see _begin_sqlite."""
+    if partitioned is None:
+        partitioned = settings.DATA_PARTITIONING
+    dialect = db.bind.dialect.name  # type: ignore[union-attr]
+    existing = set(inspect(db.connection()).get_table_names())
+    model_inputs = {}
+    dependencies: dict[str, set[str]] = {}
+    for schema in schemas:
+        model_input = schema_manager.model_from_schema(
+            schema.jsonschema,
+            validate_schema=True,
+            db_dialect=dialect,  # type: ignore[arg-type]
+            create_id_column=id_column_name,
+            partitioned=partitioned,
+        )
+        table_name = model_input["name"]
+        # if the table already exists, raise an error
+        if table_name in existing:
+            raise ValueError(f"Table {table_name} already exists")
+        model_inputs[table_name] = model_input
+        dependencies[table_name] = referenced_tables(schema.jsonschema) - {table_name}
+    referenced = set().union(*dependencies.values()) - set(model_inputs)
+    if missing := sorted(referenced - existing):
+        raise ValueError(f"Referenced tables {missing} do not exist")
+
+    # tables become ready once the tables they reference are created
+    sorter = TopologicalSorter(
+        {name: deps & set(model_inputs) for name, deps in dependencies.items()}
     )
-    # if the table already exists, raise an error
-    inspector = inspect(db.bind)
-    db_tables = inspector.get_table_names()  # type: ignore[union-attr]
-    if model_input["name"] in db_tables:
-        raise ValueError(f"Table {model_input['name']} already exists")
-    # create the table in the database
+    try:
+        sorter.prepare()
+    except CycleError as e:
+        raise ValueError(f"Foreign keys form a cycle: {' -> '.join(e.args[1])}") from e
+    levels: list[list[str]] = []
+    while sorter.is_active():
+        ready = sorted(sorter.get_ready())
+        levels.append(ready)
+        sorter.done(*ready)
+
+    # the tables are defined in a private metadata together with the tables
+    # they reference, i.e., neither the whole database is reflected nor the
+    # shared metadata of the models is changed
     # TODO: it would be better to handle table creation with alembic
+    metadata = MetaData()
+    by_name = {schema.name: schema for schema in schemas}
     try:
-        metadata = SQLModel.metadata
-        metadata.clear()
-        metadata.reflect(bind=db.bind)  # type: ignore[arg-type]
-        Table(
-            model_input["name"],
-            metadata,
-            *model_input["columns"],
-            *model_input["constraints"],
-        )
-        # Create the table in the database
-        metadata.create_all(db.bind)  # type: ignore[arg-type]
-    except Exception as e:  # pragma: no cover
+        if dialect == "sqlite":
+            _begin_sqlite(db)
+        if referenced:
+            metadata.reflect(
+                bind=db.connection(), only=sorted(referenced), resolve_fks=False
+            )
+        # DDL of one transaction runs on one connection, i.e., the tables of a
+        # level are created one after the other
+        for table_name in (name for level in levels for name in level):
+            model_input = model_inputs[table_name]
+            partition = model_input["partition"]
+            table_kwargs: dict[str, Any] = {}
+            if partition is not None:
+                table_kwargs["postgresql_partition_by"] = (
+                    f"RANGE ({partition['column']})"
+                )
+            table = Table(
+                table_name,
+                metadata,
+                *model_input["columns"],
+                *model_input["constraints"],
+                *model_input["indexes"],
+                **table_kwargs,
+            )
+            table.create(bind=db.connection())
+            if partition is not None:
+                start, end = partition_window(partition["interval"])
+                create_partitions(db, table_name, partition["interval"], start, end)
+            create_rollups(db, by_name[table_name].jsonschema)
+            # results cached for a dropped table of the same name are not read
+            bump_data_version(db, table_name)
+        db.commit()
+    except Exception as e:
         db.rollback()
         raise ValueError("Could not create table") from e
+    return levels
+
+
+def referenced_tables(schema: dict[str, Any]) -> set[str]:
+    """Get the names of the tables referenced by the foreign keys of a schema
+
+    Args:
+        schema (dict[str, Any]): The json schema
+
+    Returns:
+        set[str]: Names of the referenced tables. Self references by an empty
+            resource are not included.
+    """
+    return {
+        resource
+        for fkey in schema.get("foreignKeys", [])
+        if (resource := fkey["reference"]["resource"])
+    }
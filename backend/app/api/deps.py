@@ -1,4 +1,5 @@
 from collections.abc import Generator
+from functools import lru_cache
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
@@ -9,6 +10,7 @@ from app.core.config import settings
 from app.core.db import engine
 from app.core.exceptions import InvalidTokenError
 from app.core.security import decode_access_token
+from app.filestorage import FileStorageProtocol, LocalFileStorage
 from app.models import TokenPayload, User
 from app.schema_manager import SchemaManager
 
@@ -29,6 +31,14 @@ def get_schema_manager() -> Generator[SchemaManager, None, None]:
 SchemaManagerDep = Annotated[SchemaManager, Depends(get_schema_manager)]
 
 
+@lru_cache
+def get_data_storage() -> FileStorageProtocol:
+    return LocalFileStorage(settings.DATA_STORAGE_PATH)
+
+
+DataStorageDep = Annotated[FileStorageProtocol, Depends(get_data_storage)]
+
+
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/user/login")
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
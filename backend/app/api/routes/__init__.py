@@ -1,6 +1,13 @@
+from .job import router as job_router
 from .login import router as login_router
 from .schema import router as schema_router
 from .user import router as user_router
 from .utils import router as utils_router
 
-__all__ = ["login_router", "schema_router", "user_router", "utils_router"]
+__all__ = [
+    "job_router",
+    "login_router",
+    "schema_router",
+    "user_router",
+    "utils_router",
+]
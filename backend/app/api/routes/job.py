@@ -0,0 +1,126 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.api.crud.data import IngestMode, detect_data_format
+from app.api.crud.job import create_job, list_jobs, read_job
+from app.api.crud.schema import read_schema, table_exists
+from app.api.deps import DataStorageDep, SessionDep, is_admin_user
+from app.models.job import JOB_STATUSES, IngestionJobPublic
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.post(
+    "/",
+    response_model=IngestionJobPublic,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"description": "Schema or table not found"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": "Invalid file. Use CSV or NDJSON"
+        },
+    },
+    dependencies=[Depends(is_admin_user)],
+)
+async def create_job_api(
+    schema_id: int,
+    file: UploadFile,
+    session: SessionDep,
+    storage: DataStorageDep,
+    chunk_size: Annotated[int | None, Query(ge=1)] = None,
+    mode: IngestMode = "append",
+):
+    """Queue the ingestion of a CSV or NDJSON file into the table of a schema.
+    The file is loaded by a worker, see POST /schema/{schema_id}/data. Poll
+    GET /jobs/{job_id} for the progress and the result.
+
+    Args:
+        schema_id (int): The schema ID.
+        file (UploadFile): CSV file with a header or NDJSON file with one JSON
+            object per line.
+        session (SessionDep): The database session.
+        storage (DataStorageDep): Storage of the uploaded files.
+        chunk_size (int | None): Number of rows loaded at once. Defaults to
+            the DATA_INGEST_CHUNK_SIZE setting.
+        mode (IngestMode): Either "append" or "upsert". Defaults to "append".
+
+    Returns:
+        IngestionJobPublic: The queued job
+    """
+    try:
+        data_format = detect_data_format(file.filename or "", file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    try:
+        schema = await run_in_threadpool(read_schema, db=session, schema_id=schema_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    if not await run_in_threadpool(table_exists, session, schema.name):
+        raise HTTPException(status_code=404, detail="Table not found")
+    # the upload is spooled to a temporary file and copied to the storage in
+    # chunks, i.e., it is never read into memory as a whole
+    job = await run_in_threadpool(
+        create_job,
+        db=session,
+        storage=storage,
+        schema_id=schema_id,
+        file=file.file,
+        data_format=data_format,
+        mode=mode,
+        chunk_size=chunk_size,
+    )
+    return job.get_public()
+
+
+@router.get(
+    "/",
+    response_model=list[IngestionJobPublic],
+    dependencies=[Depends(is_admin_user)],
+)
+def list_jobs_api(
+    session: SessionDep,
+    schema_id: int | None = None,
+    job_status: Annotated[str | None, Query(alias="status")] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """List the most recent ingestion jobs
+
+    Args:
+        session (SessionDep): The database session.
+        schema_id (int | None): Only jobs of this schema. Defaults to None.
+        job_status (str | None): Only jobs with this status, i.e., "queued",
+            "running", "succeeded" or "failed". Defaults to None.
+        limit (int): Maximum number of jobs. Defaults to 100.
+
+    Returns:
+        list[IngestionJobPublic]: The jobs, the most recent first
+    """
+    if job_status is not None and job_status not in JOB_STATUSES:
+        raise HTTPException(status_code=422, detail=f"Unknown status {job_status}")
+    jobs = list_jobs(db=session, schema_id=schema_id, status=job_status, limit=limit)
+    return [job.get_public() for job in jobs]
+
+
+@router.get(
+    "/{job_id}",
+    response_model=IngestionJobPublic,
+    responses={status.HTTP_404_NOT_FOUND: {"description": "Job not found"}},
+    dependencies=[Depends(is_admin_user)],
+)
+def read_job_api(job_id: int, session: SessionDep):
+    """Read the status, the progress and the result of an ingestion job
+
+    Args:
+        job_id (int): The job ID.
+        session (SessionDep): The database session.
+
+    Returns:
+        IngestionJobPublic: The job
+    """
+    try:
+        job = read_job(db=session, job_id=job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found") from None
+    return job.get_public()
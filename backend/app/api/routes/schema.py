@@ -1,18 +1,106 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
-from sqlmodel import select
+import io
+import tarfile
+import zipfile
+from collections.abc import Callable
+from typing import Annotated, Any, cast
 
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Engine
+from sqlmodel import SQLModel, inspect, select
+
+from app.api.crud.aggregate import aggregate_rows, create_rollups
+from app.api.crud.data import (
+    DataValidationError,
+    IngestMode,
+    data_version,
+    detect_data_format,
+    has_unique_key,
+    ingest_rows,
+    read_rows,
+)
+from app.api.crud.export import (
+    EXPORT_MEDIA_TYPES,
+    EXPORT_SUFFIXES,
+    Compression,
+    ExportFormat,
+    compress,
+    export_arrow,
+    export_text,
+)
+from app.api.crud.migration import (
+    MigrationPlan,
+    apply_migration,
+    plan_migration,
+    read_migration,
+    rollback_migration,
+    run_migration,
+    start_migration,
+)
+from app.api.crud.partition import partitioned_tables
+from app.api.crud.query import query_rows, select_rows
+from app.api.crud.result_cache import result_cache
 from app.api.crud.schema import (
-    create_schema,
     create_table_from_schema,
+    create_tables_from_schemas,
     delete_schema,
+    insert_schema,
+    list_schemas,
+    listing_etag,
     read_schema,
+    schema_etag,
+    schemas_version,
+    table_exists,
     toggle_schema,
+    update_schema,
 )
 from app.api.deps import SchemaManagerDep, SessionDep, is_admin_user
-from app.models.schema import TableSchema, TableSchemaPublic
+from app.core.config import settings
+from app.core.workers import get_process_pool
+from app.models.schema import (
+    DataAggregate,
+    DataIngestion,
+    DataPage,
+    ResultCacheStats,
+    SchemaMigration,
+    SchemaValidationReport,
+    TableCreation,
+    TableMigration,
+    TableSchema,
+    TableSchemaListItem,
+    TableSchemaPublic,
+)
+from app.schema_manager import SchemaManager
 
 router = APIRouter(prefix="/schema", tags=["schema"])
 
+SCHEMA_SUFFIXES = (".json", ".yaml", ".yml")
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check if an If-None-Match header matches the entity tag"""
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
 
 @router.post(
     "/",
@@ -37,6 +125,8 @@ async def create_schema_api(
     default, the schema is not activated, i.e., the respective endpoint is not
     created. The schema has to be activated afterwards to be able to insert
     data for the respective schema.
+    Validation runs in a worker process and the database write in a thread,
+    i.e., large uploads do not block other requests.
 
     Args:
         file (UploadFile): The file to be uploaded.
@@ -52,8 +142,12 @@ async def create_schema_api(
     fn = file.filename or ""
     if not (fn.endswith(".json") or fn.endswith(".yaml")):
         raise HTTPException(status_code=422, detail="Invalid file. Use JSON or YAML")
+    file_format = schema_manager.detect_format(fn, file.content_type)
     try:
-        schema = create_schema(db=session, data=content, schema_manager=schema_manager)
+        validated = await schema_manager.validate_schema_async(
+            content, file_format, executor=get_process_pool()
+        )
+        schema = await run_in_threadpool(insert_schema, db=session, schema=validated)
         return schema
     except Exception as e:
         raise HTTPException(
@@ -61,18 +155,142 @@ async def create_schema_api(
         ) from e
 
 
+def _schema_files(filename: str, content: bytes) -> dict[str, bytes]:
+    """Get the schema files of an upload. Archives (zip or tar) are extracted.
+
+    The sizes of the members are checked before they are extracted, see the
+    SCHEMA_ARCHIVE_* settings.
+
+    Args:
+        filename (str): Name of the uploaded file
+        content (bytes): Content of the uploaded file
+
+    Returns:
+        dict[str, bytes]: Content of the schema files by file name
+
+    Raises:
+        ValueError: If the archive has too many or too large members
+    """
+    if filename.endswith(SCHEMA_SUFFIXES):
+        return {filename: content}
+    files: dict[str, bytes] = {}
+    max_members = settings.SCHEMA_ARCHIVE_MAX_MEMBERS
+    total = 0
+
+    def check(name: str, size: int) -> None:
+        nonlocal total
+        if size > settings.SCHEMA_ARCHIVE_MAX_MEMBER_SIZE:
+            raise ValueError(
+                f"File {filename}/{name} is larger than "
+                f"{settings.SCHEMA_ARCHIVE_MAX_MEMBER_SIZE} bytes"
+            )
+        total += size
+        if total > settings.SCHEMA_ARCHIVE_MAX_SIZE:
+            raise ValueError(
+                f"Files of archive {filename} are larger than "
+                f"{settings.SCHEMA_ARCHIVE_MAX_SIZE} bytes"
+            )
+
+    too_many = f"Archive {filename} has more than {max_members} members"
+    if filename.endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            if len(archive.infolist()) > max_members:
+                raise ValueError(too_many)
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.endswith(SCHEMA_SUFFIXES):
+                    # reading fails if the content is larger than the file size
+                    check(info.filename, info.file_size)
+                    files[f"{filename}/{info.filename}"] = archive.read(info)
+    elif filename.endswith(ARCHIVE_SUFFIXES):
+        with tarfile.open(fileobj=io.BytesIO(content), mode="r:*") as tar:
+            for count, member in enumerate(tar, start=1):
+                if count > max_members:
+                    raise ValueError(too_many)
+                if member.isfile() and member.name.endswith(SCHEMA_SUFFIXES):
+                    check(member.name, member.size)
+                    extracted = tar.extractfile(member)
+                    if extracted is not None:
+                        files[f"{filename}/{member.name}"] = extracted.read()
+    return files
+
+
+@router.post(
+    "/validate-batch",
+    response_model=list[SchemaValidationReport],
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": "Invalid file. Use JSON, YAML, zip or tar"
+        },
+    },
+    dependencies=[Depends(is_admin_user)],
+)
+def validate_schemas_api(
+    files: list[UploadFile], session: SessionDep, schema_manager: SchemaManagerDep
+) -> list[SchemaValidationReport]:
+    """Validate many schemas without storing them.
+    The uploaded files must be JSON or YAML files or zip/tar archives containing
+    such files. The schemas are validated in parallel. Foreign keys must
+    reference a schema of the batch or a schema that is already stored.
+
+    Args:
+        files (list[UploadFile]): The files to be validated.
+        session (SessionDep): The database session.
+        schema_manager (SchemaManagerDep): The schema manager.
+
+    Returns:
+        list[SchemaValidationReport]: The validation report per schema
+    """
+    schemas: dict[str, bytes] = {}
+    for file in files:
+        fn = file.filename or ""
+        if not fn.endswith(SCHEMA_SUFFIXES + ARCHIVE_SUFFIXES):
+            raise HTTPException(
+                status_code=422, detail=f"Invalid file {fn}. Use JSON, YAML, zip or tar"
+            )
+        try:
+            schemas.update(_schema_files(fn, file.file.read()))
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise HTTPException(
+                status_code=422, detail=f"Cannot read archive {fn}"
+            ) from e
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e)) from e
+    if not schemas:
+        raise HTTPException(status_code=422, detail="No schema files found")
+    stored = session.exec(select(TableSchema.name)).all()
+    reports = schema_manager.validate_many(
+        schemas,
+        known_resources=stored,
+        max_workers=settings.SCHEMA_VALIDATION_WORKERS,
+        executor=get_process_pool(),
+    )
+    return [SchemaValidationReport(**report) for report in reports]
+
+
 @router.get(
     "/{schema_id}",
     response_model=TableSchemaPublic,
     status_code=status.HTTP_200_OK,
-    responses={status.HTTP_404_NOT_FOUND: {"description": "Schema not found"}},
+    responses={
+        status.HTTP_304_NOT_MODIFIED: {"description": "Schema not modified"},
+        status.HTTP_404_NOT_FOUND: {"description": "Schema not found"},
+    },
 )
-def get_schema(schema_id: int | str, session: SessionDep) -> TableSchemaPublic:
+def get_schema(
+    schema_id: int | str,
+    session: SessionDep,
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
     """Get a schema either by its ID or by its name.
+    The response has an ETag. If it matches the If-None-Match header,
+    304 Not Modified is returned.
 
     Args:
         schema_id (int | str): The schema ID.
         session (SessionDep): The database session.
+        if_none_match (str | None): Entity tags of a cached schema.
 
     Returns:
         TableSchemaPublic: The schema object"""
@@ -80,21 +298,179 @@ def get_schema(schema_id: int | str, session: SessionDep) -> TableSchemaPublic:
         schema_id = int(schema_id)
     except ValueError:
         pass
-    if isinstance(schema_id, int):
-        try:
-            schema = read_schema(db=session, schema_id=schema_id)
-        except ValueError:
-            schema = None
-    else:
-        try:
-            schema = read_schema(db=session, schema_name=schema_id)
-        except ValueError:
-            schema = None
-    if not schema:
-        raise HTTPException(status_code=404, detail="Schema not found")
+    by_key: dict[str, Any] = (
+        {"schema_id": schema_id}
+        if isinstance(schema_id, int)
+        else {"schema_name": schema_id}
+    )
+    try:
+        schema = read_schema(db=session, **by_key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    etag = schema_etag(schema)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified({"ETag": etag})
+    response.headers["ETag"] = etag
     return schema.get_public()
 
 
+def _plan_migration(
+    session: SessionDep, stored: TableSchema, schema: dict[str, Any]
+) -> MigrationPlan | None:
+    """Plan the migration of the table of a stored schema to a new version.
+    None if the table does not exist."""
+    engine = cast(Engine, session.get_bind())
+    if not table_exists(session, stored.name):
+        return None
+    dialect = engine.dialect.name
+    key = SchemaManager.natural_key(stored.jsonschema)
+    return plan_migration(
+        stored.jsonschema,
+        schema,
+        db_dialect=dialect,  # type: ignore[arg-type]
+        partitioned=dialect == "postgresql"
+        and stored.name in partitioned_tables(session),
+        key_constraint=not key or has_unique_key(session, stored.name, key),
+    )
+
+
+def _create_rollups(session: SessionDep, schema: dict[str, Any]) -> None:
+    """Create the missing rollups of a schema whose table exists"""
+    try:
+        create_rollups(session, schema)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+@router.put(
+    "/{schema_id}",
+    response_model=SchemaMigration,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "Cannot migrate schema"},
+        status.HTTP_404_NOT_FOUND: {"description": "Schema not found"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": "Invalid file. Use JSON or YAML"
+        },
+    },
+    dependencies=[Depends(is_admin_user)],
+)
+async def update_schema_api(
+    schema_id: int,
+    file: UploadFile,
+    session: SessionDep,
+    schema_manager: SchemaManagerDep,
+    background_tasks: BackgroundTasks,
+    dry_run: bool = False,
+):
+    """Replace a schema by a new version from a JSON or YAML file.
+    If the table of the schema exists, it is migrated to the new version. Added
+    columns and dropped indexes are applied right away. Backfills of changed
+    column types, dropped columns and new indexes are completed in the
+    background, without blocking the table for other queries. Their status is
+    read from /schema/{schema_id}/migration. The stored schema is replaced once
+    the table matches the new version, i.e., after a background migration only
+    if it succeeds. Rollups added to the schema are created and computed from
+    the table.
+
+    Args:
+        schema_id (int): The schema ID.
+        file (UploadFile): The new version of the schema.
+        session (SessionDep): The database session.
+        schema_manager (SchemaManagerDep): The schema manager.
+        dry_run (bool): Only plan the migration. Defaults to False.
+
+    Returns:
+        SchemaMigration: The statements of the migration
+    """
+    content = await file.read()
+    fn = file.filename or ""
+    if file.size == 0 or not fn.endswith(SCHEMA_SUFFIXES):
+        raise HTTPException(status_code=422, detail="Invalid file. Use JSON or YAML")
+    try:
+        stored = await run_in_threadpool(
+            read_schema, db=session, schema_id=schema_id, use_cache=False
+        )
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    try:
+        validated = await schema_manager.validate_schema_async(
+            content,
+            schema_manager.detect_format(fn, file.content_type),
+            executor=get_process_pool(),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid schema: {e}") from e
+
+    engine = cast(Engine, session.get_bind())
+    migration = SchemaMigration(table=stored.name)
+    plan = await run_in_threadpool(_plan_migration, session, stored, validated)
+    if plan is not None:
+        if plan.errors:
+            raise HTTPException(status_code=400, detail="; ".join(plan.errors))
+        migration.statements = plan.statements
+        migration.backfills = [f"{b.column} = {b.expression}" for b in plan.backfills]
+        migration.prepare = plan.prepare
+        migration.swap = plan.swap
+        migration.finalize = plan.finalize
+    if dry_run:
+        return migration
+
+    try:
+        if plan is not None:
+            await run_in_threadpool(apply_migration, engine, plan)
+        if plan is None or plan.is_complete:
+            await run_in_threadpool(
+                update_schema, db=session, schema_id=schema_id, schema=validated
+            )
+            if plan is not None and validated.get("rollups"):
+                await run_in_threadpool(_create_rollups, session, validated)
+    except Exception as e:
+        if plan is not None:
+            await run_in_threadpool(rollback_migration, engine, plan)
+        raise HTTPException(status_code=400, detail=f"Cannot migrate: {e}") from e
+    if plan is not None and not plan.is_complete:
+        migration_id = await run_in_threadpool(start_migration, session, stored.name)
+        migration.migration_id = migration_id
+        # the new version is stored by the migration once the columns are swapped
+        background_tasks.add_task(
+            run_migration, engine, plan, migration_id, schema_id, validated
+        )
+    migration.applied = True
+    return migration
+
+
+@router.get(
+    "/{schema_id}/migration",
+    response_model=TableMigration,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"description": "Schema or migration not found"}
+    },
+    dependencies=[Depends(is_admin_user)],
+)
+def read_migration_api(schema_id: int, session: SessionDep):
+    """Get the status of the latest background migration of a schema's table
+
+    Args:
+        schema_id (int): The schema ID.
+        session (SessionDep): The database session.
+
+    Returns:
+        TableMigration: The migration. Its error is set if it failed.
+    """
+    try:
+        schema = read_schema(db=session, schema_id=schema_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    migration = read_migration(session, schema.name)
+    if migration is None:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    return migration
+
+
 @router.post(
     "/{schema_id}/toggle",
     status_code=status.HTTP_200_OK,
@@ -120,16 +496,22 @@ def toggle_schema_api(schema_id: int, session: SessionDep):
     dependencies=[Depends(is_admin_user)],
 )
 def create_table_for_schema(
-    schema_id: int, session: SessionDep, schema_manager: SchemaManagerDep
+    schema_id: int,
+    session: SessionDep,
+    schema_manager: SchemaManagerDep,
+    partitioned: bool | None = None,
 ):
     """Create the table corresponding to the given schema. The table will be created
         in the database. The table name will be the same as the schema name.
         The table will be created with the columns defined in the schema.
         The table will be created with a primary key column named "id_".
+        On PostgreSQL, time-series tables can be range partitioned by time.
 
     Args:
         schema_id in: The schema ID.
         session (SessionDep): The database session.
+        partitioned (bool | None): Partition the table by its main time field.
+            Defaults to the DATA_PARTITIONING setting.
     """
     try:
         schema_id = int(schema_id)
@@ -138,6 +520,7 @@ def create_table_for_schema(
             schema_id=schema_id,
             schema_manager=schema_manager,
             id_column_name="id_",
+            partitioned=partitioned,
         )
     except ValueError as e:
         msg = str(e)
@@ -150,6 +533,391 @@ def create_table_for_schema(
             raise HTTPException(status_code=404, detail="cannot create table") from e
 
 
+@router.post(
+    "/create_tables",
+    response_model=TableCreation,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "Cannot create tables"},
+        status.HTTP_404_NOT_FOUND: {"description": "Schema not found"},
+    },
+    dependencies=[Depends(is_admin_user)],
+)
+def create_tables_for_schemas(
+    session: SessionDep,
+    schema_manager: SchemaManagerDep,
+    schema_id: Annotated[list[int], Query()],
+    partitioned: bool | None = None,
+):
+    """Create the tables of several schemas at once, e.g.,
+    ?schema_id=1&schema_id=2. Tables referenced by foreign keys are created
+    before the tables referencing them. Either all tables are created or none.
+
+    Args:
+        session (SessionDep): The database session.
+        schema_manager (SchemaManagerDep): The schema manager.
+        schema_id (list[int]): The schema IDs.
+        partitioned (bool | None): Partition the time-series tables by their
+            main time field. Defaults to the DATA_PARTITIONING setting.
+
+    Returns:
+        TableCreation: The created tables by level of the foreign key graph
+    """
+    try:
+        levels = create_tables_from_schemas(
+            db=session,
+            schema_manager=schema_manager,
+            schema_ids=schema_id,
+            id_column_name="id_",
+            partitioned=partitioned,
+        )
+    except ValueError as e:
+        if "not found" in str(e):
+            raise HTTPException(status_code=404, detail="Schema not found") from e
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return TableCreation(levels=levels)
+
+
+def _location_filters(schema: dict[str, Any], request: Request) -> dict[str, list]:
+    """Values of the location fields given as query parameters"""
+    location_fields = [loc["field"] for loc in schema.get("locationFields") or []]
+    return {
+        name: values
+        for name in location_fields
+        if (values := request.query_params.getlist(name))
+    }
+
+
+def _cached_result(
+    session: SessionDep,
+    schema: TableSchema,
+    endpoint: str,
+    params: dict[str, Any],
+    query: Callable[[], SQLModel],
+) -> Response:
+    """Result of a query of the table of a schema from the result cache or, if
+    it is not cached, from the database
+
+    Raises:
+        HTTPException: 422 if the query is invalid
+    """
+    # the version is read before the query, i.e., a cached result is at least
+    # as recent as the version it is cached by
+    version = (data_version(session, schema.name), schema.schema_hash)
+    key = result_cache.key(schema.id, endpoint, params, version)
+    content = result_cache.get(schema.id, key)
+    if content is None:
+        try:
+            result = query()
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e)) from e
+        content = result.model_dump_json().encode("utf-8")
+        result_cache.put(key, content)
+    return Response(content=content, media_type="application/json")
+
+
+@router.get(
+    "/{schema_id}/data",
+    response_model=DataPage,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"description": "Schema or table not found"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"description": "Invalid query"},
+    },
+)
+def read_data_api(
+    schema_id: int,
+    request: Request,
+    session: SessionDep,
+    fields: Annotated[list[str] | None, Query()] = None,
+    time_field: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    after: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=10_000)] = 1000,
+):
+    """Read a page of the rows of the table of a schema. Rows are filtered by
+    a time range and by the values of location fields given as query
+    parameters, e.g., ?country=CH&country=DE. Pages are ordered by the id of
+    the rows. Pass next_after of a page as after to read the next page.
+    Pages are cached until the data of the table changes.
+
+    Args:
+        schema_id (int): The schema ID.
+        request (Request): The request with the location filters.
+        session (SessionDep): The database session.
+        fields (list[str] | None): Fields to read. Defaults to all fields.
+        time_field (str | None): Time field filtered by start and end.
+            Defaults to the first datetime, otherwise date field.
+        start (str | None): Rows from this time on (inclusive).
+        end (str | None): Rows before this time (exclusive).
+        after (int | None): Id of the last row of the previous page.
+        limit (int): Maximum number of rows. Defaults to 1000.
+
+    Returns:
+        DataPage: The rows and the id to read the next page
+    """
+    try:
+        schema = read_schema(db=session, schema_id=schema_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    locations = _location_filters(schema.jsonschema, request)
+    if not inspect(session.get_bind()).has_table(schema.name):
+        raise HTTPException(status_code=404, detail="Table not found")
+    params: dict[str, Any] = {
+        "fields": fields,
+        "time_field": time_field,
+        "start": start,
+        "end": end,
+        "locations": locations,
+        "after": after,
+        "limit": limit,
+    }
+    return _cached_result(
+        session,
+        schema,
+        "data",
+        params,
+        lambda: DataPage(**query_rows(db=session, schema=schema.jsonschema, **params)),
+    )
+
+
+@router.get(
+    "/{schema_id}/data/aggregate",
+    response_model=DataAggregate,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"description": "Schema or table not found"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"description": "Invalid query"},
+    },
+)
+def aggregate_data_api(
+    schema_id: int,
+    request: Request,
+    session: SessionDep,
+    interval: str | None = None,
+    stats: Annotated[list[str] | None, Query()] = None,
+    time_field: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    points: Annotated[int | None, Query(ge=3)] = None,
+):
+    """Aggregate the values of a time-series table by time interval and
+    location. Rows are filtered like GET /schema/{schema_id}/data. The result
+    is columnar, i.e., one list per location field, bucket start and
+    statistic. Results are cached until the data of the table changes.
+
+    Args:
+        schema_id (int): The schema ID.
+        request (Request): The request with the location filters.
+        session (SessionDep): The database session.
+        interval (str | None): Interval of the buckets, e.g., "day" or
+            "15 minutes". Defaults to the frequency of the time field.
+        stats (list[str] | None): Any of min, max, mean, sum, count and last.
+            Defaults to all.
+        time_field (str | None): Time field to bucket. Defaults to the first
+            datetime, otherwise date field.
+        start (str | None): Rows from this time on (inclusive).
+        end (str | None): Rows before this time (exclusive).
+        points (int | None): Downsample each series to at most this number of
+            buckets for plotting. Defaults to all buckets.
+
+    Returns:
+        DataAggregate: The statistics by location and time bucket
+    """
+    try:
+        schema = read_schema(db=session, schema_id=schema_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    locations = _location_filters(schema.jsonschema, request)
+    if not inspect(session.get_bind()).has_table(schema.name):
+        raise HTTPException(status_code=404, detail="Table not found")
+    params: dict[str, Any] = {
+        "interval": interval,
+        "stats": stats,
+        "time_field": time_field,
+        "start": start,
+        "end": end,
+        "locations": locations,
+        "points": points,
+    }
+    return _cached_result(
+        session,
+        schema,
+        "aggregate",
+        params,
+        lambda: DataAggregate(
+            **aggregate_rows(db=session, schema=schema.jsonschema, **params)
+        ),
+    )
+
+
+@router.get(
+    "/{schema_id}/data/cache",
+    response_model=ResultCacheStats,
+    dependencies=[Depends(is_admin_user)],
+)
+def read_cache_stats_api(schema_id: int):
+    """Get the hit counters of the cached query results of a schema in this
+    process
+
+    Args:
+        schema_id (int): The schema ID.
+
+    Returns:
+        ResultCacheStats: The hits, misses and hit rate
+    """
+    return ResultCacheStats(**result_cache.stats(schema_id))
+
+
+@router.get(
+    "/{schema_id}/data/export",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()},
+            "description": "The rows as a file",
+        },
+        status.HTTP_404_NOT_FOUND: {"description": "Schema or table not found"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"description": "Invalid query"},
+        status.HTTP_501_NOT_IMPLEMENTED: {"description": "Format not available"},
+    },
+)
+def export_data_api(
+    schema_id: int,
+    request: Request,
+    session: SessionDep,
+    data_format: Annotated[ExportFormat, Query(alias="format")] = "arrow",
+    compression: Compression | None = None,
+    fields: Annotated[list[str] | None, Query()] = None,
+    time_field: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+):
+    """Export the rows of the table of a schema as a stream. Rows are filtered
+    like GET /schema/{schema_id}/data and ordered by id. The rows are fetched,
+    encoded and compressed batch by batch, i.e., tables of any size are
+    exported in constant memory.
+
+    Args:
+        schema_id (int): The schema ID.
+        request (Request): The request with the location filters.
+        session (SessionDep): The database session.
+        data_format (ExportFormat): Either "arrow" (Arrow IPC stream),
+            "parquet", "ndjson" or "csv". Defaults to "arrow".
+        compression (Compression | None): Either "gzip" or "zstd". Defaults
+            to no compression.
+        fields (list[str] | None): Fields to export. Defaults to all fields.
+        time_field (str | None): Time field filtered by start and end.
+            Defaults to the first datetime, otherwise date field.
+        start (str | None): Rows from this time on (inclusive).
+        end (str | None): Rows before this time (exclusive).
+
+    Returns:
+        StreamingResponse: The rows as a file
+    """
+    try:
+        schema = read_schema(db=session, schema_id=schema_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    locations = _location_filters(schema.jsonschema, request)
+    engine = cast(Engine, session.get_bind())
+    if not inspect(engine).has_table(schema.name):
+        raise HTTPException(status_code=404, detail="Table not found")
+    try:
+        query = select_rows(
+            db=session,
+            schema=schema.jsonschema,
+            fields=fields,
+            time_field=time_field,
+            start=start,
+            end=end,
+            locations=locations,
+        )
+        if data_format in ("arrow", "parquet"):
+            content = export_arrow(engine, query, data_format)
+        else:
+            content = export_text(engine, query, data_format)
+        content = compress(content, compression)
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    filename = f"{schema.name}{EXPORT_SUFFIXES[data_format]}"
+    if compression is not None:
+        filename += EXPORT_SUFFIXES[compression]
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[compression or data_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post(
+    "/{schema_id}/data",
+    response_model=DataIngestion,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid data"},
+        status.HTTP_404_NOT_FOUND: {"description": "Schema or table not found"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": "Invalid file. Use CSV or NDJSON"
+        },
+    },
+    dependencies=[Depends(is_admin_user)],
+)
+async def ingest_data_api(
+    schema_id: int,
+    file: UploadFile,
+    session: SessionDep,
+    chunk_size: Annotated[int | None, Query(ge=1)] = None,
+    mode: IngestMode = "append",
+):
+    """Load the rows of a CSV or NDJSON file into the table of a schema.
+    The rows are validated against the fields of the schema and loaded in
+    chunks. Either all rows are loaded or none. With mode "upsert", rows with
+    the key of a stored row update the stored row, i.e., files can be loaded
+    again.
+
+    Args:
+        schema_id (int): The schema ID.
+        file (UploadFile): CSV file with a header or NDJSON file with one JSON
+            object per line.
+        session (SessionDep): The database session.
+        chunk_size (int | None): Number of rows loaded at once. Defaults to
+            the DATA_INGEST_CHUNK_SIZE setting.
+        mode (IngestMode): Either "append" or "upsert". Defaults to "append".
+
+    Returns:
+        DataIngestion: The number of loaded, inserted, updated and unchanged
+            rows
+    """
+    try:
+        data_format = detect_data_format(file.filename or "", file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    try:
+        schema = await run_in_threadpool(read_schema, db=session, schema_id=schema_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Schema not found") from None
+    table_name = schema.name
+    if not await run_in_threadpool(table_exists, session, table_name):
+        raise HTTPException(status_code=404, detail="Table not found")
+    try:
+        # the upload is spooled to disk, i.e., it is read in a stream of rows
+        result = await run_in_threadpool(
+            ingest_rows,
+            db=session,
+            schema=schema.jsonschema,
+            rows=read_rows(file.file, data_format),
+            chunk_size=chunk_size,
+            mode=mode,
+        )
+    except DataValidationError as e:
+        raise HTTPException(status_code=400, detail=e.errors) from e
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Cannot load data: {e}") from e
+    return DataIngestion(table=table_name, **result)
+
+
 @router.delete(
     "/{schema_id}",
     response_model=dict,
@@ -185,8 +953,73 @@ def delete_schema_api(
     return {"detail": "Schema deleted successfully"}
 
 
-@router.get("/", response_model=list[TableSchemaPublic])  #
-def list_schemas(session: SessionDep):
-    schemas = [s.get_public() for s in session.exec(select(TableSchema)).all()]
-    # schemas = session.exec(select(TableSchema)).all()
+@router.get(
+    "/",
+    response_model=list[TableSchemaListItem],
+    response_model_exclude_unset=True,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_304_NOT_MODIFIED: {"description": "Schemas not modified"},
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {"description": "Invalid field"},
+    },
+)
+def list_schemas_api(
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    after_id: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    is_active: bool | None = None,
+    name_prefix: str | None = None,
+    tags: Annotated[list[str] | None, Query()] = None,
+    fields: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """List schemas ordered by their ID.
+    The list is paginated. If more schemas exist, the header X-Next-After-Id
+    contains the value of after_id for the next page. By default, the json
+    schema itself is not returned. Use fields to select the returned fields.
+    The header X-Schemas-Version contains a version token of all schemas. The
+    ETag of a page depends on this token and the query. If it matches the
+    If-None-Match header, 304 Not Modified is returned without listing.
+
+    Args:
+        after_id (int | None): Only list schemas with a larger ID.
+        limit (int): Maximum number of schemas (1 - 1000). Defaults to 100.
+        is_active (bool | None): Only list (in-)active schemas.
+        name_prefix (str | None): Only list schemas whose name starts with it.
+        tags (list[str] | None): Only list schemas having all of these tags.
+        fields (str | None): Comma separated list of the fields to return, e.g.,
+            "id,name,jsonschema". Defaults to id, name, description and
+            is_active.
+        if_none_match (str | None): Entity tags of a cached listing.
+
+    Returns:
+        list[TableSchemaListItem]: The schemas with the requested fields
+    """
+    version = schemas_version(db=session)
+    headers = {
+        "ETag": listing_etag(version, request.query_params.multi_items()),
+        "X-Schemas-Version": version,
+    }
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return _not_modified(headers)
+    response.headers.update(headers)
+    kwargs = {}
+    if fields:
+        kwargs["fields"] = [f.strip() for f in fields.split(",") if f.strip()]
+    try:
+        schemas = list_schemas(
+            db=session,
+            after_id=after_id,
+            limit=limit,
+            is_active=is_active,
+            name_prefix=name_prefix,
+            tags=tags or (),
+            **kwargs,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    if len(schemas) == limit:
+        response.headers["X-Next-After-Id"] = str(schemas[-1]["id"])
     return schemas
@@ -57,6 +57,55 @@ class Settings(BaseSettings):
     # settings for schema storage
     SCHEMA_STORAGE_TYPE: Literal["local"] = "local"
     SCHEMA_STORAGE_PATH: str
+    # number of processes used to validate batches of schemas
+    SCHEMA_VALIDATION_WORKERS: int = 4
+    # schemas read by id or name are cached per process
+    SCHEMA_CACHE_SIZE: int = 256
+    SCHEMA_CACHE_TTL: float = 60.0
+    # broadcast cache invalidations to all processes via the database
+    SCHEMA_CACHE_CHANNEL: Literal["none", "postgres"] = "none"
+    # archives of schemas: members per archive and size in bytes of a member
+    # and of all extracted members of an archive
+    SCHEMA_ARCHIVE_MAX_MEMBERS: int = 1000
+    SCHEMA_ARCHIVE_MAX_MEMBER_SIZE: int = 1024 * 1024
+    SCHEMA_ARCHIVE_MAX_SIZE: int = 16 * 1024 * 1024
+    # range partitioning of time-series data tables (PostgreSQL only)
+    DATA_PARTITIONING: bool = False
+    # partitions created ahead of and behind the current one
+    DATA_PARTITIONS_AHEAD: int = 3
+    DATA_PARTITIONS_BEHIND: int = 1
+    # past partitions kept attached by the maintenance. None keeps all.
+    DATA_PARTITIONS_RETAIN: int | None = None
+    # schema migrations: seconds to wait for a lock before a DDL statement
+    # fails and range of ids updated per backfill transaction
+    MIGRATION_LOCK_TIMEOUT: float = 5
+    MIGRATION_BATCH_SIZE: int = 10_000
+    # data uploads: rows loaded per chunk and errors reported per upload
+    DATA_INGEST_CHUNK_SIZE: int = 10_000
+    DATA_INGEST_MAX_ERRORS: int = 100
+    # data exports: rows fetched from the database and encoded at once
+    DATA_EXPORT_BATCH_SIZE: int = 10_000
+    # storage of uploads loaded by ingestion jobs
+    DATA_STORAGE_TYPE: Literal["local"] = "local"
+    DATA_STORAGE_PATH: str = "./data/uploads/"
+    # worker threads of the API process running ingestion jobs and seconds
+    # between polls of an empty queue
+    INGEST_WORKERS: int = 0
+    INGEST_POLL_INTERVAL: float = 1.0
+    # running jobs send a heartbeat every interval. Jobs without heartbeat for
+    # the lease in seconds are queued again, e.g., as their worker died, and
+    # failed after the maximum number of attempts (PostgreSQL only).
+    INGEST_HEARTBEAT_INTERVAL: float = 10.0
+    INGEST_LEASE: float = 60.0
+    INGEST_MAX_ATTEMPTS: int = 3
+    # seconds the shutdown of the API process waits for its worker threads
+    INGEST_SHUTDOWN_TIMEOUT: float = 30.0
+    # query results cached per process by table write version (0 disables)
+    # and their total size in bytes
+    RESULT_CACHE_SIZE: int = 1024
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # directory of results shared by all processes. None caches per process.
+    RESULT_CACHE_SHARED_PATH: str | None = None
 
     # Backend settings
     BACKEND_IP: str = "localhost"
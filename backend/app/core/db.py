@@ -1,4 +1,5 @@
-from sqlmodel import Session, create_engine, select
+from sqlalchemy import Engine, inspect
+from sqlmodel import Session, SQLModel, create_engine, select
 
 from app.core.config import settings
 from app.core.security import hash_password
@@ -7,14 +8,73 @@ from app.models import User, UserGroup
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
 
+def add_missing_columns(engine: Engine) -> list[str]:
+    """Add the columns of the models that are missing from existing tables,
+    e.g., columns added to a model after its table was created. create_all
+    only creates missing tables.
+
+    Server defaults are set on the new columns, i.e., PostgreSQL fills them in
+    for the existing rows. sqlite only allows constant defaults when adding a
+    column, i.e., other defaults are skipped and the column is left null.
+
+    Args:
+        engine (Engine): Database engine
+
+    Returns:
+        list[str]: The added columns as "table.column"
+
+    Raises:
+        ValueError: If a missing column is not nullable and has no default
+    """
+    dialect = engine.dialect
+    preparer = dialect.identifier_preparer
+    compiler = dialect.ddl_compiler(dialect, None)  # type: ignore[arg-type]
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                default = column.server_default
+                if default is not None and dialect.name == "sqlite":
+                    # e.g., now() is not a constant
+                    if not isinstance(getattr(default, "arg", None), str):
+                        default = None
+                if not column.nullable and default is None:
+                    raise ValueError(
+                        f"The column {column.name} cannot be added to the "
+                        f"table {table.name} without a default"
+                    )
+                ddl = (
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                    f"{preparer.format_column(column)} "
+                    f"{column.type.compile(dialect=dialect)}"
+                )
+                if default is not None:
+                    ddl += f" DEFAULT {compiler.get_column_default_string(column)}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.exec_driver_sql(ddl)
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
 def init_db(session: Session) -> None:
     # TODO Tables should be created with Alembic migrations
     # But if you don't want to use migrations, create
     # the tables un-commenting the next lines
-    from sqlmodel import SQLModel
+    from app.api.crud.schema import backfill_schemas
 
     # This works because the models are already imported and registered from app.models
     SQLModel.metadata.create_all(engine)
+    # upgrade the tables created by earlier versions
+    add_missing_columns(engine)
+    backfill_schemas(db=session)
 
     # create the initial user groups
     for g in ["admin", "standard"]:
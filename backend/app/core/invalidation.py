@@ -0,0 +1,115 @@
+import logging
+import select
+import threading
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from sqlalchemy import Engine, text
+
+logger = logging.getLogger(__name__)
+
+Subscriber = Callable[[str], None]
+
+
+class InvalidationChannel(Protocol):
+    """Channel broadcasting cache invalidations to all processes.
+
+    Messages published by a process are delivered to all subscribers, possibly
+    including the subscribers of the publishing process itself.
+    """
+
+    def publish(self, message: str) -> None: ...
+
+    def subscribe(self, callback: Subscriber) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class LocalInvalidationChannel:
+    """Invalidation channel within a single process.
+
+    Stand-in for a cross-process channel in tests and single worker
+    deployments. Messages are delivered synchronously.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: list[Subscriber] = []
+
+    def publish(self, message: str) -> None:
+        for callback in list(self._subscribers):
+            callback(message)
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    def close(self) -> None:
+        self._subscribers.clear()
+
+
+class PostgresInvalidationChannel:
+    """Invalidation channel using LISTEN/NOTIFY of Postgres.
+
+    A dedicated connection listens for notifications in a daemon thread and
+    hands them to the subscribers. Messages are published with pg_notify,
+    i.e., they are delivered to all processes connected to the same database.
+    """
+
+    def __init__(self, engine: Engine, channel: str = "table_schema") -> None:
+        """Initialize the channel and start listening
+
+        Args:
+            engine (Engine): Engine of a Postgres database using psycopg2
+            channel (str): Name of the notification channel.
+                Defaults to "table_schema".
+        """
+        self._engine = engine
+        self._channel = channel
+        self._subscribers: list[Subscriber] = []
+        self._closed = threading.Event()
+        # the listening connection is removed from the pool as it is never
+        # returned
+        raw = engine.raw_connection()
+        raw.detach()
+        self._conn: Any = raw.driver_connection
+        self._conn.autocommit = True
+        with self._conn.cursor() as cur:
+            cur.execute(f'LISTEN "{channel}"')
+        self._thread = threading.Thread(
+            target=self._listen, name=f"listen-{channel}", daemon=True
+        )
+        self._thread.start()
+
+    def publish(self, message: str) -> None:
+        with self._engine.begin() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :message)"),
+                {"channel": self._channel, "message": message},
+            )
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join(timeout=5)
+        self._conn.close()
+
+    def _listen(self) -> None:
+        """Wait for notifications and pass them to the subscribers"""
+        conn = self._conn
+        while not self._closed.is_set():
+            try:
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+            except Exception:
+                if not self._closed.is_set():
+                    logger.exception("Listening on %s failed", self._channel)
+                return
+            while conn.notifies:
+                message = conn.notifies.pop(0).payload
+                for callback in list(self._subscribers):
+                    try:
+                        callback(message)
+                    except Exception:
+                        logger.exception("Invalidation of %s failed", message)
@@ -0,0 +1,40 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .config import settings
+
+_pool: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor | None:
+    """Get the process pool for CPU-bound work, e.g., schema validation.
+
+    The pool is created on first use and shared by all requests of the
+    process. Worker processes are started on demand.
+
+    Returns:
+        ProcessPoolExecutor | None: The process pool or None if
+            settings.SCHEMA_VALIDATION_WORKERS is smaller than 1
+    """
+    global _pool
+    if settings.SCHEMA_VALIDATION_WORKERS < 1:
+        return None
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.SCHEMA_VALIDATION_WORKERS,
+                    mp_context=get_context("spawn"),
+                )
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Shut down the process pool and wait for running tasks"""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -1,5 +1,12 @@
+import io
+import os
+import shutil
+import uuid
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
+
+# bytes copied at once by save_stream
+COPY_BUFFER_SIZE = 1024 * 1024
 
 
 class LocalFileStorage:
@@ -13,18 +20,38 @@ class LocalFileStorage:
         self.base_path.mkdir(parents=True, exist_ok=True)
 
     def save(self, key: Any, data: bytes) -> str:
-        """Save the data to a file with the given key.
+        """Save the data to a file with the given key. The file is replaced
+        atomically, i.e., readers never see a partially written file.
 
         Args:
             key (Any): The key to save the data with.
             data (bytes): The data to save.
 
+        Returns:
+            str: The key the data was saved with.
+        """
+        return self.save_stream(key, io.BytesIO(data))
+
+    def save_stream(self, key: Any, stream: IO[bytes]) -> str:
+        """Save the content of a binary file object to a file with the given
+        key. The content is copied in chunks, i.e., large uploads are never
+        held in memory. The file is replaced atomically, see save.
+
+        Args:
+            key (Any): The key to save the data with.
+            stream (IO[bytes]): The file object to read the data from.
+
         Returns:
             str: The key the data was saved with.
         """
         file_path = self._get_file_path(key)
-        with file_path.open("wb") as f:
-            f.write(data)
+        tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                shutil.copyfileobj(stream, f, COPY_BUFFER_SIZE)
+            os.replace(tmp_path, file_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
         return str(key)
 
     def load(self, key: Any) -> bytes:
@@ -45,6 +72,24 @@ class LocalFileStorage:
         with file_path.open("rb") as f:
             return f.read()
 
+    def load_stream(self, key: Any) -> IO[bytes]:
+        """Open the file with the given key for reading in chunks, i.e., large
+        files are never held in memory. The caller closes the file.
+
+        Args:
+            key (Any): The key to load the data
+
+        Returns:
+            IO[bytes]: The binary file object
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        file_path = self._get_file_path(key)
+        if not file_path.exists():
+            raise FileNotFoundError(f"File not found: {file_path}")
+        return file_path.open("rb")
+
     def delete(self, key: Any) -> bool:
         """Delete the file with the given key.
 
@@ -1,9 +1,11 @@
-from typing import Any, Protocol
+from typing import IO, Any, Protocol
 
 
 class FileStorageProtocol(Protocol):
     def save(self, key: Any, data: bytes) -> str: ...
+    def save_stream(self, key: Any, stream: IO[bytes]) -> str: ...
     def load(self, key: Any) -> bytes: ...
+    def load_stream(self, key: Any) -> IO[bytes]: ...
     def delete(self, key: Any) -> bool: ...
     def exists(self, key: Any) -> bool: ...
     def list(self) -> list[Any]: ...
@@ -1,6 +1,7 @@
-from typing import Any
+from typing import IO, Any, cast
 
 import boto3
+from boto3.exceptions import S3UploadFailedError
 from mypy_boto3_s3.client import S3Client
 
 
@@ -39,6 +40,27 @@ class S3FileStorage:
         except self.s3_client.exceptions.ClientError:
             raise Exception("AWS credentials not available") from None
 
+    def save_stream(self, key: Any, stream: IO[bytes]) -> str:
+        """Save the content of a binary file object to the bucket with the given
+        key. Large files are uploaded in parts, i.e., they are never held in
+        memory.
+
+        Args:
+            key (Any): The key to save the data with.
+            stream (IO[bytes]): The file object to read the data from.
+
+        Returns:
+            str: The key the data was saved with.
+
+        Raises:
+            Exception: If AWS credentials are not available.
+        """
+        try:
+            self.s3_client.upload_fileobj(stream, self.bucket_name, str(key))
+            return key
+        except (self.s3_client.exceptions.ClientError, S3UploadFailedError):
+            raise Exception("AWS credentials not available") from None
+
     def load(self, key: Any) -> bytes:
         """Load the data from the bucket with the given key.
 
@@ -59,6 +81,27 @@ class S3FileStorage:
                 f"The key {key} does not exist in the bucket"
             ) from None
 
+    def load_stream(self, key: Any) -> IO[bytes]:
+        """Open the object with the given key for reading in chunks, i.e.,
+        large objects are never held in memory. The caller closes the stream.
+
+        Args:
+            key (Any): The key to load the data from.
+
+        Returns:
+            IO[bytes]: The body of the object.
+
+        Raises:
+            FileNotFoundError: If the key does not exist in the bucket.
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=str(key))
+            return cast(IO[bytes], response["Body"])
+        except self.s3_client.exceptions.ClientError:
+            raise FileNotFoundError(
+                f"The key {key} does not exist in the bucket"
+            ) from None
+
     def delete(self, key: Any) -> bool:
         """Delete the key from the bucket.
 
@@ -1,12 +1,36 @@
+from contextlib import asynccontextmanager
+
 from a2wsgi import WSGIMiddleware
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 
+from app.api.crud.job import start_workers
+from app.api.crud.schema import schema_cache
+from app.api.deps import get_data_storage
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import engine
+from app.core.invalidation import PostgresInvalidationChannel
+from app.core.workers import shutdown_process_pool
 from app.middleware.request_logging import RequestLoggingMiddleware
 from app.webui import app as flask_app
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.SCHEMA_CACHE_CHANNEL == "postgres":
+        schema_cache.connect(PostgresInvalidationChannel(engine))
+    workers = None
+    if settings.INGEST_WORKERS > 0:
+        workers = start_workers(engine, get_data_storage(), settings.INGEST_WORKERS)
+    yield
+    if workers is not None:
+        await run_in_threadpool(workers.stop, settings.INGEST_SHUTDOWN_TIMEOUT)
+    schema_cache.disconnect()
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # include routes
@@ -3,3 +3,4 @@ from .user.user_group import *  # noqa
 from .security import *  # noqa
 from . import user  # noqa
 from .schema import *  # noqa
+from .job import *  # noqa
@@ -0,0 +1,3 @@
+from .job import JOB_STATUSES, IngestionJob, IngestionJobPublic
+
+__all__ = ["JOB_STATUSES", "IngestionJob", "IngestionJobPublic"]
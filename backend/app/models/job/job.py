@@ -0,0 +1,84 @@
+from datetime import UTC, datetime
+from typing import Any
+
+from sqlmodel import JSON, TIMESTAMP, Column, Field, SQLModel, func
+
+__all__ = ["IngestionJob", "IngestionJobPublic", "JOB_STATUSES"]
+
+# a job is queued until a worker claims it and then either succeeds or fails
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class IngestionJobPublic(SQLModel):
+    id: int | None = None
+    schema_id: int
+    status: str = "queued"
+    data_format: str
+    mode: str = "append"
+    chunk_size: int | None = None
+    rows: int = 0
+    chunks: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list[str] = []
+    worker: str | None = None
+    attempts: int = 0
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    heartbeat_at: datetime | None = None
+    finished_at: datetime | None = None
+    rows_per_second: float | None = None
+
+
+class IngestionJob(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    schema_id: int = Field(foreign_key="tableschema.id", ondelete="CASCADE")
+    status: str = Field(default="queued", index=True)
+    # key of the uploaded file in the data storage
+    file_key: str
+    data_format: str
+    mode: str = "append"
+    chunk_size: int | None = None
+    rows: int = 0
+    chunks: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list[str] = Field(default_factory=list, sa_column=Column(JSON))
+    worker: str | None = None
+    # number of times the job was claimed, see requeue_expired_jobs
+    attempts: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    created_at: datetime | None = Field(
+        default=None,
+        sa_type=TIMESTAMP(timezone=True),  # type: ignore[call-overload]
+        sa_column_kwargs={"server_default": func.now()},
+    )
+    started_at: datetime | None = Field(
+        default=None,
+        sa_type=TIMESTAMP(timezone=True),  # type: ignore[call-overload]
+    )
+    # last sign of life of the worker running the job
+    heartbeat_at: datetime | None = Field(
+        default=None,
+        sa_type=TIMESTAMP(timezone=True),  # type: ignore[call-overload]
+    )
+    finished_at: datetime | None = Field(
+        default=None,
+        sa_type=TIMESTAMP(timezone=True),  # type: ignore[call-overload]
+    )
+
+    def rows_per_second(self, now: datetime | None = None) -> float | None:
+        """Ingestion rate of a started job until it finished or until now"""
+        if self.started_at is None:
+            return None
+        end = self.finished_at or now or datetime.now(UTC)
+        # sqlite does not store the time zone, times are stored in UTC
+        start = self.started_at.replace(tzinfo=self.started_at.tzinfo or UTC)
+        end = end.replace(tzinfo=end.tzinfo or UTC)
+        seconds = (end - start).total_seconds()
+        return self.rows / seconds if seconds > 0 else None
+
+    def get_public(self) -> IngestionJobPublic:
+        data: dict[str, Any] = self.model_dump(exclude={"file_key"})
+        return IngestionJobPublic(**data, rows_per_second=self.rows_per_second())
@@ -1,3 +1,33 @@
-from .schema import TableSchema, TableSchemaCreate, TableSchemaPublic
+from .schema import (
+    MIGRATION_STATUSES,
+    DataAggregate,
+    DataIngestion,
+    DataPage,
+    DataVersion,
+    ResultCacheStats,
+    SchemaMigration,
+    SchemaValidationReport,
+    TableCreation,
+    TableMigration,
+    TableSchema,
+    TableSchemaCreate,
+    TableSchemaListItem,
+    TableSchemaPublic,
+)
 
-__all__ = ["TableSchema", "TableSchemaCreate", "TableSchemaPublic"]
+__all__ = [
+    "MIGRATION_STATUSES",
+    "DataAggregate",
+    "DataIngestion",
+    "DataPage",
+    "DataVersion",
+    "ResultCacheStats",
+    "SchemaMigration",
+    "SchemaValidationReport",
+    "TableCreation",
+    "TableMigration",
+    "TableSchema",
+    "TableSchemaCreate",
+    "TableSchemaListItem",
+    "TableSchemaPublic",
+]
@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import Any
 
-from sqlmodel import JSON, Column, Field, SQLModel
+from sqlmodel import JSON, TIMESTAMP, Column, Field, SQLModel, func
 
 from ..mixins import TimestampMixin
 
@@ -22,6 +23,115 @@ class TableSchemaPublic(TableSchemaCreate):
 class TableSchema(TableSchemaPublic, table=True, mixins=[TimestampMixin]):
     id: int = Field(default=None, primary_key=True)
     jsonschema: dict[str, Any] = Field(sa_column=Column(JSON))
+    # canonical hash of the json schema, see SchemaManager.schema_hash
+    schema_hash: str | None = Field(default=None, max_length=64)
+    updated_at: datetime | None = Field(
+        default=None,
+        sa_type=TIMESTAMP(timezone=True),  # type: ignore[call-overload]
+        sa_column_kwargs={"server_default": func.now(), "onupdate": func.now()},
+    )
 
     def get_public(self):
         return TableSchemaPublic(**self.model_dump())
+
+
+class TableSchemaListItem(SQLModel):
+    """Schema as listed by the API. Only the requested fields are set."""
+
+    id: int
+    name: str | None = None
+    description: str | None = None
+    is_active: bool | None = None
+    jsonschema: dict[str, Any] | None = None
+
+
+class SchemaValidationReport(SQLModel):
+    source: str
+    name: str | None = None
+    valid: bool
+    errors: list[str] = []
+
+
+class SchemaMigration(SQLModel):
+    table: str
+    statements: list[str] = []
+    backfills: list[str] = []
+    prepare: list[str] = []
+    swap: list[str] = []
+    finalize: list[str] = []
+    applied: bool = False
+    # id of the TableMigration completing the migration in the background
+    migration_id: int | None = None
+
+
+# the migration of a table is completed in the background until it either
+# succeeds or fails
+MIGRATION_STATUSES = ("running", "succeeded", "failed")
+
+
+class TableMigration(SQLModel, table=True):
+    """Status of the background completion of the migration of a table"""
+
+    id: int | None = Field(default=None, primary_key=True)
+    table_name: str = Field(index=True)
+    status: str = "running"
+    error: str | None = None
+    started_at: datetime | None = Field(
+        default=None,
+        sa_type=TIMESTAMP(timezone=True),  # type: ignore[call-overload]
+        sa_column_kwargs={"server_default": func.now()},
+    )
+    finished_at: datetime | None = Field(
+        default=None,
+        sa_type=TIMESTAMP(timezone=True),  # type: ignore[call-overload]
+    )
+
+
+class TableCreation(SQLModel):
+    # names of the created tables by level of the foreign key graph. Tables of
+    # a level only reference tables of earlier levels.
+    levels: list[list[str]]
+
+
+class DataVersion(SQLModel, table=True):
+    """Write version of a data table. It is incremented by every change of the
+    data, i.e., results read at the same version are the same."""
+
+    table_name: str = Field(primary_key=True)
+    version: int = 0
+
+
+class DataPage(SQLModel):
+    table: str
+    fields: list[str]
+    rows: list[dict[str, Any]]
+    # id of the last row, None on the last page
+    next_after: int | None = None
+
+
+class DataAggregate(SQLModel):
+    table: str
+    time_field: str
+    interval: str
+    # unit of the value field
+    unit: str | None = None
+    # lists of the bucket starts, the locations and the statistics
+    columns: dict[str, list[Any]]
+
+
+class ResultCacheStats(SQLModel):
+    schema_id: int
+    # results served from the process, from the shared storage and queried
+    hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0.0
+
+
+class DataIngestion(SQLModel):
+    table: str
+    rows: int = 0
+    chunks: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
@@ -1,3 +1,3 @@
-from .schema_manager import SchemaManager
+from .schema_manager import SchemaManager, SchemaReferenceError
 
-__all__ = ["SchemaManager"]
+__all__ = ["SchemaManager", "SchemaReferenceError"]
@@ -0,0 +1,34 @@
+"""Build the precomputed metaschema bundle for the default metaschema.
+
+The bundle is a json file containing the combined metaschema with all
+references resolved. Loading it avoids parsing the yaml metaschema files at
+startup. The bundle is ignored and rebuilt whenever the content of the
+metaschema files changes.
+
+Usage (from the backend directory):
+    python -m app.schema_manager.bundle
+"""
+
+import logging
+
+from .metaschema import write_bundle
+from .schema_manager import (
+    BASE_SCHEMA,
+    DEFAULT_BUNDLE,
+    SWEET_EXTENSIONS,
+    SchemaManager,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    fingerprint = write_bundle(
+        [BASE_SCHEMA] + SWEET_EXTENSIONS, SchemaManager.combine_schemas, DEFAULT_BUNDLE
+    )
+    logger.info(f"Metaschema bundle {DEFAULT_BUNDLE} written ({fingerprint[:12]})")
+
+
+if __name__ == "__main__":
+    main()
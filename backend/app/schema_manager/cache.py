@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, NamedTuple
+
+__all__ = ["CacheInfo", "LRUCache"]
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache:
+    """Thread-safe mapping with least-recently-used eviction and hit counters.
+    Optionally, entries expire after a fixed time to live and the total weight
+    of the entries, e.g., their size in bytes, is bounded."""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        timer: Callable[[], float] = time.monotonic,
+        weigh: Callable[[Any], int] | None = None,
+        maxweight: int | None = None,
+    ) -> None:
+        """Initialize the cache
+
+        Args:
+            maxsize (int): Maximum number of entries. The least recently used
+                entry is evicted once the cache is full. Defaults to 1024.
+            ttl (float | None): Seconds after which an entry expires. None means
+                entries never expire. Defaults to None.
+            timer (Callable[[], float]): Clock used for the expiry.
+                Defaults to time.monotonic.
+            weigh (Callable[[Any], int] | None): Weight of a value. Defaults to
+                None, i.e., the weight is not bounded.
+            maxweight (int | None): Maximum total weight of the entries. The
+                least recently used entries are evicted once it is exceeded.
+                Values heavier than maxweight are not cached. Defaults to None.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._weigh = weigh if maxweight is not None else None
+        self.maxweight = maxweight
+        self.weight = 0
+        # values are stored together with their expiry time and weight
+        self._data: OrderedDict[Hashable, tuple[float, Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get an entry and mark it as recently used
+
+        Args:
+            key (Hashable): Key of the entry
+            default (Any): Value returned if the key is not cached.
+                Defaults to None.
+
+        Returns:
+            Any: The cached value or default
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < self._timer():
+                if entry is not None:
+                    self._remove(key)
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Add or replace an entry. Evicts the least recently used entry if the
+        cache is full.
+
+        Args:
+            key (Hashable): Key of the entry
+            value (Any): Value to cache
+        """
+        expires = self._timer() + self.ttl if self.ttl is not None else float("inf")
+        weight = self._weigh(value) if self._weigh is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.maxweight is not None and weight > self.maxweight:
+                return
+            self._data[key] = (expires, value, weight)
+            self.weight += weight
+            while len(self._data) > self.maxsize or (
+                self.maxweight is not None and self.weight > self.maxweight
+            ):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key: Hashable) -> tuple[float, Any, int]:
+        """Remove an entry. The lock must be held."""
+        entry = self._data.pop(key)
+        self.weight -= entry[2]
+        return entry
+
+    def pop(self, key: Hashable) -> Any:
+        """Remove an entry if it exists and return its value (or None)"""
+        with self._lock:
+            if key not in self._data:
+                return None
+            return self._remove(key)[1]
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+            self._hits = 0
+            self._misses = 0
+
+    def info(self) -> CacheInfo:
+        """Get hit and miss counters as well as the size of the cache"""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, len(self._data))
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= self._timer()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Callable, Hashable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import ValidationError, best_match
+
+__all__ = [
+    "CompiledMetaschema",
+    "MetaschemaRegistry",
+    "fingerprint",
+    "load_bundle",
+    "metaschema_registry",
+    "write_bundle",
+]
+
+# bundles of older versions are rebuilt, e.g., as the resolution changed
+BUNDLE_VERSION = 2
+
+
+@dataclass(frozen=True)
+class CompiledMetaschema:
+    """A combined metaschema together with its precompiled validator
+
+    Attributes:
+        schema (dict[str, Any]): The combined metaschema as returned by
+            SchemaManager.combine_schemas
+        validator (Draft7Validator): Validator for the metaschema. All local
+            references of the metaschema are already resolved.
+        fingerprint (str): Content hash of the metaschema sources
+    """
+
+    schema: dict[str, Any]
+    validator: Draft7Validator
+    fingerprint: str
+
+    def validate(self, instance: Any) -> None:
+        """Validate an instance against the metaschema
+
+        Args:
+            instance (Any): The instance to validate
+
+        Raises:
+            jsonschema.exceptions.ValidationError: If the instance is not valid.
+                As with jsonschema.validate, the most relevant error is raised.
+        """
+        error: ValidationError | None = best_match(self.validator.iter_errors(instance))
+        if error is not None:
+            raise error
+
+
+def _source_key(source: Any) -> Hashable:
+    """Get a hashable key identifying a metaschema source
+
+    Files are identified by their resolved path, dictionaries and bytes by
+    their content.
+    """
+    if isinstance(source, dict):
+        content = json.dumps(source, sort_keys=True, default=str).encode("utf-8")
+        return ("dict", hashlib.sha256(content).hexdigest())
+    if isinstance(source, bytes):
+        return ("bytes", hashlib.sha256(source).hexdigest())
+    return ("path", str(Path(source).resolve()))
+
+
+def fingerprint(sources: Sequence[Any]) -> str:
+    """Compute a content hash over a list of metaschema sources
+
+    Only the raw content of files is hashed, i.e., files are not parsed.
+
+    Args:
+        sources (Sequence[SchemaFileType]): Base metaschema and extensions
+
+    Returns:
+        str: Hex digest identifying the content of all sources
+    """
+    digest = hashlib.sha256(f"bundle-v{BUNDLE_VERSION}".encode())
+    for source in sources:
+        if isinstance(source, dict):
+            content = json.dumps(source, sort_keys=True, default=str).encode("utf-8")
+        elif isinstance(source, bytes):
+            content = source
+        else:
+            content = Path(source).read_bytes()
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+def _resolve_pointer(root: dict[str, Any], ref: str) -> Any:
+    """Resolve a local json pointer (e.g. #/definitions/schema0) in root"""
+    node: Any = root
+    for part in ref.removeprefix("#").strip("/").split("/"):
+        if not part:
+            continue
+        part = part.replace("~1", "/").replace("~0", "~")
+        node = node[int(part)] if isinstance(node, list) else node[part]
+    return node
+
+
+def _inline_local_refs(
+    node: Any, root: dict[str, Any], stack: tuple[str, ...] = ()
+) -> Any:
+    """Replace all local references in node by the referenced subschema
+
+    Recursive references are left untouched and resolved by the validator.
+    """
+    if isinstance(node, list):
+        return [_inline_local_refs(n, root, stack) for n in node]
+    if not isinstance(node, dict):
+        return node
+    ref = node.get("$ref")
+    if isinstance(ref, str) and ref.startswith("#") and ref not in stack:
+        target = _resolve_pointer(root, ref)
+        return _inline_local_refs(target, root, stack + (ref,))
+    return {k: _inline_local_refs(v, root, stack) for k, v in node.items()}
+
+
+def _has_local_refs(node: Any) -> bool:
+    """Check whether node contains a local reference"""
+    if isinstance(node, list):
+        return any(_has_local_refs(n) for n in node)
+    if not isinstance(node, dict):
+        return False
+    ref = node.get("$ref")
+    if isinstance(ref, str) and ref.startswith("#"):
+        return True
+    return any(_has_local_refs(v) for v in node.values())
+
+
+def _resolve_metaschema(schema: dict[str, Any]) -> dict[str, Any]:
+    """Check a combined metaschema and inline all of its local references
+
+    The definitions are dropped unless recursive references are left, which
+    the validator resolves against them.
+    """
+    Draft7Validator.check_schema(schema)
+    resolved = {k: _inline_local_refs(v, schema) for k, v in schema.items()}
+    rest = {k: v for k, v in resolved.items() if k != "definitions"}
+    return resolved if _has_local_refs(rest) else rest
+
+
+def compile_metaschema(
+    schema: dict[str, Any], fingerprint: str = ""
+) -> CompiledMetaschema:
+    """Check a combined metaschema and build its validator
+
+    Args:
+        schema (dict[str, Any]): Combined metaschema
+        fingerprint (str): Content hash of the metaschema sources.
+            Defaults to "".
+
+    Returns:
+        CompiledMetaschema: The metaschema with its validator
+
+    Raises:
+        jsonschema.exceptions.SchemaError: If the metaschema itself is invalid
+    """
+    validator = Draft7Validator(_resolve_metaschema(schema))
+    return CompiledMetaschema(
+        schema=schema, validator=validator, fingerprint=fingerprint
+    )
+
+
+def write_bundle(
+    sources: Sequence[Any],
+    combine: Callable[[list[Any]], dict[str, Any]],
+    path: str | Path,
+) -> str:
+    """Write the combined and resolved metaschema to a json bundle
+
+    The bundle contains the fingerprint of the sources it was built from. It is
+    written atomically, i.e., concurrent readers never see a partial file.
+
+    Args:
+        sources (Sequence[SchemaFileType]): Base metaschema and extensions
+        combine (Callable): Function combining the sources to a single metaschema
+        path (str | Path): Path of the bundle file
+
+    Returns:
+        str: The fingerprint of the sources
+    """
+    path = Path(path)
+    schema = combine(list(sources))
+    source_hash = fingerprint(sources)
+    bundle = {
+        "version": BUNDLE_VERSION,
+        "fingerprint": source_hash,
+        "schema": schema,
+        "resolved": _resolve_metaschema(schema),
+    }
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(bundle, f, separators=(",", ":"))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return source_hash
+
+
+def load_bundle(path: str | Path, fingerprint: str) -> CompiledMetaschema | None:
+    """Load a compiled metaschema from a json bundle
+
+    Args:
+        path (str | Path): Path of the bundle file
+        fingerprint (str): Expected fingerprint of the metaschema sources
+
+    Returns:
+        CompiledMetaschema | None: The compiled metaschema or None if the bundle
+            does not exist, cannot be read or was built from other sources.
+    """
+    try:
+        with open(path) as f:
+            bundle = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(bundle, dict)
+        or bundle.get("version") != BUNDLE_VERSION
+        or bundle.get("fingerprint") != fingerprint
+    ):
+        return None
+    return CompiledMetaschema(
+        schema=bundle["schema"],
+        validator=Draft7Validator(bundle["resolved"]),
+        fingerprint=fingerprint,
+    )
+
+
+class MetaschemaRegistry:
+    """Process-wide registry of compiled metaschemas
+
+    Reading the metaschema files and building the validator is by far the most
+    expensive part of validating a schema. The registry does this once per set
+    of metaschema sources and process and hands out the compiled metaschema
+    afterwards.
+
+    If a bundle is given, the resolved metaschema is loaded from the bundle as
+    long as its fingerprint matches the content of the sources. Otherwise the
+    sources are parsed and the bundle is rebuilt.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Hashable, CompiledMetaschema] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        sources: Sequence[Any],
+        combine: Callable[[list[Any]], dict[str, Any]],
+        bundle: str | Path | None = None,
+    ) -> CompiledMetaschema:
+        """Get the compiled metaschema for the given sources
+
+        Args:
+            sources (Sequence[SchemaFileType]): Base metaschema and extensions
+            combine (Callable): Function combining the sources to a single
+                metaschema. Only called if the sources are not yet registered
+                and no valid bundle exists.
+            bundle (str | Path | None): Path of a precomputed bundle for the
+                sources. Defaults to None.
+
+        Returns:
+            CompiledMetaschema: The compiled metaschema
+        """
+        key = tuple(_source_key(s) for s in sources)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._build(sources, combine, bundle)
+                self._entries[key] = entry
+        return entry
+
+    @staticmethod
+    def _build(
+        sources: Sequence[Any],
+        combine: Callable[[list[Any]], dict[str, Any]],
+        bundle: str | Path | None,
+    ) -> CompiledMetaschema:
+        """Load the compiled metaschema from the bundle or build it"""
+        source_hash = fingerprint(sources)
+        if bundle is not None:
+            entry = load_bundle(bundle, source_hash)
+            if entry is not None:
+                return entry
+            try:
+                write_bundle(sources, combine, bundle)
+            except OSError:  # pragma: no cover
+                # a read-only file system must not prevent validation
+                pass
+            else:
+                entry = load_bundle(bundle, source_hash)
+                if entry is not None:
+                    return entry
+        return compile_metaschema(combine(list(sources)), fingerprint=source_hash)
+
+    def clear(self) -> None:
+        """Remove all compiled metaschemas from the registry"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+metaschema_registry = MetaschemaRegistry()
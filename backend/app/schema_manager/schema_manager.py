@@ -1,22 +1,114 @@
+import asyncio
+import hashlib
 import json
+import os
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
 from typing import Any, Literal, cast
 
-import jsonschema
 import yaml  # type: ignore
+from jsonschema.exceptions import ValidationError
 
 # from sqlalchemy import Column, UniqueConstraint
-from sqlmodel import Column, Constraint, ForeignKeyConstraint, UniqueConstraint
-
+from sqlmodel import (
+    Column,
+    Constraint,
+    ForeignKeyConstraint,
+    Index,
+    UniqueConstraint,
+)
+
+from .cache import CacheInfo, LRUCache
 from .mappings import map_db_types
+from .metaschema import CompiledMetaschema, metaschema_registry
+from .validator import RowValidator, compile_validator
 
-__all__ = ["SchemaManager"]
+__all__ = ["SchemaManager", "SchemaReferenceError"]
 
 SchemaFileType = str | Path | dict[str, Any] | bytes
+SchemaFormat = Literal["json", "yaml"]
 DbDialect = Literal["sqlite", "postgresql"]
 
+# use the libyaml based loader if available
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 BASE_SCHEMA = Path(__file__).parent / "meta_schemas" / "frictionlessv1.json"
 SWEET_EXTENSIONS = [Path(__file__).parent / "meta_schemas" / "sweet_metastandard.yaml"]
+# precomputed metaschema for the default sources, see app/schema_manager/bundle.py
+DEFAULT_BUNDLE = Path(__file__).parent / "meta_schemas" / "sweet.bundle.json"
+# maximum number of valid schemas remembered by SchemaManager.validate_schema
+VALIDATION_CACHE_SIZE = 1024
+# maximum length of identifiers in PostgreSQL
+MAX_IDENTIFIER_LENGTH = 63
+# range of a partition of a time-series table by frequency of its time field
+PARTITION_INTERVALS = {
+    "minutely": "day",
+    "quarter-hourly": "week",
+    "hourly": "month",
+    "daily": "year",
+}
+
+
+class SchemaReferenceError(ValueError):
+    """Raised if a schema references fields that are not part of the table"""
+
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+    def __reduce__(self):
+        # keep the list of errors when passed between processes
+        return (self.__class__, (self.errors,))
+
+
+def _load_json(content: bytes) -> Any:
+    """Parse json content. Raises a ValueError if the content is not json."""
+    return json.loads(content)
+
+
+def _load_yaml(content: bytes) -> Any:
+    """Parse yaml content. Raises a ValueError if the content is not yaml."""
+    try:
+        return yaml.load(content, Loader=YamlLoader)
+    except yaml.YAMLError as e:
+        raise ValueError(str(e)) from None
+
+
+def sql_identifier(*parts: str) -> str:
+    """Join the parts to an identifier, e.g., the name of an index. Too long
+    identifiers are shortened and made unique by a hash."""
+    name = "_".join(parts)
+    if len(name) <= MAX_IDENTIFIER_LENGTH:
+        return name
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:8]
+    return f"{name[: MAX_IDENTIFIER_LENGTH - 9]}_{digest}"
+
+
+def _tagged(value: Any) -> dict[str, str]:
+    """Encode a value that is no JSON type, e.g., a date read from YAML, with
+    its type. Thus, it is not hashed like its string representation."""
+    text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    return {"$type": type(value).__qualname__, "$value": text}
+
+
+def _main_time_field(schema: dict[str, Any]) -> dict[str, Any] | None:
+    """The first datetime, otherwise date, otherwise any time field of a schema"""
+    type_rank = {"datetime": 0, "date": 1}
+    field_rank = {
+        f["name"]: type_rank.get(f.get("type", ""), 2) for f in schema.get("fields", [])
+    }
+    time_fields = schema.get("timeFields") or []
+    if not time_fields:
+        return None
+    return min(time_fields, key=lambda t: field_rank.get(t["field"], 2))
+
+
+def _as_list(value: Any) -> list[Any]:
+    """Wrap scalar values in a list"""
+    return value if isinstance(value, list) else [value]
 
 
 class SchemaManager:
@@ -31,8 +123,16 @@ class SchemaManager:
     The SchemaManager class is responsible for:
     - reading the schema files
     - ensuring that each schema complies with the meta-schema
+
+    The meta-schema is only read and compiled once per process. All instances
+    using the same meta-schema files share the compiled validator.
+    Valid schemas are remembered process-wide by their content and the
+    meta-schema, i.e., validating the same schema again is a cache lookup.
     """
 
+    _validation_cache = LRUCache(maxsize=VALIDATION_CACHE_SIZE)
+    _row_validators = LRUCache(maxsize=VALIDATION_CACHE_SIZE)
+
     def __init__(
         self,
         metaschema_base: SchemaFileType | None = None,
@@ -56,20 +156,67 @@ class SchemaManager:
                 If an empty list is passed no additional extensions are used.
                 Default is None.
         """
+        # arguments to create the same manager in worker processes
+        self._init_args = (metaschema_base, metaschema_extensions)
         # create the meta-data schema
+        is_default = metaschema_base is None and metaschema_extensions is None
         metaschema_base = metaschema_base or BASE_SCHEMA
         if metaschema_extensions is None:
             schemas = [metaschema_base] + SWEET_EXTENSIONS
         else:
             schemas = [metaschema_base] + metaschema_extensions
-        self._metaschema: dict[str, Any] = self.combine_schemas(schemas)
+        self._compiled: CompiledMetaschema = metaschema_registry.get(
+            schemas,
+            self.combine_schemas,
+            bundle=DEFAULT_BUNDLE if is_default else None,
+        )
+        self._metaschema: dict[str, Any] = self._compiled.schema
+
+    @property
+    def metaschema_fingerprint(self) -> str:
+        """Content hash of the meta-schema files used by this manager"""
+        return self._compiled.fingerprint
+
+    @staticmethod
+    def detect_format(
+        filename: str | None = None, content_type: str | None = None
+    ) -> SchemaFormat | None:
+        """Detect the format of a schema file from its name or content type
+
+        Args:
+            filename (str | None): Name of the file. Defaults to None.
+            content_type (str | None): Media type of the file. Defaults to None.
+
+        Returns:
+            SchemaFormat | None: "json", "yaml" or None if the format is unknown
+        """
+        suffix = Path(filename or "").suffix.lower()
+        if suffix == ".json":
+            return "json"
+        if suffix in (".yaml", ".yml"):
+            return "yaml"
+        media_type = (content_type or "").split(";")[0].strip().lower()
+        if media_type == "application/json" or media_type.endswith("+json"):
+            return "json"
+        if "yaml" in media_type:
+            return "yaml"
+        return None
 
     @staticmethod
-    def read_schema_from_file(file: SchemaFileType) -> dict[str, Any]:
+    def read_schema_from_file(
+        file: SchemaFileType, file_format: SchemaFormat | None = None
+    ) -> dict[str, Any]:
         """Read a file in either json or yaml format
 
+        Bytes are parsed with the parser for the given format. If no format is
+        given, json is assumed if the content starts with "{" or "[" and yaml
+        otherwise. The other parser is only used if the first one fails.
+
         Args:
-            file (str | Path): File path
+            file (str | Path | dict[str, Any] | bytes): File path or content
+            file_format (SchemaFormat | None): Expected format of bytes content,
+                e.g., as detected by SchemaManager.detect_format.
+                Defaults to None.
 
         Returns:
             dict: File contents
@@ -82,27 +229,27 @@ class SchemaManager:
             return file
 
         if isinstance(file, bytes):
-            # Decode the bytes to a string
-            content_str = file.decode("utf-8")
-            res = None
-            try:
-                res = yaml.safe_load(content_str)
-            except yaml.YAMLError:
-                pass
-            try:
-                res = json.loads(content_str)
-            except json.JSONDecodeError:
-                pass
-            if res is not None:
-                return cast(dict[str, Any], res)
+            if file_format is None:
+                start = file.lstrip(b"\xef\xbb\xbf \t\r\n")[:1]
+                file_format = "json" if start in (b"{", b"[") else "yaml"
+            parsers = [_load_json, _load_yaml]
+            if file_format == "yaml":
+                parsers.reverse()
+            for parser in parsers:
+                try:
+                    res = parser(file)
+                except ValueError:
+                    continue
+                if res is not None:
+                    return cast(dict[str, Any], res)
             raise ValueError("Bytes content is not json or yaml") from None
 
         file = Path(file)
-        with open(file) as f:
+        with open(file, "rb") as f:
             if file.suffix == ".json":
                 return cast(dict[str, Any], json.load(f))
             elif file.suffix in [".yaml", ".yml"]:
-                return cast(dict[str, Any], yaml.safe_load(f))
+                return cast(dict[str, Any], yaml.load(f, Loader=YamlLoader))
             else:
                 raise ValueError(
                     f"File {file} is not json or yaml. Use .json, .yaml, or .yml"
@@ -132,22 +279,156 @@ class SchemaManager:
         return combined_schema
 
     @staticmethod
-    def _field_in_table(to_check: Any | list[Any], schema: SchemaFileType) -> bool:
-        """Check if a field or a number of fields is in the table
+    def schema_hash(schema: dict[str, Any]) -> str:
+        """Compute a canonical content hash of a schema
+
+        The hash does not depend on the order of keys in the schema. Values
+        that are no JSON types are hashed with their type, e.g., the date
+        2020-01-01 read from YAML does not hash like the string "2020-01-01".
 
         Args:
-            to_check (Any | list[Any]): Field to check
-            table (list[str]): Table to check against
+            schema (dict[str, Any]): Schema
 
         Returns:
-            bool: True if the field is in the table, False otherwise
+            str: Hex digest of the schema
         """
-        schema = SchemaManager.read_schema_from_file(schema)
-        if not isinstance(to_check, list):
-            to_check = [to_check]
-        to_check = set(to_check)
-        table_fields = {f["name"] for f in schema["fields"]}
-        return to_check.issubset(table_fields)
+        content = json.dumps(
+            schema, sort_keys=True, separators=(",", ":"), default=_tagged
+        ).encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+    @classmethod
+    def validation_cache_info(cls) -> CacheInfo:
+        """Get hits, misses and size of the schema validation cache"""
+        return cls._validation_cache.info()
+
+    @classmethod
+    def clear_validation_cache(cls) -> None:
+        """Remove all entries from the schema validation cache"""
+        cls._validation_cache.clear()
+
+    @staticmethod
+    def natural_key(schema: dict[str, Any]) -> list[str]:
+        """Get the fields that jointly identify the rows of a table
+
+        This is the primary key of the schema. Without primary key, all fields
+        but the value field form the key, see valueField of the meta-schema.
+
+        Args:
+            schema (dict[str, Any]): Schema that complies with the meta-schema
+
+        Returns:
+            list[str]: Names of the key fields. Empty if the table has no key.
+        """
+        if primary_key := schema.get("primaryKey"):
+            return _as_list(primary_key)
+        if value_field := schema.get("valueField"):
+            return [
+                f["name"]
+                for f in schema.get("fields", [])
+                if f["name"] != value_field["field"]
+            ]
+        return []
+
+    @staticmethod
+    def main_time_field(schema: dict[str, Any]) -> str | None:
+        """Get the time field that time ranges of a table refer to by default
+
+        This is the first datetime field, otherwise the first date field,
+        otherwise the first time field of the schema.
+
+        Args:
+            schema (dict[str, Any]): Schema that complies with the meta-schema
+
+        Returns:
+            str | None: Name of the field. None if the schema has no time field.
+        """
+        time_field = _main_time_field(schema)
+        return time_field["field"] if time_field else None
+
+    @classmethod
+    def row_validator(cls, schema: dict[str, Any]) -> RowValidator:
+        """Get the compiled validator for the data rows of a schema
+
+        Validators are compiled once per process and schema content.
+
+        Args:
+            schema (dict[str, Any]): Schema that complies with the meta-schema
+
+        Returns:
+            RowValidator: The validator, see app.schema_manager.validator
+        """
+        key = cls.schema_hash(schema)
+        validator = cls._row_validators.get(key)
+        if validator is None:
+            validator = compile_validator(
+                schema, required=SchemaManager.natural_key(schema)
+            )
+            cls._row_validators.put(key, validator)
+        return validator
+
+    @staticmethod
+    def check_references(schema: dict[str, Any]) -> list[str]:
+        """Check that all fields referenced by the schema are part of the table
+
+        The fields of the table are indexed once and the primary key, the foreign
+        keys, the value field, the time fields and the location fields are checked
+        against this index in a single pass. Rollups additionally require a value
+        field and a datetime main time field.
+
+        Args:
+            schema (dict[str, Any]): Schema that complies with the meta-schema
+
+        Returns:
+            list[str]: All errors found. Empty if all references are valid.
+        """
+        table_fields = {
+            f["name"] for f in schema.get("fields", []) if isinstance(f, dict)
+        }
+        errors: list[str] = []
+
+        if primary_key := schema.get("primaryKey"):
+            if not table_fields.issuperset(_as_list(primary_key)):
+                errors.append(f"Primary key {primary_key} is not part of the table")
+
+        for fkey in schema.get("foreignKeys") or []:
+            foreign_fields = _as_list(fkey["fields"])
+            referenced_fields = _as_list(fkey["reference"]["fields"])
+            # fields listed have to match the length of the referenced fields
+            if len(foreign_fields) != len(referenced_fields):
+                errors.append(
+                    f"Foreign key {foreign_fields} does not match "
+                    f"the length of the reference fields {referenced_fields}"
+                )
+            if not table_fields.issuperset(foreign_fields):
+                errors.append(f"Foreign key {foreign_fields} is not part of the table")
+
+        if value_field := schema.get("valueField"):
+            if value_field["field"] not in table_fields:
+                errors.append(
+                    f"Value field {value_field['field']} is not part of the table"
+                )
+
+        for key, label in [("timeFields", "Time"), ("locationFields", "Location")]:
+            for special in schema.get(key) or []:
+                field = special.get("field")
+                if field is None:
+                    errors.append(f"{label} field {special} does not name a field")
+                elif field not in table_fields:
+                    errors.append(f"{label} field {field} is not part of the table")
+
+        if schema.get("rollups"):
+            time_field = _main_time_field(schema)
+            field_types = {
+                f["name"]: f.get("type")
+                for f in schema.get("fields", [])
+                if isinstance(f, dict)
+            }
+            if not value_field or not time_field:
+                errors.append("Rollups require a value field and a time field")
+            elif field_types.get(time_field["field"]) != "datetime":
+                errors.append("Rollups require a datetime time field")
+        return errors
 
     def validate_schema(self, schema: SchemaFileType) -> dict:
         """Check if a schema is valid given the metadata schema and return it
@@ -165,45 +446,165 @@ class SchemaManager:
             dict[str, Any]: The schema as a dictionary
 
         Raises:
-            ValueError: If the primary key is not part of the fields
+            SchemaReferenceError: If fields referenced by the schema, e.g., the
+                primary key, are not part of the table. The error lists all
+                invalid references.
         """
         schema = SchemaManager.read_schema_from_file(schema)
-        jsonschema.validate(instance=schema, schema=self._metaschema)
+        # schemas that have been validated before are not checked again
+        cache_key = (self.metaschema_fingerprint, self.schema_hash(schema))
+        if self._validation_cache.get(cache_key):
+            return schema
 
-        # check references: primary keys
-        if primary_key := schema.get("primaryKey"):
-            if not SchemaManager._field_in_table(to_check=primary_key, schema=schema):
-                raise ValueError(f"Primary key {primary_key} is not part of the table")
-        # check references: foreign keys
-        if foreign_keys := schema.get("foreignKeys"):
-            for fkey in foreign_keys:
-                foreign_fields = fkey["fields"]
-                if not isinstance(foreign_fields, list):
-                    foreign_fields = [foreign_fields]
-                # check that fields listed match the length of the referenced fields
-                referenced_fields = fkey["reference"]["fields"]
-                if not isinstance(referenced_fields, list):
-                    referenced_fields = [referenced_fields]
-                if len(foreign_fields) != len(referenced_fields):
-                    raise ValueError(
-                        f"Foreign key {foreign_fields} does not match "
-                        f"the length of the reference fields {referenced_fields}"
-                    )
-                # check that the fields are part of the table
-                if not SchemaManager._field_in_table(
-                    to_check=foreign_fields, schema=schema
-                ):
-                    raise ValueError(
-                        f"Foreign key {foreign_fields} is not part of the table"
-                    )
+        self._compiled.validate(schema)
+
+        if errors := self.check_references(schema):
+            raise SchemaReferenceError(errors)
+        self._validation_cache.put(cache_key, True)
         return schema
 
+    def _validate_for_report(
+        self, source: str, schema: SchemaFileType
+    ) -> tuple[dict[str, Any] | None, list[str]]:
+        """Validate a schema and return the errors instead of raising them
+
+        Args:
+            source (str): Name of the schema file. Used to detect the format.
+            schema (SchemaFileType): Schema to validate
+
+        Returns:
+            tuple[dict[str, Any] | None, list[str]]: The schema (None if it cannot
+                be read) and the list of errors
+        """
+        try:
+            data = self.read_schema_from_file(schema, self.detect_format(source))
+        except (ValueError, OSError) as e:
+            return None, [str(e)]
+        try:
+            return self.validate_schema(data), []
+        except ValidationError as e:
+            return data, [f"{e.message} ({e.json_path})"]
+        except SchemaReferenceError as e:
+            return data, list(e.errors)
+
+    def validate_many(
+        self,
+        schemas: Mapping[str, SchemaFileType],
+        known_resources: Iterable[str] = (),
+        max_workers: int | None = None,
+        executor: Executor | None = None,
+    ) -> list[dict[str, Any]]:
+        """Validate many schemas in parallel and report the result per schema
+
+        Schemas are validated on a pool of worker processes. Each worker compiles
+        the meta-schema once. In addition to the checks of validate_schema, the
+        resources referenced by foreign keys have to be either part of the batch
+        or known, e.g., already stored in the database. Schema names have to be
+        unique within the batch.
+
+        Args:
+            schemas (Mapping[str, SchemaFileType]): Schemas to validate by source
+                name, e.g., the file name.
+            known_resources (Iterable[str]): Names of tables that foreign keys may
+                reference in addition to the schemas of the batch. Defaults to ().
+            max_workers (int | None): Maximum number of worker processes.
+                If None, the number of CPUs is used. If 1, the schemas are
+                validated in the current process. Defaults to None.
+            executor (Executor | None): Long-lived process pool to use instead
+                of starting a new pool. Defaults to None.
+
+        Returns:
+            list[dict[str, Any]]: One report per schema in the order of the input.
+                Each report contains the "source", the schema "name" (None if
+                the schema cannot be read), whether it is "valid" and the list of
+                "errors".
+        """
+        items = list(schemas.items())
+        workers = min(max_workers or os.cpu_count() or 1, len(items))
+        results: list[tuple[dict[str, Any] | None, list[str]]]
+        if workers <= 1:
+            results = [self._validate_for_report(*item) for item in items]
+        else:
+            tasks = [(self._init_args, source, schema) for source, schema in items]
+            chunksize = max(1, len(items) // (workers * 4))
+            if executor is not None:
+                results = list(
+                    executor.map(_validate_worker, tasks, chunksize=chunksize)
+                )
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=get_context("spawn")
+                ) as pool:
+                    results = list(
+                        pool.map(_validate_worker, tasks, chunksize=chunksize)
+                    )
+
+        # cross-check names and foreign keys within the batch
+        names = Counter(
+            schema.get("name") for schema, _ in results if isinstance(schema, dict)
+        )
+        available = set(known_resources) | set(names)
+        reports = []
+        for (source, _), (schema, errors) in zip(items, results, strict=True):
+            name = schema.get("name") if isinstance(schema, dict) else None
+            if name is not None and names[name] > 1:
+                errors.append(f"Schema name {name} is used more than once")
+            if not errors and schema is not None:
+                for fkey in schema.get("foreignKeys") or []:
+                    resource = fkey["reference"]["resource"]
+                    # an empty resource references the table itself
+                    if resource not in available and resource not in ("", name):
+                        errors.append(
+                            f"Foreign key resource {resource} is neither part of "
+                            "the batch nor an existing schema"
+                        )
+            reports.append(
+                {"source": source, "name": name, "valid": not errors, "errors": errors}
+            )
+        return reports
+
+    async def validate_schema_async(
+        self,
+        schema: bytes | dict[str, Any],
+        file_format: SchemaFormat | None = None,
+        executor: Executor | None = None,
+    ) -> dict[str, Any]:
+        """Read and validate a schema without blocking the event loop
+
+        Args:
+            schema (bytes | dict[str, Any]): Schema content
+            file_format (SchemaFormat | None): Format of bytes content.
+                Defaults to None.
+            executor (Executor | None): Process pool to validate the schema in.
+                If None, the schema is validated in a thread. Defaults to None.
+
+        Returns:
+            dict[str, Any]: The validated schema
+
+        Raises:
+            jsonschema.exceptions.ValidationError: If the schema is not valid
+            SchemaReferenceError: If referenced fields are not part of the table
+            ValueError: If the content is not json or yaml
+        """
+        loop = asyncio.get_running_loop()
+        if executor is None:
+            return await loop.run_in_executor(
+                None,
+                lambda: self.validate_schema(
+                    self.read_schema_from_file(schema, file_format)
+                ),
+            )
+        return await loop.run_in_executor(
+            executor, _validate_in_worker, self._init_args, schema, file_format
+        )
+
     def model_from_schema(
         self,
         schema: SchemaFileType,
         validate_schema: bool = False,
         db_dialect: DbDialect = "sqlite",
         create_id_column: str | None = None,
+        partitioned: bool = False,
     ) -> dict[str, Any]:
         """Create sqlmodel inputs from a given schema
 
@@ -216,13 +617,24 @@ class SchemaManager:
             create_id_column (str | None, optional): If provided, a column with the
                 given name is added to the table and defined as the primary key.
                 Defaults to None.
+            partitioned (bool, optional): If True and the dialect is "postgresql",
+                the table is range partitioned on its main time field, see
+                SchemaManager.partition_from_schema. The time field becomes part
+                of the primary key. Defaults to False.
 
         Returns:
-            dict[str, Any]: A dictionary with the table name, columns, and constraints.
-                The table name is the name of the schema and the columns are
-                the columns of the table. The columns are sqlmodel.Column objects.
-                The constraints are table level constraints. Column level constraints
-                are already defined at the column level.
+            dict[str, Any]: A dictionary with the table name, columns, constraints,
+                indexes and partition. The table name is the name of the schema and the
+                columns are the columns of the table. The columns are
+                sqlmodel.Column objects. The constraints are table level
+                constraints. Column level constraints are already defined at the
+                column level. The indexes are derived from the time, location
+                and value fields, see SchemaManager.indexes_from_schema. The
+                partition is None or a dictionary with the partitioned column
+                and the interval of each partition.
+
+        Raises:
+            ValueError: If the table cannot be partitioned
         """
         constraints: list[Constraint] = []
         # read and validate the schema
@@ -249,13 +661,24 @@ class SchemaManager:
                 0, Column(create_id_column, type_=db_types["integer"], primary_key=True)
             )
 
+        partition = None
+        if partitioned and db_dialect == "postgresql":
+            partition = SchemaManager.partition_from_schema(my_schema)
+            # the primary key of a partitioned table has to contain the column
+            # it is partitioned by
+            for col in table_columns:
+                if col.name == partition["column"]:
+                    col.primary_key = create_id_column is not None
+                    col.nullable = False
+                elif col.name == create_id_column:
+                    col.autoincrement = True
+
         # if the schema has a primary key, add a constraint to the table that
         # enforces that these columns are jointly unique and not-null
         # However, we enforces only the constraint and set the corresponding index
         # but the (internal) primary key is kept the "real" primary key
-        if primary_key := my_schema.get("primaryKey"):
-            if not isinstance(primary_key, list):
-                primary_key = [primary_key]
+        # Without primary key, the fields other than the value field are the key
+        if primary_key := SchemaManager.natural_key(my_schema):
             # Add non-zero constraints
             for col in table_columns:
                 if col.name in primary_key:
@@ -289,8 +712,104 @@ class SchemaManager:
             "name": table_name,
             "columns": table_columns,
             "constraints": constraints,
+            "indexes": SchemaManager.indexes_from_schema(my_schema, db_dialect),
+            "partition": partition,
         }
 
+    @staticmethod
+    def partition_from_schema(schema: dict[str, Any]) -> dict[str, str]:
+        """Get the range partitioning of a time-series table
+
+        The table is partitioned by its main time field, i.e., the first
+        datetime or date field. The range of each partition follows from the
+        frequency of the field, see PARTITION_INTERVALS.
+
+        Args:
+            schema (dict[str, Any]): Schema that complies with the meta-schema
+
+        Returns:
+            dict[str, str]: The partitioned column and the interval of each
+                partition, e.g., {"column": "datetime", "interval": "month"}
+
+        Raises:
+            ValueError: If the table has no datetime or date field with a known
+                frequency or the primary key does not contain the field
+        """
+        time_field = _main_time_field(schema)
+        field_types = {f["name"]: f.get("type") for f in schema.get("fields", [])}
+        if time_field is None or field_types.get(time_field["field"]) not in (
+            "datetime",
+            "date",
+        ):
+            raise ValueError("Only tables with datetime or date fields are partitioned")
+        interval = PARTITION_INTERVALS.get(time_field.get("frequency", ""))
+        if interval is None:
+            raise ValueError(
+                f"Frequency {time_field.get('frequency')} is not partitioned. "
+                f"Use one of {list(PARTITION_INTERVALS)}"
+            )
+        primary_key = _as_list(schema.get("primaryKey") or [])
+        if primary_key and time_field["field"] not in primary_key:
+            raise ValueError(
+                f"Primary key {primary_key} must contain {time_field['field']}"
+            )
+        return {"column": time_field["field"], "interval": interval}
+
+    @staticmethod
+    def indexes_from_schema(
+        schema: dict[str, Any], db_dialect: DbDialect = "sqlite"
+    ) -> list[Index]:
+        """Derive the indexes of a table from its time, location and value fields
+
+        On PostgreSQL, each time field gets a BRIN index, which is small and
+        efficient for time ranges as long as data is mostly appended in time
+        order. Each location field gets a B-tree index on (location, time) with
+        the main time field that includes the value field, i.e., queries for
+        the values of a location in a time range are answered from the index.
+        On other dialects, plain B-tree indexes are used and indexes already
+        provided by the primary key constraint are skipped.
+        The main time field is the first datetime field, otherwise the first date
+        field, otherwise the first time field.
+
+        Args:
+            schema (dict[str, Any]): Schema that complies with the meta-schema
+            db_dialect (DbDialect, optional): Database dialect. Defaults to "sqlite".
+
+        Returns:
+            list[Index]: The indexes. Columns are given by name, i.e., the
+                indexes are bound to the table they are passed to.
+        """
+        table_name = schema["name"]
+        time_fields = [t["field"] for t in schema.get("timeFields") or []]
+        location_fields = [loc["field"] for loc in schema.get("locationFields") or []]
+        value_field = (schema.get("valueField") or {}).get("field")
+        primary_key = SchemaManager.natural_key(schema)
+        postgres = db_dialect == "postgresql"
+
+        def covered(columns: list[str]) -> bool:
+            # the unique constraint of the primary key comes with an index
+            return not postgres and primary_key[: len(columns)] == columns
+
+        indexes: list[Index] = []
+        for time_field in time_fields:
+            if postgres:
+                name = sql_identifier("brin", table_name, time_field)
+                indexes.append(Index(name, time_field, postgresql_using="brin"))
+            elif not covered([time_field]):
+                name = sql_identifier("ix", table_name, time_field)
+                indexes.append(Index(name, time_field))
+        main_time = [t["field"]] if (t := _main_time_field(schema)) else []
+        for location_field in location_fields:
+            columns = [location_field] + main_time
+            if covered(columns):
+                continue
+            name = sql_identifier("ix", table_name, *columns)
+            if postgres and value_field and value_field not in columns:
+                indexes.append(Index(name, *columns, postgresql_include=[value_field]))
+            else:
+                indexes.append(Index(name, *columns))
+        return indexes
+
     @staticmethod
     def _field_to_columns(field: dict[str, Any], db_types: dict[str, Any]) -> Column:
         """Convert a field in the schema to sqlalchemy column
@@ -302,7 +821,7 @@ class SchemaManager:
         Returns:
             Column: SQLAlchemy column object
         """
-        # Todo: add support for constraints
+        # Todo: add support for constraints other than required
         field_name = field["name"]
         field_type = field["type"]
         if field_type not in db_types:
@@ -310,5 +829,48 @@ class SchemaManager:
                 f"Field type {field_type} is not supported for given db dialect"
             )
         db_field_type = db_types[field_type]
-        column: Column = Column(field_name, type_=db_field_type)
+        required = (field.get("constraints") or {}).get("required", False)
+        column: Column = Column(field_name, type_=db_field_type, nullable=not required)
         return column
+
+
+# schema manager of a worker process, see SchemaManager.validate_many
+_worker_manager: SchemaManager | None = None
+
+
+def _get_worker_manager(init_args: tuple[Any, Any]) -> SchemaManager:
+    """Get the schema manager of the worker process for the given arguments"""
+    global _worker_manager
+    if _worker_manager is None or _worker_manager._init_args != init_args:
+        _worker_manager = SchemaManager(*init_args)
+    return _worker_manager
+
+
+def _validate_worker(
+    task: tuple[tuple[Any, Any], str, SchemaFileType],
+) -> tuple[dict[str, Any] | None, list[str]]:
+    init_args, source, schema = task
+    return _get_worker_manager(init_args)._validate_for_report(source, schema)
+
+
+def _validate_in_worker(
+    init_args: tuple[Any, Any],
+    schema: SchemaFileType,
+    file_format: SchemaFormat | None,
+) -> dict[str, Any]:
+    manager = _get_worker_manager(init_args)
+    try:
+        return manager.validate_schema(
+            manager.read_schema_from_file(schema, file_format)
+        )
+    except ValidationError as e:
+        # the original error references the validator and cannot be pickled
+        raise ValidationError(
+            e.message,
+            validator=e.validator,  # type: ignore[arg-type]
+            path=e.relative_path,
+            validator_value=e.validator_value,
+            instance=e.instance,
+            schema=e.schema,
+            schema_path=e.relative_schema_path,
+        ) from None
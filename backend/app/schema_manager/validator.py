@@ -0,0 +1,422 @@
+"""Validation of data rows against the fields of a schema.
+
+A schema is compiled once into one checker per field. The checkers work on
+whole columns of a batch of rows: the values of a column are parsed with a
+single map and each constraint is checked with a single comprehension, i.e.,
+types and constraints are not looked up again for every value. Only columns
+with values that cannot be parsed fall back to parsing value by value to
+locate the invalid rows.
+"""
+
+import json
+import operator
+import re
+import uuid
+from collections.abc import Callable, Collection, Sequence
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, time
+from typing import Any
+
+__all__ = [
+    "PARSERS",
+    "ColumnChecker",
+    "RowValidator",
+    "ValidationReport",
+    "compile_validator",
+]
+
+# number of row numbers listed per error in ValidationReport.messages
+MAX_ROWS_PER_MESSAGE = 10
+
+_TRUE = {"true", "True", "TRUE", "1", "yes"}
+_FALSE = {"false", "False", "FALSE", "0", "no"}
+
+
+def _bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError(f"{value!r} is not a boolean")
+
+
+def _int(value: Any) -> int:
+    if isinstance(value, bool | float):
+        raise ValueError(f"{value!r} is not an integer")
+    return int(value)
+
+
+def _float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not a number")
+    return float(value)
+
+
+def _from_iso(cls: Any) -> Callable[[Any], Any]:
+    def parse(value: Any) -> Any:
+        if isinstance(value, cls):
+            return value
+        return cls.fromisoformat(value)
+
+    return parse
+
+
+def _json(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _length(value: Any) -> int:
+    """Length of a value as text, i.e., of other types than string, too"""
+    return len(value if isinstance(value, str) else str(value))
+
+
+def _naive_utc(value: Any) -> Any:
+    """Aware datetimes in UTC without time zone, i.e., comparable with naive
+    datetimes, which are taken to be in UTC. Other values are returned as is."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def _uuid(value: Any) -> uuid.UUID:
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+# parse raw values of CSV (strings) or JSON (typed) files by field type
+PARSERS: dict[str, Callable[[Any], Any]] = {
+    "any": _json,
+    "boolean": _bool,
+    "date": _from_iso(date),
+    "datetime": _from_iso(datetime),
+    "integer": _int,
+    "json": _json,
+    "number": _float,
+    "string": str,
+    "time": _from_iso(time),
+    "uuid": _uuid,
+    "year": _int,
+}
+
+
+@dataclass
+class ValidationReport:
+    """Errors of a batch of rows grouped by field and error
+
+    Attributes:
+        n_rows (int): Number of validated rows
+        errors (dict[tuple[str, str], list[int]]): Indexes of the invalid rows
+            by field and error message. Indexes start at 0.
+    """
+
+    n_rows: int = 0
+    errors: dict[tuple[str, str], list[int]] = field(default_factory=dict)
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    @property
+    def invalid_rows(self) -> list[int]:
+        """Sorted indexes of all invalid rows"""
+        return sorted({i for rows in self.errors.values() for i in rows})
+
+    def add(self, field_name: str, message: str, rows: list[int]) -> None:
+        """Add the rows violating a check of a field. Empty rows are ignored."""
+        if rows:
+            self.errors.setdefault((field_name, message), []).extend(rows)
+
+    def messages(self, offset: int = 0, limit: int | None = None) -> list[str]:
+        """Summarize the errors with one message per field and error
+
+        Args:
+            offset (int): Added to the row indexes, e.g., to number the rows
+                of a file from 1 on. Defaults to 0.
+            limit (int | None): Maximum number of messages. Defaults to None.
+
+        Returns:
+            list[str]: Messages like "country: value is required (rows 2, 7)"
+        """
+        messages = []
+        for (field_name, message), rows in list(self.errors.items())[:limit]:
+            numbers = ", ".join(str(i + offset) for i in rows[:MAX_ROWS_PER_MESSAGE])
+            if len(rows) > MAX_ROWS_PER_MESSAGE:
+                numbers += f" and {len(rows) - MAX_ROWS_PER_MESSAGE} more"
+            label = "row" if len(rows) == 1 else "rows"
+            messages.append(f"{field_name}: {message} ({label} {numbers})")
+        return messages
+
+
+# marks values that could not be parsed
+_INVALID = object()
+
+
+class ColumnChecker:
+    """Parse a column of raw values of a field and check its constraints
+
+    Supported are the field types of PARSERS, the constraints required,
+    minimum, maximum, enum, pattern, minLength and maxLength and the
+    missingValues of the schema.
+    """
+
+    def __init__(
+        self,
+        field: dict[str, Any],
+        missing_values: Sequence[str] = ("",),
+        required: bool = False,
+    ) -> None:
+        """Compile the checks of a field
+
+        Args:
+            field (dict[str, Any]): Field of the schema
+            missing_values (Sequence[str]): Raw values that are read as null.
+                Defaults to ("",).
+            required (bool): The field must not be null, e.g., since it is part
+                of the primary key. Defaults to False.
+
+        Raises:
+            ValueError: If the type of the field is not supported
+        """
+        self.name: str = field["name"]
+        self.type: str = field.get("type", "any")
+        parse = PARSERS.get(self.type)
+        if parse is None:
+            raise ValueError(f"Field type {self.type} is not supported")
+        self.parse = parse
+        constraints = field.get("constraints") or {}
+        self.constraints: dict[str, Any] = constraints
+        self.required = required or constraints.get("required", False)
+        self.missing = frozenset(missing_values)
+        # bounds and enum values are given as raw values of the field type
+        self.minimum = self._parse_optional(constraints.get("minimum"))
+        self.maximum = self._parse_optional(constraints.get("maximum"))
+        enum = constraints.get("enum")
+        self.enum = None if enum is None else frozenset(map(parse, enum))
+        pattern = constraints.get("pattern")
+        self.pattern = None if pattern is None else re.compile(pattern)
+        self.min_length: int | None = constraints.get("minLength")
+        self.max_length: int | None = constraints.get("maxLength")
+
+    def _parse_optional(self, value: Any) -> Any:
+        return None if value is None else self.parse(value)
+
+    def __call__(self, values: Sequence[Any], report: ValidationReport) -> list[Any]:
+        """Parse and check a column
+
+        Args:
+            values (Sequence[Any]): Raw values of the column
+            report (ValidationReport): Errors are added to this report
+
+        Returns:
+            list[Any]: The parsed values. Missing values are None.
+        """
+        n = len(values)
+        missing = self.missing
+        present = [
+            i
+            for i, v in enumerate(values)
+            if v is not None and not (type(v) is str and v in missing)
+        ]
+        if len(present) == n:
+            raw = list(values)
+        else:
+            raw = [values[i] for i in present]
+            if self.required:
+                absent = sorted(set(range(n)).difference(present))
+                report.add(self.name, "value is required", absent)
+
+        if self.pattern is not None:
+            match = self.pattern.fullmatch
+            report.add(
+                self.name,
+                f"does not match {self.pattern.pattern}",
+                [i for i, v in zip(present, raw, strict=True) if not match(str(v))],
+            )
+
+        parse = self.parse
+        try:
+            parsed = list(map(parse, raw))
+        except (TypeError, ValueError):
+            parsed = [self._try_parse(v) for v in raw]
+            report.add(
+                self.name,
+                f"is not of type {self.type}",
+                [i for i, v in zip(present, parsed, strict=True) if v is _INVALID],
+            )
+            pairs = [
+                (i, v)
+                for i, v in zip(present, parsed, strict=True)
+                if v is not _INVALID
+            ]
+            present, parsed = [i for i, _ in pairs], [v for _, v in pairs]
+
+        self._check_constraints(present, parsed, report)
+        if len(present) == n:
+            return parsed
+        column: list[Any] = [None] * n
+        for i, v in zip(present, parsed, strict=True):
+            column[i] = v
+        return column
+
+    def _try_parse(self, value: Any) -> Any:
+        try:
+            return self.parse(value)
+        except (TypeError, ValueError):
+            return _INVALID
+
+    def _compare(
+        self,
+        rows: list[int],
+        values: list[Any],
+        constraint: str,
+        op: Callable[[Any, Any], bool],
+        report: ValidationReport,
+    ) -> list[int]:
+        """Compare values with a bound one by one, e.g., if aware and naive
+        datetimes are mixed. Datetimes are compared in UTC and values that
+        still cannot be compared are reported.
+
+        Returns:
+            list[int]: Rows whose value violates the bound
+        """
+        bound = _naive_utc(getattr(self, constraint))
+        invalid, incomparable = [], []
+        for i, v in zip(rows, values, strict=True):
+            try:
+                if op(_naive_utc(v), bound):
+                    invalid.append(i)
+            except TypeError:
+                incomparable.append(i)
+        report.add(
+            self.name,
+            f"cannot be compared with {self.constraints[constraint]}",
+            incomparable,
+        )
+        return invalid
+
+    def _check_constraints(
+        self, rows: list[int], values: list[Any], report: ValidationReport
+    ) -> None:
+        """Check the constraints of parsed values and report violations"""
+        name = self.name
+        if (minimum := self.minimum) is not None:
+            try:
+                pairs = zip(rows, values, strict=True)
+                invalid = [i for i, v in pairs if v < minimum]
+            except TypeError:
+                invalid = self._compare(rows, values, "minimum", operator.lt, report)
+            report.add(name, f"is less than {self.constraints['minimum']}", invalid)
+        if (maximum := self.maximum) is not None:
+            try:
+                pairs = zip(rows, values, strict=True)
+                invalid = [i for i, v in pairs if v > maximum]
+            except TypeError:
+                invalid = self._compare(rows, values, "maximum", operator.gt, report)
+            report.add(name, f"is greater than {self.constraints['maximum']}", invalid)
+        if (enum := self.enum) is not None:
+            pairs = zip(rows, values, strict=True)
+            report.add(
+                name,
+                f"is not one of {sorted(map(str, enum))}",
+                [i for i, v in pairs if v not in enum],
+            )
+        if (min_length := self.min_length) is not None:
+            pairs = zip(rows, values, strict=True)
+            report.add(
+                name,
+                f"is shorter than {min_length}",
+                [i for i, v in pairs if _length(v) < min_length],
+            )
+        if (max_length := self.max_length) is not None:
+            pairs = zip(rows, values, strict=True)
+            report.add(
+                name,
+                f"is longer than {max_length}",
+                [i for i, v in pairs if _length(v) > max_length],
+            )
+
+
+class RowValidator:
+    """Validate batches of rows against the fields of a schema"""
+
+    def __init__(self, schema: dict[str, Any], required: Collection[str] = ()) -> None:
+        """Compile a checker for each field of the schema
+
+        Args:
+            schema (dict[str, Any]): Schema that complies with the meta-schema
+            required (Collection[str]): Fields that must not be null in addition
+                to the required fields of the schema, e.g., the key of the
+                table. Defaults to ().
+
+        Raises:
+            ValueError: If the type of a field is not supported
+        """
+        missing_values = schema.get("missingValues", [""])
+        self.fields: list[str] = [f["name"] for f in schema["fields"]]
+        self.checkers = [
+            ColumnChecker(f, missing_values, required=f["name"] in required)
+            for f in schema["fields"]
+        ]
+        self._known = frozenset(self.fields)
+
+    def validate_columns(
+        self, columns: Sequence[Sequence[Any]], report: ValidationReport | None = None
+    ) -> tuple[list[list[Any]], ValidationReport]:
+        """Validate a batch of rows given by column
+
+        Args:
+            columns (Sequence[Sequence[Any]]): Raw values of each field in the
+                order of the fields. All columns have the same length.
+            report (ValidationReport | None): Report to add the errors to.
+                Defaults to None, which creates a new report.
+
+        Returns:
+            tuple[list[list[Any]], ValidationReport]: The parsed columns and the
+                errors
+        """
+        if report is None:
+            report = ValidationReport(n_rows=len(columns[0]) if columns else 0)
+        parsed = [
+            checker(column, report)
+            for checker, column in zip(self.checkers, columns, strict=True)
+        ]
+        return parsed, report
+
+    def validate_rows(
+        self, rows: Sequence[dict[str, Any]]
+    ) -> tuple[list[tuple[Any, ...]], ValidationReport]:
+        """Validate a batch of rows given by field name
+
+        Args:
+            rows (Sequence[dict[str, Any]]): The rows. Missing fields are null.
+
+        Returns:
+            tuple[list[tuple[Any, ...]], ValidationReport]: The parsed rows as
+                tuples in the order of the fields and the errors
+        """
+        report = ValidationReport(n_rows=len(rows))
+        known = self._known
+        unknown = [i for i, row in enumerate(rows) if not known.issuperset(row)]
+        if unknown:
+            names = set().union(*(rows[i].keys() for i in unknown)) - known
+            report.add("*", f"unknown fields {sorted(map(str, names))}", unknown)
+        columns = [[row.get(name) for row in rows] for name in self.fields]
+        parsed, report = self.validate_columns(columns, report)
+        return list(zip(*parsed, strict=True)), report
+
+
+def compile_validator(
+    schema: dict[str, Any], required: Collection[str] = ()
+) -> RowValidator:
+    """Compile a validator for the data rows of a schema
+
+    Args:
+        schema (dict[str, Any]): Schema that complies with the meta-schema
+        required (Collection[str]): Fields that must not be null in addition to
+            the required fields of the schema. Defaults to ().
+
+    Returns:
+        RowValidator: The validator
+    """
+    return RowValidator(schema, required)
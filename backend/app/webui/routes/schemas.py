@@ -1,3 +1,4 @@
+from collections.abc import Mapping
 from typing import Any
 
 import requests
@@ -15,6 +16,42 @@ from ..settings import admin_required, get_fastapi_url
 
 schema_bp = Blueprint("schemas", __name__)
 
+# responses of the API by url and query. They are revalidated with their ETag,
+# i.e., unchanged schemas are not transferred again.
+_ETAG_CACHE_SIZE = 256
+_etag_cache: dict[str, tuple[str, Any, Mapping[str, str]]] = {}
+
+
+def _get_json(
+    url: str, header: dict[str, Any] | None, params: dict[str, Any] | None = None
+) -> tuple[int, Any, Mapping[str, str]]:
+    """Conditional GET of a json resource from the API.
+
+    Args:
+        url (str): The url of the resource.
+        header (dict[str, Any] | None): Headers for the request.
+        params (dict[str, Any] | None): Query parameters. Defaults to None.
+
+    Returns:
+        tuple[int, Any, Mapping[str, str]]: Status code, json content and headers.
+            The status code is 200 if the cached content is still valid.
+    """
+    key = requests.Request("GET", url, params=params).prepare().url or url
+    headers = dict(header or {})
+    if cached := _etag_cache.get(key):
+        headers["If-None-Match"] = cached[0]
+    response = requests.get(url, headers=headers, params=params)
+    if response.status_code == 304 and cached:
+        return 200, cached[1], cached[2]
+    if response.status_code != 200:
+        return response.status_code, None, response.headers
+    content = response.json()
+    if etag := response.headers.get("ETag"):
+        if len(_etag_cache) >= _ETAG_CACHE_SIZE:
+            _etag_cache.clear()
+        _etag_cache[key] = (etag, content, response.headers)
+    return 200, content, response.headers
+
 
 @schema_bp.route("/schemas", methods=["GET", "POST"])
 @admin_required
@@ -51,10 +88,20 @@ def schemas(header: dict[str, Any]):
                 except Exception:
                     return redirect(url_for("schemas.schemas"))
 
-    # Fetch the list of schemas from FastAPI
-    response = requests.get(f"{get_fastapi_url()}schema", headers=header)
-    if response.status_code == 200:
-        schemas = response.json()
+    # Fetch the list of schemas from FastAPI page by page
+    schemas: list[dict[str, Any]] = []
+    params: dict[str, Any] = {"limit": 1000}
+    while True:
+        status_code, page, page_headers = _get_json(
+            f"{get_fastapi_url()}schema", header, params
+        )
+        if status_code != 200:
+            break
+        schemas.extend(page)
+        if not (next_id := page_headers.get("X-Next-After-Id")):
+            break
+        params["after_id"] = next_id
+    if status_code == 200:
         # Get the error message and success message from the query parameters
         error_message = request.args.get("error_message")
         success_message = request.args.get("success_message")
@@ -76,9 +123,8 @@ def view_schema(schema_id: int, header: dict[str, Any] | None = None):
         header (dict[str, Any] | None): Optional headers for the request.
     """
     fastapi_url = get_fastapi_url()
-    response = requests.get(f"{fastapi_url}schema/{schema_id}", headers=header)
-    if response.status_code == 200:
-        schema = response.json()
+    status_code, schema, _ = _get_json(f"{fastapi_url}schema/{schema_id}", header)
+    if status_code == 200:
         return jsonify(schema["jsonschema"])
     flash("Schema not found", "error")
     return redirect(url_for("schemas.schemas"))
@@ -0,0 +1,102 @@
+"""Benchmark the creation of a data table against databases of different size.
+
+"before" mimics the previous behaviour where every table creation cleared the
+shared metadata, reflected the whole database and ran create_all. "after" is
+create_table_from_schema, which only reflects the tables referenced by the
+foreign keys of the schema.
+
+Each database is a temporary sqlite file with the given number of existing
+tables. Half of them reference another table.
+
+Run from the backend directory:
+    python -m benchmarks.bench_create_table
+"""
+
+import tempfile
+import time
+from copy import deepcopy
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlmodel import MetaData, Session, Table, create_engine, text
+
+from app.api.crud.schema import create_table_from_schema
+from app.models.schema import TableSchema
+from app.schema_manager import SchemaManager
+
+SCHEMA = {
+    "name": "end_use_demand_hourly",
+    "title": "Hourly end-use demand",
+    "description": "This table contains the hourly end-use demand data.",
+    "valueField": {"field": "value", "unit": "MWh"},
+    "timeFields": [{"field": "datetime", "frequency": "hourly"}],
+    "locationFields": [{"field": "location", "locationType": "location"}],
+    "primaryKey": ["location", "datetime"],
+    "foreignKeys": [
+        {
+            "fields": "location",
+            "reference": {"resource": "table_0", "fields": "code"},
+        }
+    ],
+    "fields": [
+        {"name": "location", "type": "string", "constraints": {"required": True}},
+        {"name": "datetime", "type": "datetime", "constraints": {"required": True}},
+        {"name": "value", "type": "number", "constraints": {"minimum": 0}},
+    ],
+}
+
+
+def populate(session: Session, n_tables: int) -> None:
+    for i in range(n_tables):
+        reference = f", ref TEXT REFERENCES table_{i - 1}(code)" if i % 2 else ""
+        session.exec(
+            text(
+                f"CREATE TABLE table_{i} (id INTEGER PRIMARY KEY, "
+                f"code TEXT UNIQUE, value REAL{reference})"
+            )
+        )
+    session.commit()
+
+
+def before(session: Session, schema_manager: SchemaManager, name: str) -> None:
+    model_input = schema_manager.model_from_schema(
+        {**SCHEMA, "name": name}, validate_schema=True, create_id_column="id_"
+    )
+    metadata = MetaData()
+    metadata.reflect(bind=session.bind)  # type: ignore[arg-type]
+    Table(name, metadata, *model_input["columns"], *model_input["constraints"])
+    metadata.create_all(session.bind)  # type: ignore[arg-type]
+
+
+def after(session: Session, schema_manager: SchemaManager, name: str) -> None:
+    schema = TableSchema(
+        name=name, description="", jsonschema={**deepcopy(SCHEMA), "name": name}
+    )
+    with patch("app.api.crud.schema.read_schema", return_value=schema):
+        create_table_from_schema(
+            db=session, schema_manager=schema_manager, schema_id=1, id_column_name="id_"
+        )
+
+
+def main(sizes: tuple[int, ...] = (10, 100, 1000), number: int = 5) -> None:
+    schema_manager = SchemaManager()
+    for n_tables in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+            with Session(engine) as session:
+                populate(session, n_tables)
+                for name, func in [("before", before), ("after", after)]:
+                    timings = []
+                    for i in range(number):
+                        start = time.perf_counter()
+                        func(session, schema_manager, f"new_{name}_{chr(97 + i)}")
+                        timings.append(time.perf_counter() - start)
+                    print(
+                        f"{n_tables:>5} tables {name:>6}: "
+                        f"{min(timings) * 1000:9.3f} ms per table"
+                    )
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
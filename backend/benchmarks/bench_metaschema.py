@@ -0,0 +1,83 @@
+"""Benchmark the per-call latency of schema validation.
+
+"before" mimics the previous behaviour where every request created a new
+SchemaManager (reading and parsing the metaschema files) and validated with
+jsonschema.validate (checking the metaschema and building a new validator).
+"after" uses the process-wide compiled metaschema.
+
+The cold start measures the first instantiation of a SchemaManager in a
+process, i.e., with an empty metaschema registry, with and without the
+precomputed metaschema bundle.
+
+Run from the backend directory:
+    python -m benchmarks.bench_metaschema
+"""
+
+import tempfile
+import timeit
+from copy import deepcopy
+from pathlib import Path
+
+import jsonschema
+
+from app.schema_manager import SchemaManager
+from app.schema_manager.metaschema import metaschema_registry, write_bundle
+from app.schema_manager.schema_manager import BASE_SCHEMA, SWEET_EXTENSIONS
+
+SOURCES = [BASE_SCHEMA] + SWEET_EXTENSIONS
+
+SCHEMA = {
+    "name": "end_use_demand_hourly",
+    "title": "Hourly end-use demand",
+    "description": "This table contains the hourly end-use demand data.",
+    "valueField": {"field": "value", "unit": "MWh"},
+    "timeFields": [{"field": "datetime", "frequency": "hourly"}],
+    "locationFields": [{"field": "location", "locationType": "location"}],
+    "primaryKey": ["location", "datetime"],
+    "fields": [
+        {"name": "location", "type": "string", "constraints": {"required": True}},
+        {"name": "datetime", "type": "datetime", "constraints": {"required": True}},
+        {"name": "value", "type": "number", "constraints": {"minimum": 0}},
+    ],
+}
+
+
+def before() -> None:
+    metaschema = SchemaManager.combine_schemas(SOURCES)
+    jsonschema.validate(instance=deepcopy(SCHEMA), schema=metaschema)
+
+
+def after() -> None:
+    SchemaManager().validate_schema(deepcopy(SCHEMA))
+
+
+def cold_start(number: int = 10) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle = Path(tmp) / "bundle.json"
+        write_bundle(SOURCES, SchemaManager.combine_schemas, bundle)
+
+        def from_sources() -> None:
+            metaschema_registry.clear()
+            metaschema_registry.get(SOURCES, SchemaManager.combine_schemas)
+
+        def from_bundle() -> None:
+            metaschema_registry.clear()
+            metaschema_registry.get(SOURCES, SchemaManager.combine_schemas, bundle)
+
+        for name, func in [("sources", from_sources), ("bundle", from_bundle)]:
+            best = min(timeit.repeat(func, number=number, repeat=3)) / number
+            print(f"cold start from {name:>7}: {best * 1000:8.3f} ms")
+    metaschema_registry.clear()
+
+
+def main(number: int = 50) -> None:
+    # warm up the registry so that "after" measures the steady state
+    after()
+    for name, func in [("before", before), ("after", after)]:
+        best = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print(f"{name:>6}: {best * 1000:8.3f} ms per call")
+    cold_start()
+
+
+if __name__ == "__main__":
+    main()
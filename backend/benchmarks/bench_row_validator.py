@@ -0,0 +1,129 @@
+"""Benchmark the validation of data rows against a schema.
+
+"jsonschema" translates the fields of the schema to a JSON schema of a row and
+validates each row with a precompiled Draft7Validator. It only checks types
+and constraints, i.e., it does not parse dates. "compiled" is the row
+validator of SchemaManager.row_validator, which parses and checks the rows
+column by column.
+
+Both validate typed rows as read from NDJSON files. Additionally, the
+compiled validator is timed with rows as read from CSV files, i.e., with
+strings only.
+
+Run from the backend directory:
+    python -m benchmarks.bench_row_validator
+"""
+
+import random
+import time
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+from jsonschema import Draft7Validator
+
+from app.schema_manager import SchemaManager
+from app.schema_manager.validator import RowValidator
+
+SCHEMA = {
+    "name": "end_use_demand_hourly",
+    "title": "Hourly end-use demand",
+    "description": "This table contains the hourly end-use demand data.",
+    "valueField": {"field": "value", "unit": "MWh"},
+    "timeFields": [{"field": "datetime", "frequency": "hourly"}],
+    "locationFields": [{"field": "location", "locationType": "location"}],
+    "primaryKey": ["location", "datetime"],
+    "fields": [
+        {
+            "name": "location",
+            "type": "string",
+            "constraints": {"required": True, "enum": ["CH", "DE", "FR", "IT"]},
+        },
+        {"name": "datetime", "type": "datetime", "constraints": {"required": True}},
+        {"name": "sector", "type": "string", "constraints": {"pattern": "[a-z]+"}},
+        {"name": "year", "type": "integer", "constraints": {"minimum": 2000}},
+        {"name": "value", "type": "number", "constraints": {"minimum": 0}},
+    ],
+}
+
+JSON_TYPES = {"string": "string", "datetime": "string", "integer": "integer"}
+
+
+def row_schema(schema: dict[str, Any]) -> dict[str, Any]:
+    """JSON schema of a row with the types and constraints of the fields"""
+    properties: dict[str, Any] = {}
+    required = []
+    for field in schema["fields"]:
+        constraints = field.get("constraints", {})
+        prop: dict[str, Any] = {"type": JSON_TYPES.get(field["type"], "number")}
+        if field["type"] == "datetime":
+            prop["format"] = "date-time"
+        for key in ("enum", "pattern", "minimum", "maximum"):
+            if key in constraints:
+                prop[key] = constraints[key]
+        properties[field["name"]] = prop
+        if constraints.get("required"):
+            required.append(field["name"])
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": required,
+        "additionalProperties": False,
+    }
+
+
+def make_rows(n: int) -> list[dict[str, Any]]:
+    rng = random.Random(0)
+    return [
+        {
+            "location": rng.choice(["CH", "DE", "FR", "IT"]),
+            "datetime": f"2024-01-{i % 28 + 1:02d}T{i % 24:02d}:00:00",
+            "sector": rng.choice(["households", "industry", "services"]),
+            "year": 2024,
+            "value": rng.random() * 100,
+        }
+        for i in range(n)
+    ]
+
+
+def timeit(func: Callable[[], Any], number: int = 3) -> float:
+    timings = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def per_row(validator: Draft7Validator, rows: list[dict[str, Any]]) -> None:
+    for row in rows:
+        if not validator.is_valid(row):
+            raise ValueError(row)
+
+
+def batch(validator: RowValidator, rows: list[dict[str, Any]]) -> None:
+    _, report = validator.validate_rows(rows)
+    if not report.valid:
+        raise ValueError(report.messages())
+
+
+def main(sizes: tuple[int, ...] = (1_000, 10_000, 100_000)) -> None:
+    jsonschema_validator = Draft7Validator(row_schema(SCHEMA))
+    row_validator = SchemaManager.row_validator(SCHEMA)
+    for n_rows in sizes:
+        rows = make_rows(n_rows)
+        csv_rows = [{k: str(v) for k, v in row.items()} for row in rows]
+        for name, func in [
+            ("jsonschema", partial(per_row, jsonschema_validator, rows)),
+            ("compiled", partial(batch, row_validator, rows)),
+            ("compiled csv", partial(batch, row_validator, csv_rows)),
+        ]:
+            seconds = timeit(func)
+            print(
+                f"{n_rows:>7} rows {name:>12}: {seconds * 1000:9.1f} ms "
+                f"({n_rows / seconds:12,.0f} rows/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
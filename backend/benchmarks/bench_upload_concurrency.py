@@ -0,0 +1,129 @@
+"""Benchmark the latency of other requests during parallel schema uploads.
+
+While several clients upload large schemas, a single client polls
+GET /utils/health-check/. The p50/p99 latency of the health check is reported
+for the non-blocking upload pipeline ("async") and for the previous pipeline
+that validated and committed on the event loop ("blocking").
+
+Run from the backend directory:
+    python -m benchmarks.bench_upload_concurrency
+"""
+
+import asyncio
+import json
+import logging
+import statistics
+import tempfile
+import time
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import httpx
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.api.deps import get_db, is_admin_user
+from app.core.config import settings
+from app.core.workers import shutdown_process_pool
+from app.main import app
+from app.schema_manager import SchemaManager
+
+N_FIELDS = 300
+N_UPLOADERS = 8
+UPLOADS_PER_CLIENT = 4
+
+
+def big_schema(name: str) -> bytes:
+    fields = [
+        {
+            "name": f"field_{chr(97 + i // 26 % 26)}{chr(97 + i % 26)}",
+            "type": "number",
+            "title": f"Field {i}",
+            "description": "A numeric field",
+            "constraints": {"required": True, "minimum": 0},
+        }
+        for i in range(N_FIELDS)
+    ]
+    schema = {"name": name, "title": name, "description": name, "fields": fields}
+    return json.dumps(schema).encode()
+
+
+async def blocking_validate(
+    self: SchemaManager, schema: Any, file_format: Any = None, executor: Any = None
+) -> dict[str, Any]:
+    return self.validate_schema(self.read_schema_from_file(schema, file_format))
+
+
+async def blocking_threadpool(func: Any, *args: Any, **kwargs: Any) -> Any:
+    return func(*args, **kwargs)
+
+
+async def run(prefix: str) -> list[float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        url = f"{settings.API_V1_STR}/schema/"
+        health_url = f"{settings.API_V1_STR}/utils/health-check/"
+        latencies: list[float] = []
+        done = asyncio.Event()
+
+        async def upload(client_id: int) -> None:
+            for i in range(UPLOADS_PER_CLIENT):
+                name = f"{prefix}_{chr(97 + client_id)}_{chr(97 + i)}"
+                files = {"file": (f"{name}.json", big_schema(name))}
+                response = await c.post(url, files=files)
+                assert response.status_code == 201, response.text
+
+        async def poll() -> None:
+            while not done.is_set():
+                start = time.perf_counter()
+                await c.get(health_url)
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+
+        poller = asyncio.create_task(poll())
+        await asyncio.gather(*(upload(i) for i in range(N_UPLOADERS)))
+        done.set()
+        await poller
+        return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    ms = sorted(latency * 1000 for latency in latencies)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(
+        f"{name:>8}: health-check p50 {statistics.median(ms):8.2f} ms, "
+        f"p99 {p99:8.2f} ms, max {ms[-1]:8.2f} ms ({len(ms)} requests)"
+    )
+
+
+def main() -> None:
+    logging.getLogger("api_logger").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{Path(tmp) / 'bench.db'}",
+            connect_args={"check_same_thread": False},
+        )
+        SQLModel.metadata.create_all(engine)
+
+        def bench_db() -> Generator[Session, None, None]:
+            with Session(engine) as session:
+                yield session
+
+        app.dependency_overrides[get_db] = bench_db
+        app.dependency_overrides[is_admin_user] = lambda: None
+        # warm up the worker processes
+        asyncio.run(run("warmup"))
+
+        with (
+            patch.object(SchemaManager, "validate_schema_async", blocking_validate),
+            patch("app.api.routes.schema.run_in_threadpool", blocking_threadpool),
+        ):
+            report("blocking", asyncio.run(run("blocking")))
+        report("async", asyncio.run(run("async")))
+        app.dependency_overrides.clear()
+        shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import io
 import os
 import tempfile
 from collections.abc import Generator
@@ -32,12 +33,30 @@ def test_save_and_load(storage: LocalFileStorage):
     assert loaded_data == data
 
 
+def test_save_stream(storage: LocalFileStorage, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("app.filestorage.local_storage.COPY_BUFFER_SIZE", 4)
+    data = b"a,b\n" * 10
+    assert storage.save_stream("upload.csv", io.BytesIO(data)) == "upload.csv"
+    assert storage.load("upload.csv") == data
+    # no temporary files are left behind
+    assert storage.list() == ["upload.csv"]
+
+
 def test_load_not_found(storage: LocalFileStorage):
     key = "non_existent_file.txt"
     with pytest.raises(FileNotFoundError):
         storage.load(key)
 
 
+def test_load_stream(storage: LocalFileStorage):
+    storage.save("upload.csv", b"a,b\n1,2\n")
+    with storage.load_stream("upload.csv") as stream:
+        assert stream.readline() == b"a,b\n"
+        assert stream.read() == b"1,2\n"
+    with pytest.raises(FileNotFoundError):
+        storage.load_stream("missing.csv")
+
+
 def test_delete(storage: LocalFileStorage):
     key = "test_file.txt"
     data = b"Hello, World!"
@@ -1,7 +1,10 @@
+import io
+
 import boto3
 import pytest
 from moto import mock_aws
 
+from app.api.crud.data import read_rows
 from app.filestorage import S3FileStorage
 
 
@@ -34,6 +37,14 @@ def test_save_and_load(s3_storage: S3FileStorage):
     assert loaded_data == data
 
 
+def test_save_stream(s3_storage: S3FileStorage):
+    data = b"a,b\n" * 1000
+    assert s3_storage.save_stream("upload.csv", io.BytesIO(data)) == "upload.csv"
+    assert s3_storage.load("upload.csv") == data
+    with s3_storage.load_stream("upload.csv") as stream:
+        assert list(read_rows(stream, "csv"))[0] == {"a": "a", "b": "b"}
+
+
 def test_delete(s3_storage: S3FileStorage):
     key = "test_file.txt"
     data = b"Hello, World!"
@@ -19,3 +19,23 @@ sweet_valid = {
     "description": "test",
     "primaryKey": ["id"],
 }
+
+# time-series schema with time, location and value fields
+timeseries = {
+    "name": "generation",
+    "title": "Generation",
+    "description": "Hourly generation",
+    "valueField": {"field": "generation", "unit": "MWh"},
+    "timeFields": [
+        {"field": "year", "frequency": "yearly"},
+        {"field": "datetime", "frequency": "hourly"},
+    ],
+    "locationFields": [{"field": "country", "locationType": "country"}],
+    "primaryKey": ["country", "datetime"],
+    "fields": [
+        {"name": "year", "type": "integer"},
+        {"name": "datetime", "type": "datetime"},
+        {"name": "country", "type": "string"},
+        {"name": "generation", "type": "number"},
+    ],
+}
@@ -0,0 +1,203 @@
+from copy import deepcopy
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, inspect, text
+
+from app.api.crud.aggregate import (
+    find_rollup,
+    lock_rollups,
+    lttb,
+    parse_interval,
+    rollup_table,
+)
+from app.api.crud.data import ingest_rows
+from app.api.crud.schema import create_schema, create_table_from_schema
+from app.api.routes.schema import router as schema_router
+from app.core.config import settings
+from app.main import app
+from app.schema_manager import SchemaManager
+
+from .settings import timeseries
+
+client = TestClient(app)
+
+url_schema = f"{settings.API_V1_STR}{schema_router.prefix}"
+
+
+def test_parse_interval():
+    assert parse_interval("day") == (1, "day")
+    assert parse_interval("15 minutes") == (15, "minute")
+    for interval in ["2 months", "fortnight", "0 days"]:
+        with pytest.raises(ValueError):
+            parse_interval(interval)
+
+
+def test_lttb():
+    x = list(range(10))
+    y = [0, 1, 0, 9, 0, 1, 0, -9, 0, 1]
+    # the peaks are kept
+    assert lttb(x, y, 4) == [0, 3, 7, 9]
+    assert lttb(x, y, 20) == x
+    assert lttb(x, [*y[:3], None, *y[4:]], 4) == [0, 1, 7, 9]
+
+
+def test_aggregate_data(db: Session, schema_manager: SchemaManager) -> None:
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    data = [
+        {
+            "year": "2024",
+            "datetime": f"2024-01-0{day}T{h:02d}:00:00",
+            "country": country,
+            "generation": str(h * factor),
+        }
+        for country, factor in [("CH", 1), ("DE", 2)]
+        for day in (1, 2)
+        for h in range(24)
+    ]
+    ingest_rows(db=db, schema=timeseries, rows=data)
+    url = f"{url_schema}/{schema.id}/data/aggregate"
+
+    response = client.get(url, params={"interval": "day"})
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert (result["interval"], result["unit"]) == ("day", "MWh")
+    columns = result["columns"]
+    assert columns["country"] == ["CH", "CH", "DE", "DE"]
+    assert [datetime.fromisoformat(t).day for t in columns["datetime"]] == [1, 2] * 2
+    assert columns["min"] == [0, 0, 0, 0]
+    assert columns["max"] == [23, 23, 46, 46]
+    assert columns["mean"] == [11.5, 11.5, 23, 23]
+    assert columns["sum"] == [276, 276, 552, 552]
+    assert columns["count"] == [24] * 4
+    assert columns["last"] == [23, 23, 46, 46]
+
+    params = {
+        "interval": "6 hours",
+        "stats": ["last", "count"],
+        "country": "DE",
+        "end": "2024-01-02T00:00:00",
+    }
+    columns = client.get(url, params=params).json()["columns"]
+    assert list(columns) == ["country", "datetime", "last", "count"]
+    assert columns["last"] == [10, 22, 34, 46]
+    assert columns["count"] == [6] * 4
+    assert columns["datetime"][1].startswith("2024-01-01T06:00:00")
+
+    # the frequency of the time field is the default interval
+    columns = client.get(url, params={"points": 5}).json()["columns"]
+    assert len(columns["mean"]) == 10
+    assert columns["country"] == ["CH"] * 5 + ["DE"] * 5
+    assert (columns["mean"][0], columns["mean"][4]) == (0, 23)
+
+    for params in [
+        {"interval": "minute"},
+        {"interval": "1 decade"},
+        {"stats": "median"},
+        {"time_field": "year"},
+    ]:
+        response = client.get(url, params=params)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_rollups(db: Session, schema_manager: SchemaManager) -> None:
+    data = deepcopy(timeseries)
+    data["rollups"] = ["daily", "monthly"]
+    schema = create_schema(db=db, data=data, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    tables = inspect(db.get_bind()).get_table_names()
+    assert {"generation_rollup_day", "generation_rollup_month"} <= set(tables)
+    rows = [
+        {
+            "year": "2024",
+            "datetime": f"2024-01-0{day}T{h:02d}:00:00",
+            "country": country,
+            "generation": str(h * factor),
+        }
+        for country, factor in [("CH", 1), ("DE", 2)]
+        for day in (1, 2)
+        for h in range(24)
+    ]
+    # the chunks overlap the buckets of the rollups
+    ingest_rows(db=db, schema=data, rows=rows, chunk_size=10)
+    daily = db.exec(  # type: ignore[call-overload]
+        text(
+            "SELECT country, min, max, sum, count, last "
+            "FROM generation_rollup_day ORDER BY country, datetime"
+        )
+    ).all()
+    assert [tuple(r) for r in daily] == [
+        ("CH", 0, 23, 276, 24, 23),
+        ("CH", 0, 23, 276, 24, 23),
+        ("DE", 0, 46, 552, 24, 46),
+        ("DE", 0, 46, 552, 24, 46),
+    ]
+    # upserted values are maintained
+    changed = {**rows[0], "generation": "100"}
+    ingest_rows(db=db, schema=data, rows=[changed], mode="upsert")
+
+    assert find_rollup(db, data, 1, "year").name == "generation_rollup_month"
+    assert find_rollup(db, data, 1, "day").name == "generation_rollup_day"
+    assert find_rollup(db, data, 2, "day").name == "generation_rollup_day"
+    assert find_rollup(db, data, 6, "hour") is None
+    # ranges within a bucket of a rollup are aggregated from the table
+    assert find_rollup(db, data, 1, "day", start="2024-01-01T06:00") is None
+    assert find_rollup(db, data, 1, "month", start="2024-01-01").name == (
+        "generation_rollup_month"
+    )
+    assert find_rollup(db, data, 1, "month", start="2024-01-02").name == (
+        "generation_rollup_day"
+    )
+
+    url = f"{url_schema}/{schema.id}/data/aggregate"
+    columns = client.get(url, params={"interval": "day"}).json()["columns"]
+    assert columns["country"] == ["CH", "CH", "DE", "DE"]
+    assert [datetime.fromisoformat(t).day for t in columns["datetime"]] == [1, 2] * 2
+    assert columns["max"] == [100, 23, 46, 46]
+    assert columns["sum"] == [376, 276, 552, 552]
+    assert columns["count"] == [24] * 4
+    assert columns["mean"] == [376 / 24, 11.5, 23, 23]
+    assert columns["last"] == [23, 23, 46, 46]
+
+    params = {"interval": "month", "stats": ["last", "sum"], "country": "DE"}
+    columns = client.get(url, params=params).json()["columns"]
+    assert columns == {
+        "country": ["DE"],
+        "datetime": [columns["datetime"][0]],
+        "last": [46],
+        "sum": [1104],
+    }
+    assert columns["datetime"][0].startswith("2024-01-01T00:00:00")
+
+    for table in ["generation", "generation_rollup_day", "generation_rollup_month"]:
+        db.exec(text(f"DROP TABLE {table}"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_rollup_buckets_are_unique():
+    data = {**timeseries, "rollups": ["daily"]}
+    rollup = rollup_table(data, "day", "postgresql")
+    (index,) = rollup.indexes
+    assert index.unique
+    assert list(index.columns.keys()) == ["datetime", "country"]
+
+    db = MagicMock()
+    db.get_bind.return_value.dialect = postgresql.dialect()
+    lock_rollups(db, "generation")
+    (statement,) = db.connection.return_value.execute.call_args.args
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "pg_advisory_xact_lock(hashtext(" in sql
@@ -5,12 +5,16 @@ import pytest
 from sqlmodel import Session, SQLModel, inspect, text
 
 from app.api.crud.schema import (
+    SchemaCache,
     create_schema,
     create_table_from_schema,
+    create_tables_from_schemas,
     delete_schema,
     read_schema,
+    schema_cache,
     toggle_schema,
 )
+from app.core.invalidation import LocalInvalidationChannel
 from app.models.schema import TableSchema
 from app.schema_manager import SchemaManager
 
@@ -79,6 +83,64 @@ def test_read_schema_raise(db: Session) -> None:
         read_schema(db=db, schema_id=1, schema_name="test")
 
 
+def test_read_schema_cached(
+    data: bytes, db: Session, schema_manager: SchemaManager
+) -> None:
+    schema_cache.clear()
+    schema = create_schema(db=db, data=data, schema_manager=schema_manager)
+    with Session(db.get_bind()) as other:
+        read_schema(db=other, schema_id=schema.id)
+    assert schema_cache.info().misses == 1
+    with Session(db.get_bind()) as other:
+        by_id = read_schema(db=other, schema_id=schema.id)
+        by_name = read_schema(db=other, schema_name=schema.name)
+        assert by_id is by_name
+        assert by_id.jsonschema == sweet_valid
+    assert schema_cache.info().hits == 2
+
+    # changes via the crud functions invalidate the cache
+    assert toggle_schema(db=db, schema_id=schema.id)
+    with Session(db.get_bind()) as other:
+        assert read_schema(db=other, schema_name=schema.name).is_active
+    assert delete_schema(db=db, schema_id=schema.id)
+    with Session(db.get_bind()) as other, pytest.raises(ValueError):
+        read_schema(db=other, schema_id=schema.id)
+
+
+def test_read_schema_cache_invalidated_by_orm(
+    data: bytes, db: Session, schema_manager: SchemaManager
+) -> None:
+    schema = create_schema(db=db, data=data, schema_manager=schema_manager)
+    with Session(db.get_bind()) as other:
+        read_schema(db=other, schema_id=schema.id)
+    db.delete(schema)
+    db.commit()
+    with Session(db.get_bind()) as other, pytest.raises(ValueError):
+        read_schema(db=other, schema_id=schema.id)
+
+
+def test_schema_cache_channel(
+    data: bytes, db: Session, schema_manager: SchemaManager
+) -> None:
+    channel = LocalInvalidationChannel()
+    caches = [SchemaCache(), SchemaCache()]
+    for cache in caches:
+        cache.connect(channel)
+    schema = create_schema(db=db, data=data, schema_manager=schema_manager)
+    for cache in caches:
+        cache.get(db, schema_id=schema.id)
+        cache.get(db, schema_id=schema.id)
+        assert cache.info().currsize == 2
+
+    # an invalidation in one process reaches all others
+    caches[0].invalidate(schema_name=schema.name)
+    assert [cache.info().currsize for cache in caches] == [0, 0]
+    for cache in caches:
+        cache.disconnect()
+    db.delete(schema)
+    db.commit()
+
+
 def test_delete_schema_by_id(
     data: bytes, db: Session, schema_manager: SchemaManager
 ) -> None:
@@ -157,6 +219,43 @@ def test_create_table_from_schema(db: Session, schema_manager: SchemaManager) ->
     db.commit()
 
 
+def test_create_table_keeps_shared_metadata(
+    db: Session, schema_manager: SchemaManager
+) -> None:
+    tables = set(SQLModel.metadata.tables)
+    return_value = TableSchema(
+        name=sweet_valid["name"],
+        description=sweet_valid["description"],
+        jsonschema=sweet_valid,
+    )
+    with patch("app.api.crud.schema.read_schema", return_value=return_value):
+        create_table_from_schema(db=db, schema_id=1, schema_manager=schema_manager)
+    assert set(SQLModel.metadata.tables) == tables
+    db.exec(text(f"DROP TABLE {sweet_valid['name']}"))
+    db.commit()
+
+
+def test_create_table_from_schema_indexes(
+    db: Session, schema_manager: SchemaManager
+) -> None:
+    my_schema = deepcopy(sweet_valid)
+    my_schema["timeFields"] = [{"field": "id", "frequency": "hourly"}]
+    my_schema["locationFields"] = [{"field": "name", "locationType": "country"}]
+    return_value = TableSchema(
+        name=my_schema["name"],
+        description=my_schema["description"],
+        jsonschema=my_schema,
+    )
+    with patch("app.api.crud.schema.read_schema", return_value=return_value):
+        create_table_from_schema(db=db, schema_id=1, schema_manager=schema_manager)
+    indexes = inspect(db.bind).get_indexes(my_schema["name"])
+    assert {ix["name"]: ix["column_names"] for ix in indexes} == {
+        f"ix_{my_schema['name']}_name_id": ["name", "id"]
+    }
+    db.exec(text(f"DROP TABLE {my_schema['name']}"))
+    db.commit()
+
+
 def test_create_table_from_schema_fkey(
     db: Session, schema_manager: SchemaManager
 ) -> None:
@@ -622,3 +721,122 @@ def test_full_foreign_key(db: Session, schema_manager: SchemaManager):
         tab = metadata.tables[table_name]
         tab.drop(db.bind)
         db.commit()
+
+
+def _linked_schema(name: str, references: list[str]) -> dict:
+    """Schema of a table with foreign keys to the ids of other tables"""
+    schema = {
+        "name": name,
+        "title": name,
+        "description": f"Table {name}",
+        "primaryKey": ["id"],
+        "fields": [
+            {"name": "id", "type": "integer"},
+            *({"name": f"{ref}_id", "type": "integer"} for ref in references),
+        ],
+    }
+    if references:
+        schema["foreignKeys"] = [
+            {"fields": [f"{ref}_id"], "reference": {"resource": ref, "fields": ["id"]}}
+            for ref in references
+        ]
+    return schema
+
+
+def test_create_tables_from_schemas(db: Session, schema_manager: SchemaManager) -> None:
+    data = [
+        _linked_schema("reading", ["site", "region"]),
+        _linked_schema("site", ["region"]),
+        _linked_schema("meter", ["region"]),
+        _linked_schema("region", []),
+    ]
+    schemas = [
+        create_schema(db=db, data=d, schema_manager=schema_manager) for d in data
+    ]
+    levels = create_tables_from_schemas(
+        db=db, schema_manager=schema_manager, schema_ids=[s.id for s in schemas]
+    )
+    # referenced tables are created first
+    assert levels == [["region"], ["meter", "site"], ["reading"]]
+    tables = inspect(db.bind).get_table_names()
+    assert {"region", "site", "meter", "reading"} <= set(tables)
+    foreign_keys = inspect(db.bind).get_foreign_keys("reading")
+    assert {fk["referred_table"] for fk in foreign_keys} == {"site", "region"}
+
+    # existing tables are referenced
+    extra = create_schema(
+        db=db, data=_linked_schema("device", ["meter"]), schema_manager=schema_manager
+    )
+    assert create_tables_from_schemas(
+        db=db, schema_manager=schema_manager, schema_ids=[extra.id]
+    ) == [["device"]]
+    with pytest.raises(ValueError, match="already exists"):
+        create_tables_from_schemas(
+            db=db, schema_manager=schema_manager, schema_ids=[extra.id]
+        )
+
+    for table_name in ["device", "reading", "meter", "site", "region"]:
+        db.exec(text(f"DROP TABLE {table_name}"))
+    for schema in [*schemas, extra]:
+        db.delete(schema)
+    db.commit()
+
+
+def test_create_tables_from_schemas_raises(
+    db: Session, schema_manager: SchemaManager
+) -> None:
+    data = [
+        _linked_schema("first", ["second"]),
+        _linked_schema("second", ["third"]),
+        _linked_schema("third", ["first"]),
+        _linked_schema("orphan", ["missing"]),
+    ]
+    schemas = [
+        create_schema(db=db, data=d, schema_manager=schema_manager) for d in data
+    ]
+    ids = [s.id for s in schemas]
+    with pytest.raises(ValueError, match="cycle"):
+        create_tables_from_schemas(
+            db=db, schema_manager=schema_manager, schema_ids=ids[:3]
+        )
+    with pytest.raises(ValueError, match="missing"):
+        create_tables_from_schemas(
+            db=db, schema_manager=schema_manager, schema_ids=ids[3:]
+        )
+    # no table is created if any fails
+    with pytest.raises(ValueError):
+        create_tables_from_schemas(
+            db=db, schema_manager=schema_manager, schema_ids=[ids[0], ids[3]]
+        )
+    tables = set(inspect(db.bind).get_table_names())
+    assert not tables & {"first", "second", "third", "orphan"}
+
+    for schema in schemas:
+        db.delete(schema)
+    db.commit()
+
+
+def test_create_tables_from_schemas_rolls_back(
+    db: Session, schema_manager: SchemaManager
+) -> None:
+    data = [_linked_schema("site", ["region"]), _linked_schema("region", [])]
+    schemas = [
+        create_schema(db=db, data=d, schema_manager=schema_manager) for d in data
+    ]
+    # the creation fails after the first table was created
+    with (
+        patch(
+            "app.api.crud.schema.create_rollups",
+            side_effect=[None, RuntimeError("failed")],
+        ),
+        pytest.raises(ValueError, match="Could not create table"),
+    ):
+        create_tables_from_schemas(
+            db=db, schema_manager=schema_manager, schema_ids=[s.id for s in schemas]
+        )
+    tables = set(inspect(db.bind).get_table_names())
+    assert not tables & {"site", "region"}
+
+    for schema in schemas:
+        db.delete(schema)
+    db.commit()
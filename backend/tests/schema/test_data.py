@@ -0,0 +1,312 @@
+import io
+import json
+from copy import deepcopy
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, text
+
+from app.api.crud.data import (
+    DataValidationError,
+    chunked,
+    copy_rows,
+    detect_data_format,
+    has_unique_key,
+    ingest_rows,
+    merge_stage,
+    read_rows,
+)
+from app.api.crud.schema import create_schema, create_table_from_schema
+from app.api.routes.schema import router as schema_router
+from app.core.config import settings
+from app.main import app
+from app.schema_manager import SchemaManager
+
+from .settings import timeseries
+
+client = TestClient(app)
+
+url_schema = f"{settings.API_V1_STR}{schema_router.prefix}"
+
+rows = [
+    {"year": "2024", "datetime": "2024-01-01T00:00:00", "country": "CH"},
+    {"year": "2024", "datetime": "2024-01-01T01:00:00", "country": "CH"},
+]
+
+
+def test_detect_data_format():
+    assert detect_data_format("data.CSV") == "csv"
+    assert detect_data_format("data.jsonl") == "ndjson"
+    assert detect_data_format("upload", "application/x-ndjson") == "ndjson"
+    with pytest.raises(ValueError):
+        detect_data_format("data.xlsx")
+
+
+def test_read_rows():
+    content = b"\xef\xbb\xbfa,b\n1,x\n2,\n"
+    assert list(read_rows(io.BytesIO(content), "csv")) == [
+        {"a": "1", "b": "x"},
+        {"a": "2", "b": ""},
+    ]
+    content = b'{"a": 1}\n\n{"a": null}\n'
+    assert list(read_rows(io.BytesIO(content), "ndjson")) == [{"a": 1}, {"a": None}]
+    with pytest.raises(DataValidationError, match="Row 2"):
+        list(read_rows(io.BytesIO(b'{"a": 1}\n[1]\n'), "ndjson"))
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+def test_copy_rows():
+    db = MagicMock()
+    db.bind.dialect = postgresql.dialect()
+    cursor = db.connection.return_value.connection.cursor.return_value
+    copied = []
+    cursor.copy_expert.side_effect = lambda sql, f: copied.append((sql, f.read()))
+
+    rows = [(datetime(2024, 1, 1), "", 1.5), (None, None, None)]
+    copy_rows(db, "generation", ["datetime", "country", "generation"], rows)
+    sql, content = copied[0]
+    assert sql == (
+        "COPY generation (datetime, country, generation) FROM STDIN WITH (FORMAT csv)"
+    )
+    # empty strings are quoted to tell them apart from nulls
+    assert content == '"2024-01-01 00:00:00","","1.5"\n,,\n'
+
+
+def test_ingest_data(
+    db: Session, schema_manager: SchemaManager, admin_token_header: dict[str, str]
+) -> None:
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    url = f"{url_schema}/{schema.id}/data"
+
+    content = "year,datetime,country,generation\n" + "".join(
+        f"2024,2024-01-01T{h:02d}:00:00,CH,{h}.5\n" for h in range(5)
+    )
+    files = {"file": ("data.csv", content.encode())}
+    response = client.post(
+        url, files=files, params={"chunk_size": 2}, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {
+        "table": "generation",
+        "rows": 5,
+        "chunks": 3,
+        "inserted": 5,
+        "updated": 0,
+        "unchanged": 0,
+    }
+
+    content = "\n".join(
+        json.dumps({**row, "country": "DE", "generation": 1}) for row in rows
+    )
+    files = {"file": ("data.ndjson", content.encode())}
+    response = client.post(url, files=files, headers=admin_token_header)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["rows"] == 2
+
+    # nothing is loaded if a row is invalid
+    invalid = deepcopy(rows)
+    invalid[1]["country"] = ""
+    content = "\n".join(json.dumps(row) for row in invalid)
+    files = {"file": ("data.ndjson", content.encode())}
+    response = client.post(url, files=files, headers=admin_token_header)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == ["country: value is required (row 2)"]
+
+    count = db.exec(text("SELECT COUNT(*) FROM generation")).one()[0]
+    assert count == 7
+
+    files = {"file": ("data.xlsx", b"x")}
+    response = client.post(url, files=files, headers=admin_token_header)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    files = {"file": ("data.csv", content.encode())}
+    response = client.post(
+        f"{url_schema}/1234234/data", files=files, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_merge_stage_postgresql():
+    db = MagicMock()
+    db.bind.dialect = postgresql.dialect()
+    db.exec.return_value.one.side_effect = [(10,), (4, 3)]
+
+    counts = merge_stage(
+        db,
+        "generation",
+        "stage_generation",
+        ["country", "datetime", "value"],
+        ["country", "datetime"],
+    )
+    assert counts == {"inserted": 4, "updated": 3, "unchanged": 3}
+    merge = str(db.exec.call_args_list[1].args[0])
+    assert (
+        "INSERT INTO generation (country, datetime, value) "
+        "SELECT country, datetime, value FROM stage_generation "
+        "ON CONFLICT (country, datetime) DO UPDATE SET value = excluded.value "
+        "WHERE (generation.value) IS DISTINCT FROM (excluded.value) "
+        "RETURNING xmax = 0 AS inserted"
+    ) in merge
+
+
+def test_ingest_upsert(db: Session, schema_manager: SchemaManager) -> None:
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    day = [{**row, "generation": "1"} for row in rows]
+    counts = ingest_rows(db=db, schema=timeseries, rows=day, mode="upsert")
+    assert counts["inserted"] == 2
+
+    # a re-delivered file with one changed, one unchanged and one new row,
+    # the changed row is delivered twice
+    redelivered = deepcopy(day) + [
+        {**rows[0], "generation": "5"},
+        {**rows[0], "country": "DE", "generation": "2"},
+    ]
+    redelivered[0]["generation"] = "3"
+    counts = ingest_rows(
+        db=db, schema=timeseries, rows=redelivered, mode="upsert", chunk_size=2
+    )
+    assert counts == {
+        "rows": 4,
+        "chunks": 2,
+        "inserted": 1,
+        "updated": 2,
+        "unchanged": 1,
+    }
+    stored = db.exec(
+        text("SELECT country, generation FROM generation ORDER BY id_")
+    ).all()
+    assert [tuple(r) for r in stored] == [("CH", 5.0), ("CH", 1.0), ("DE", 2.0)]
+
+    # appending duplicates fails on the unique key
+    with pytest.raises(IntegrityError):
+        ingest_rows(db=db, schema=timeseries, rows=day)
+    keyless = {**timeseries, "primaryKey": None, "valueField": None}
+    with pytest.raises(ValueError):
+        ingest_rows(db=db, schema=keyless, rows=day, mode="upsert")
+
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_ingest_upsert_without_unique_key(db: Session) -> None:
+    # a table created before the key was derived from the value field
+    db.exec(
+        text(
+            "CREATE TABLE generation (id_ INTEGER PRIMARY KEY, year INTEGER, "
+            "datetime DATETIME, country TEXT, generation FLOAT)"
+        )
+    )
+    assert not has_unique_key(db, "generation", ["country", "datetime"])
+    day = [{**row, "generation": "1"} for row in rows]
+    with pytest.raises(ValueError, match="no unique constraint on its key"):
+        ingest_rows(db=db, schema=timeseries, rows=day, mode="upsert")
+
+    db.exec(text("CREATE UNIQUE INDEX unique_key ON generation (datetime, country)"))
+    assert has_unique_key(db, "generation", ["country", "datetime"])
+    assert (
+        ingest_rows(db=db, schema=timeseries, rows=day, mode="upsert")["inserted"] == 2
+    )
+    db.exec(text("DROP TABLE generation"))
+    db.commit()
+
+
+def test_ingest_creates_partitions(db: Session, schema_manager: SchemaManager) -> None:
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    data = [
+        {**rows[0], "datetime": f"2024-{m:02d}-01T00:00:00", "generation": "1"}
+        for m in (1, 2, 3)
+    ]
+    # sqlite has no partitions, the partitioning of the table is patched
+    with (
+        patch("app.api.crud.data.partition_interval", return_value="month"),
+        patch("app.api.crud.data.ensure_partitions") as ensure,
+    ):
+        ingest_rows(db=db, schema=timeseries, rows=data, chunk_size=2)
+    # the partitions of each chunk are ensured before the chunk is loaded
+    assert [(c.args[1:3], list(c.args[3])) for c in ensure.call_args_list] == [
+        (("generation", "month"), [datetime(2024, 1, 1), datetime(2024, 2, 1)]),
+        (("generation", "month"), [datetime(2024, 3, 1)]),
+    ]
+    # the known partitions are shared by all chunks
+    known = {id(c.kwargs["known"]) for c in ensure.call_args_list}
+    assert len(known) == 1
+
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_read_data(db: Session, schema_manager: SchemaManager) -> None:
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    url = f"{url_schema}/{schema.id}/data"
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    data = [
+        {**row, "datetime": f"2024-01-01T{h:02d}:00:00", "generation": str(h)}
+        for h in range(6)
+        for row in [{**rows[0], "country": "CH"}, {**rows[0], "country": "DE"}]
+    ]
+    ingest_rows(db=db, schema=timeseries, rows=data)
+
+    params = {"fields": ["country", "generation"], "limit": 3}
+    response = client.get(url, params=params)
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    assert page["fields"] == ["id_", "country", "generation"]
+    assert page["rows"][0] == {"id_": 1, "country": "CH", "generation": 0.0}
+    ids = [row["id_"] for row in page["rows"]]
+    while page["next_after"] is not None:
+        page = client.get(url, params={**params, "after": page["next_after"]}).json()
+        ids += [row["id_"] for row in page["rows"]]
+    assert ids == list(range(1, 13))
+
+    params = {
+        "country": "DE",
+        "start": "2024-01-01T02:00:00",
+        "end": "2024-01-01T04:00:00",
+    }
+    page = client.get(url, params=params).json()
+    assert [(r["country"], r["generation"]) for r in page["rows"]] == [
+        ("DE", 2.0),
+        ("DE", 3.0),
+    ]
+    assert page["next_after"] is None
+    page = client.get(url, params={"country": ["CH", "DE"], "limit": 20}).json()
+    assert len(page["rows"]) == 12
+
+    for params in [
+        {"fields": "unknown"},
+        {"start": "yesterday"},
+        {"start": "2024-01-01", "time_field": "country"},
+    ]:
+        response = client.get(url, params=params)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
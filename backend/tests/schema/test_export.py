@@ -0,0 +1,130 @@
+import gzip
+import io
+import json
+import sys
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlmodel import Session, text
+
+from app.api.crud.data import ingest_rows, read_rows
+from app.api.crud.export import compress, export_columns, fetch_batches
+from app.api.crud.query import select_rows
+from app.api.crud.schema import create_schema, create_table_from_schema
+from app.api.routes.schema import router as schema_router
+from app.core.config import settings
+from app.main import app
+from app.models.schema import TableSchema
+from app.schema_manager import SchemaManager
+
+from ..conftest import test_engine
+from .settings import timeseries
+
+client = TestClient(app)
+
+url_schema = f"{settings.API_V1_STR}{schema_router.prefix}"
+
+
+@pytest.fixture
+def generation(db: Session, schema_manager: SchemaManager):
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    data = [
+        {
+            "year": "2024",
+            "datetime": f"2024-01-01T{h:02d}:00:00",
+            "country": "CH",
+            "generation": str(h),
+        }
+        for h in range(5)
+    ]
+    ingest_rows(db=db, schema=timeseries, rows=data)
+    yield schema
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_fetch_batches(db: Session, generation: TableSchema) -> None:
+    query = select_rows(db=db, schema=timeseries, fields=["generation"])
+    batches = list(fetch_batches(test_engine, export_columns(query), batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [tuple(row) for row in batches[0]] == [(1, 0.0), (2, 1.0)]
+
+
+def test_export_without_pyarrow(generation: TableSchema, monkeypatch) -> None:
+    # a module set to None cannot be imported
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    response = client.get(f"{url_schema}/{generation.id}/data/export")
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+    assert "pyarrow" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("data_format", ["arrow", "parquet"])
+def test_export_arrow(generation: TableSchema, data_format: str) -> None:
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    url = f"{url_schema}/{generation.id}/data/export"
+    params = {"format": data_format, "fields": ["datetime", "generation"]}
+    response = client.get(url, params=params)
+    assert response.status_code == status.HTTP_200_OK
+    if data_format == "parquet":
+        result = pq.read_table(io.BytesIO(response.content))
+    else:
+        result = pa.ipc.open_stream(response.content).read_all()
+    assert result.column_names == ["id_", "datetime", "generation"]
+    assert result.schema.field("datetime").type == pa.timestamp("us")
+    assert result.column("generation").to_pylist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    response = client.get(url, params={"format": data_format, "fields": "unknown"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_export_text(generation: TableSchema) -> None:
+    url = f"{url_schema}/{generation.id}/data/export"
+    response = client.get(url, params={"format": "ndjson", "country": "CH"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.content.decode().splitlines()
+    assert json.loads(lines[0]) == {
+        "id_": 1,
+        "year": 2024,
+        "datetime": "2024-01-01T00:00:00",
+        "country": "CH",
+        "generation": 0.0,
+    }
+    assert len(lines) == 5
+
+    params = {"format": "csv", "compression": "gzip", "end": "2024-01-01T02:00"}
+    response = client.get(url, params=params)
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="generation.csv.gz"' in response.headers["content-disposition"]
+    content = gzip.decompress(response.content)
+    # exported files are read like uploads
+    assert list(read_rows(io.BytesIO(content), "csv")) == [
+        {
+            "id_": str(h),
+            "year": "2024",
+            "datetime": f"2024-01-01T0{h - 1}:00:00",
+            "country": "CH",
+            "generation": f"{h - 1}.0",
+        }
+        for h in (1, 2)
+    ]
+
+
+def test_compress():
+    parts = [b"a" * 100, b"b" * 100]
+    assert list(compress(parts)) == parts
+    assert gzip.decompress(b"".join(compress(parts, "gzip"))) == b"".join(parts)
+    try:
+        compressed = b"".join(compress(parts, "zstd"))
+    except ImportError:
+        pytest.skip("zstd is not available")
+    zstandard = pytest.importorskip("zstandard")
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(compressed) == (
+        b"".join(parts)
+    )
@@ -0,0 +1,194 @@
+import io
+import json
+import threading
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlmodel import Session, text
+
+from app.api.crud.job import (
+    claim_job,
+    create_job,
+    requeue_expired_jobs,
+    run_job,
+    start_workers,
+    work,
+)
+from app.api.crud.schema import create_schema, create_table_from_schema
+from app.api.deps import get_data_storage
+from app.api.routes.job import router as job_router
+from app.core.config import settings
+from app.filestorage import LocalFileStorage
+from app.main import app
+from app.models.job import IngestionJob
+from app.schema_manager import SchemaManager
+
+from ..conftest import test_engine
+from .settings import timeseries
+
+client = TestClient(app)
+
+url_jobs = f"{settings.API_V1_STR}{job_router.prefix}"
+
+
+def test_ingestion_job(
+    db: Session,
+    schema_manager: SchemaManager,
+    admin_token_header: dict[str, str],
+    tmp_path: Path,
+) -> None:
+    storage = LocalFileStorage(str(tmp_path))
+    app.dependency_overrides[get_data_storage] = lambda: storage
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+
+    content = "year,datetime,country,generation\n" + "".join(
+        f"2024,2024-01-01T{h:02d}:00:00,CH,{h}.5\n" for h in range(5)
+    )
+    response = client.post(
+        f"{url_jobs}/",
+        params={"schema_id": schema.id, "chunk_size": 2},
+        files={"file": ("data.csv", content.encode())},
+        headers=admin_token_header,
+    )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job = response.json()
+    assert job["status"] == "queued"
+    assert "file_key" not in job
+    assert len(storage.list()) == 1
+
+    invalid = {"year": "2024", "datetime": "2024-01-01T00:00:00", "country": ""}
+    response = client.post(
+        f"{url_jobs}/",
+        params={"schema_id": schema.id},
+        files={"file": ("data.ndjson", json.dumps(invalid).encode())},
+        headers=admin_token_header,
+    )
+    failing = response.json()
+
+    assert work(test_engine, storage, max_jobs=10) == 2
+    with Session(test_engine) as session:
+        assert claim_job(db=session, worker="test") is None
+
+    response = client.get(f"{url_jobs}/{job['id']}", headers=admin_token_header)
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["status"] == "succeeded"
+    assert (result["rows"], result["chunks"], result["inserted"]) == (5, 3, 5)
+    assert result["started_at"] is not None and result["finished_at"] is not None
+    count = db.exec(text("SELECT COUNT(*) FROM generation")).one()[0]
+    assert count == 5
+
+    response = client.get(f"{url_jobs}/{failing['id']}", headers=admin_token_header)
+    result = response.json()
+    assert result["status"] == "failed"
+    assert result["errors"] == ["country: value is required (row 1)"]
+    # the file of a failed job is kept
+    assert len(storage.list()) == 1
+
+    response = client.get(
+        f"{url_jobs}/", params={"status": "failed"}, headers=admin_token_header
+    )
+    assert [j["id"] for j in response.json()] == [failing["id"]]
+    response = client.get(f"{url_jobs}/1234234", headers=admin_token_header)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = client.post(
+        f"{url_jobs}/",
+        params={"schema_id": 1234234},
+        files={"file": ("data.csv", content.encode())},
+        headers=admin_token_header,
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    del app.dependency_overrides[get_data_storage]
+    db.exec(text("DROP TABLE generation"))
+    db.exec(text("DELETE FROM ingestionjob"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_requeue_expired_jobs(db: Session, schema_manager: SchemaManager) -> None:
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    now = datetime.now(UTC)
+    expired = now - timedelta(minutes=10)
+    jobs = [
+        IngestionJob(
+            schema_id=schema.id,
+            file_key=f"ingest_{i}.csv",
+            data_format="csv",
+            status="running",
+            worker="lost",
+            attempts=attempts,
+            started_at=expired,
+            heartbeat_at=heartbeat_at,
+            rows=10,
+        )
+        for i, (attempts, heartbeat_at) in enumerate(
+            [(1, expired), (3, expired), (1, now)]
+        )
+    ]
+    db.add_all(jobs)
+    db.commit()
+
+    reaped = requeue_expired_jobs(db=db, lease=60, max_attempts=3)
+    assert reaped == {"requeued": 1, "failed": 1}
+    for job in jobs:
+        db.refresh(job)
+    requeued, failed, alive = jobs
+    assert (requeued.status, requeued.worker, requeued.rows) == ("queued", None, 0)
+    assert failed.status == "failed"
+    assert failed.errors == ["The worker was lost 3 times"]
+    assert alive.status == "running"
+
+    db.exec(text("DELETE FROM ingestionjob"))
+    db.delete(schema)
+    db.commit()
+
+
+def test_interrupted_job(
+    db: Session, schema_manager: SchemaManager, tmp_path: Path
+) -> None:
+    storage = LocalFileStorage(str(tmp_path))
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    content = "year,datetime,country,generation\n" + "".join(
+        f"2024,2024-01-01T{h:02d}:00:00,CH,{h}.5\n" for h in range(5)
+    )
+    job = create_job(
+        db=db,
+        storage=storage,
+        schema_id=schema.id,
+        file=io.BytesIO(content.encode()),
+        data_format="csv",
+        chunk_size=2,
+    )
+    with Session(test_engine) as session:
+        claimed = claim_job(db=session, worker="test")
+    assert claimed is not None and claimed.attempts == 1
+
+    # the job is stopped after its first chunk and queued again
+    stop = threading.Event()
+    stop.set()
+    status = run_job(engine=test_engine, storage=storage, job=claimed, stop=stop)
+    assert status == "queued"
+    db.refresh(job)
+    assert (job.status, job.worker, job.attempts, job.rows) == ("queued", None, 0, 0)
+    assert db.exec(text("SELECT COUNT(*) FROM generation")).one()[0] == 0
+    assert storage.exists(job.file_key)
+
+    # stopped workers finish their loop
+    db.exec(text("DELETE FROM ingestionjob"))
+    db.commit()
+    workers = start_workers(test_engine, storage, 2)
+    assert workers.stop(timeout=5)
+    assert not any(thread.is_alive() for thread in workers.threads)
+
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
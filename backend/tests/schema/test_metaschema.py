@@ -1,14 +1,26 @@
 import json
 from copy import deepcopy
+from datetime import date, datetime
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 import yaml
 from jsonschema.exceptions import ValidationError
 
-from app.schema_manager import SchemaManager
+from app.schema_manager import SchemaManager, SchemaReferenceError
+from app.schema_manager.cache import LRUCache
+from app.schema_manager.metaschema import (
+    CompiledMetaschema,
+    MetaschemaRegistry,
+    compile_metaschema,
+    fingerprint,
+    load_bundle,
+    write_bundle,
+)
+from app.schema_manager.schema_manager import BASE_SCHEMA, SWEET_EXTENSIONS
 
-from .settings import fl_invalid, fl_valid, sweet_valid
+from .settings import fl_invalid, fl_valid, sweet_valid, timeseries
 
 
 def test_read_schema_json():
@@ -56,6 +68,56 @@ def test_read_schema_bytes_yaml_exception():
         SchemaManager.read_schema_from_file(json_bytes_invalid)
 
 
+@pytest.mark.parametrize(
+    "content, file_format",
+    [
+        (b'{"key": "value"}', None),
+        (b'\n  {"key": "value"}', None),
+        (b'{"key": "value"}', "json"),
+        (b'{"key": "value"}', "yaml"),
+        (b"key: value", None),
+        (b"key: value", "json"),
+        (b"{'key': 'value'}", None),
+    ],
+)
+def test_read_schema_bytes_format(content: bytes, file_format: str | None):
+    """Content is parsed regardless of the format hint"""
+    result = SchemaManager.read_schema_from_file(content, file_format)
+    assert result == {"key": "value"}
+
+
+def test_read_schema_bytes_json_parsed_once():
+    """Json content is not parsed by the yaml parser"""
+    with patch("app.schema_manager.schema_manager.yaml.load") as yaml_load:
+        assert SchemaManager.read_schema_from_file(b'{"key": "value"}') == {
+            "key": "value"
+        }
+        yaml_load.assert_not_called()
+    with patch("app.schema_manager.schema_manager.json.loads") as json_loads:
+        json_loads.side_effect = ValueError
+        assert SchemaManager.read_schema_from_file(b"key: value", "yaml") == {
+            "key": "value"
+        }
+        json_loads.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "filename, content_type, expected",
+    [
+        ("schema.json", None, "json"),
+        ("schema.YAML", None, "yaml"),
+        ("schema.yml", "application/json", "yaml"),
+        (None, "application/json; charset=utf-8", "json"),
+        ("schema", "application/schema+json", "json"),
+        ("schema", "application/x-yaml", "yaml"),
+        ("schema.txt", "text/plain", None),
+        (None, None, None),
+    ],
+)
+def test_detect_format(filename, content_type, expected):
+    assert SchemaManager.detect_format(filename, content_type) == expected
+
+
 def test_read_schema_invalid():
     fn = Path("tmp.txt")
     with open(fn, "w") as f:
@@ -220,3 +282,304 @@ def test_sweet_extensions_foreign_key_raises():
     ]
     with pytest.raises(ValueError):
         my_manager.validate_schema(schema)
+
+
+def test_compiled_metaschema_is_shared():
+    """The metaschema is only compiled once per set of metaschema files"""
+    assert SchemaManager()._compiled is SchemaManager()._compiled
+    assert (
+        SchemaManager(metaschema_extensions=[])._compiled
+        is not SchemaManager()._compiled
+    )
+
+
+def test_compiled_metaschema_from_dict():
+    """Metaschemas given as dictionaries are registered by content"""
+    base = {"type": "object", "required": ["name"]}
+    manager = SchemaManager(metaschema_base=base, metaschema_extensions=[])
+    assert manager._compiled is SchemaManager(base, [])._compiled
+    assert manager.validate_schema({"name": "test"}) == {"name": "test"}
+    with pytest.raises(ValidationError):
+        manager.validate_schema({"title": "test"})
+    # local references are resolved when the validator is compiled
+    assert "$ref" not in json.dumps(manager._compiled.validator.schema)
+
+
+def test_metaschema_bundle(tmp_path: Path):
+    """The bundle is used as long as the metaschema sources do not change"""
+    extension = tmp_path / "extension.yaml"
+    extension.write_text("required: [name]\n")
+    sources = [BASE_SCHEMA, extension]
+    bundle = tmp_path / "bundle.json"
+
+    fp = write_bundle(sources, SchemaManager.combine_schemas, bundle)
+    assert fp == fingerprint(sources)
+    compiled = load_bundle(bundle, fp)
+    assert compiled is not None
+    assert compiled.fingerprint == fp
+    with pytest.raises(ValidationError):
+        compiled.validate(fl_valid)
+    compiled.validate({**fl_valid, "name": "test"})
+
+    # changing a source invalidates the bundle
+    extension.write_text("required: [title]\n")
+    assert fingerprint(sources) != fp
+    assert load_bundle(bundle, fingerprint(sources)) is None
+    # missing or broken bundles are ignored
+    assert load_bundle(tmp_path / "missing.json", fp) is None
+    bundle.write_text("no json")
+    assert load_bundle(bundle, fp) is None
+
+
+def test_metaschema_registry_bundle(tmp_path: Path):
+    """The registry builds the bundle if it is missing or outdated"""
+    bundle = tmp_path / "bundle.json"
+    registry = MetaschemaRegistry()
+    sources = [BASE_SCHEMA] + SWEET_EXTENSIONS
+    compiled = registry.get(sources, SchemaManager.combine_schemas, bundle)
+    assert bundle.exists()
+    assert compiled.fingerprint == fingerprint(sources)
+    assert registry.get(sources, SchemaManager.combine_schemas, bundle) is compiled
+    assert len(registry) == 1
+
+    # a fresh registry loads the bundle without combining the sources
+    registry.clear()
+    with patch.object(SchemaManager, "combine_schemas") as combine:
+        compiled = registry.get(sources, combine, bundle)
+        combine.assert_not_called()
+    compiled.validate(sweet_valid)
+
+
+def test_compile_metaschema_recursive_refs():
+    schema = {
+        "definitions": {
+            "node": {
+                "type": "object",
+                "properties": {
+                    "children": {
+                        "type": "array",
+                        "items": {"$ref": "#/definitions/node"},
+                    }
+                },
+            },
+        },
+        "type": "object",
+        "properties": {"tree": {"$ref": "#/definitions/node"}},
+    }
+    compiled = compile_metaschema(schema)
+    # the recursive reference is resolved against the kept definitions
+    assert "definitions" in compiled.validator.schema
+    compiled.validate({"tree": {"children": [{"children": []}]}})
+    with pytest.raises(ValidationError):
+        compiled.validate({"tree": {"children": [{"children": "invalid"}]}})
+    # without recursion, all references are inlined
+    del schema["definitions"]["node"]["properties"]
+    assert "definitions" not in compile_metaschema(schema).validator.schema
+
+
+def test_validation_cache():
+    """Valid schemas are only validated once"""
+    SchemaManager.clear_validation_cache()
+    manager = SchemaManager()
+    schema = deepcopy(sweet_valid)
+    schema["primaryKey"] = "id"
+
+    with patch.object(CompiledMetaschema, "validate", autospec=True) as validate:
+        assert manager.validate_schema(schema) == schema
+        # same content in a different key order is a cache hit
+        reordered = dict(reversed(list(deepcopy(schema).items())))
+        assert manager.validate_schema(reordered) == reordered
+        assert SchemaManager().validate_schema(deepcopy(schema)) == schema
+        assert validate.call_count == 1
+    info = SchemaManager.validation_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (2, 1, 1)
+
+    # invalid schemas are not cached
+    schema["primaryKey"] = "invalid"
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            manager.validate_schema(schema)
+    assert SchemaManager.validation_cache_info().currsize == 1
+
+    # the cache is specific to the metaschema
+    schema = deepcopy(fl_valid)
+    with pytest.raises(ValidationError):
+        manager.validate_schema(schema)
+    assert SchemaManager(metaschema_extensions=[]).validate_schema(schema) == schema
+    with pytest.raises(ValidationError):
+        manager.validate_schema(schema)
+    SchemaManager.clear_validation_cache()
+
+
+def test_schema_hash_typed_values():
+    schema = deepcopy(sweet_valid)
+    schema["fields"][0]["example"] = "2020-01-01"
+    string_hash = SchemaManager.schema_hash(schema)
+    schema["fields"][0]["example"] = date(2020, 1, 1)
+    date_hash = SchemaManager.schema_hash(schema)
+    # e.g., YAML reads unquoted dates as dates
+    assert date_hash != string_hash
+    assert date_hash == SchemaManager.schema_hash(deepcopy(schema))
+    schema["fields"][0]["example"] = datetime(2020, 1, 1)
+    assert SchemaManager.schema_hash(schema) not in (string_hash, date_hash)
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    # "b" is the least recently used entry
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.pop("a") == 1
+    assert len(cache) == 1
+    assert cache.info() == (1, 1, 2, 1)
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
+
+
+def test_lru_cache_ttl():
+    now = [0.0]
+    cache = LRUCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.put("a", 1)
+    now[0] = 10
+    assert cache.get("a") == 1
+    now[0] = 10.5
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        LRUCache(ttl=0)
+
+
+def test_lru_cache_weight():
+    cache = LRUCache(maxsize=10, weigh=len, maxweight=5)
+    cache.put("a", b"12")
+    cache.put("b", b"34")
+    cache.put("c", b"56")
+    # "a" is evicted to fit the total weight
+    assert "a" not in cache
+    assert cache.weight == 4
+    # values heavier than the maximum are not cached
+    cache.put("b", b"123456")
+    assert "b" not in cache
+    assert cache.weight == 2
+    cache.clear()
+    assert cache.weight == 0
+
+
+def test_sweet_extensions_special_fields_raises():
+    """valueField, timeFields and locationFields have to reference fields"""
+    schema = deepcopy(sweet_valid)
+    del schema["primaryKey"]
+    schema["valueField"] = {"field": "id", "unit": "MWh"}
+    schema["timeFields"] = [{"field": "name", "frequency": "hourly"}]
+    schema["locationFields"] = [{"field": "name", "locationType": "country"}]
+    my_manager = SchemaManager()
+    assert my_manager.validate_schema(schema) == schema
+
+    schema["valueField"]["field"] = "invalid"
+    with pytest.raises(SchemaReferenceError):
+        my_manager.validate_schema(schema)
+    schema["valueField"]["field"] = "id"
+    schema["timeFields"].append({"frequency": "hourly"})
+    with pytest.raises(SchemaReferenceError):
+        my_manager.validate_schema(schema)
+    del schema["timeFields"]
+    schema["locationFields"][0]["field"] = "invalid"
+    with pytest.raises(SchemaReferenceError):
+        my_manager.validate_schema(schema)
+
+
+def test_sweet_extensions_rollups():
+    """rollups require a value field and a datetime time field"""
+    schema = deepcopy(timeseries)
+    schema["rollups"] = ["daily", "monthly"]
+    my_manager = SchemaManager()
+    assert my_manager.validate_schema(schema) == schema
+    schema["rollups"] = ["fortnightly"]
+    with pytest.raises(ValidationError):
+        my_manager.validate_schema(schema)
+    schema["rollups"] = ["daily"]
+    schema["timeFields"] = schema["timeFields"][:1]
+    with pytest.raises(SchemaReferenceError, match="datetime"):
+        my_manager.validate_schema(schema)
+    del schema["valueField"]
+    with pytest.raises(SchemaReferenceError, match="value field"):
+        my_manager.validate_schema(schema)
+
+
+def test_check_references_reports_all_errors():
+    schema = deepcopy(sweet_valid)
+    schema["primaryKey"] = ["id", "invalid"]
+    schema["foreignKeys"] = [
+        {
+            "fields": ["invalid"],
+            "reference": {"resource": "other_table", "fields": ["id", "name"]},
+        }
+    ]
+    schema["valueField"] = {"field": "value", "unit": "MWh"}
+    errors = SchemaManager.check_references(schema)
+    assert len(errors) == 4
+    with pytest.raises(SchemaReferenceError) as exc_info:
+        SchemaManager().validate_schema(schema)
+    assert exc_info.value.errors == errors
+    assert isinstance(exc_info.value, ValueError)
+    assert SchemaManager.check_references(deepcopy(sweet_valid)) == []
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_validate_many(max_workers: int):
+    location = deepcopy(sweet_valid)
+    location["name"] = "location"
+    del location["primaryKey"]
+    demand = deepcopy(location)
+    demand["name"] = "demand"
+    demand["foreignKeys"] = [
+        {"fields": "id", "reference": {"resource": "location", "fields": "id"}},
+        {"fields": "name", "reference": {"resource": "stored", "fields": "id"}},
+        {"fields": "id", "reference": {"resource": "", "fields": "name"}},
+    ]
+    missing_ref = deepcopy(location)
+    missing_ref["name"] = "missing_ref"
+    missing_ref["foreignKeys"] = [
+        {"fields": "id", "reference": {"resource": "unknown", "fields": "id"}}
+    ]
+    schemas = {
+        "location.json": json.dumps(location).encode(),
+        "demand.yaml": yaml.dump(demand).encode(),
+        "missing_ref.json": missing_ref,
+        "invalid.json": deepcopy(fl_valid),
+        "broken.json": b'{"key": "value}',
+    }
+    reports = SchemaManager().validate_many(
+        schemas, known_resources=["stored"], max_workers=max_workers
+    )
+    assert [r["source"] for r in reports] == list(schemas)
+    by_source = {r["source"]: r for r in reports}
+    assert by_source["location.json"]["valid"]
+    assert by_source["demand.yaml"]["valid"]
+    assert by_source["demand.yaml"]["name"] == "demand"
+    assert not by_source["missing_ref.json"]["valid"]
+    assert "unknown" in by_source["missing_ref.json"]["errors"][0]
+    # misses the name required by the SWEET standard
+    assert not by_source["invalid.json"]["valid"]
+    assert by_source["broken.json"]["name"] is None
+    assert not by_source["broken.json"]["valid"]
+
+
+def test_validate_many_duplicate_names():
+    reports = SchemaManager().validate_many(
+        {"a.json": deepcopy(fl_valid), "b.json": deepcopy(fl_valid)}, max_workers=1
+    )
+    # fails the SWEET standard and therefore has no name
+    assert not any(r["valid"] for r in reports)
+    schema = deepcopy(sweet_valid)
+    del schema["primaryKey"]
+    reports = SchemaManager().validate_many(
+        {"a.json": schema, "b.json": deepcopy(schema)}, max_workers=1
+    )
+    assert not any(r["valid"] for r in reports)
+    assert "more than once" in reports[0]["errors"][0]
@@ -0,0 +1,305 @@
+from copy import deepcopy
+
+from sqlmodel import Session, create_engine, text
+
+from app.api.crud.data import data_version
+from app.api.crud.migration import (
+    Backfill,
+    apply_migration,
+    complete_migration,
+    plan_migration,
+    read_migration,
+    run_backfill,
+    run_migration,
+    start_migration,
+)
+from app.models.schema import DataVersion, TableMigration, TableSchema
+
+from .settings import sweet_valid, timeseries
+
+
+def test_plan_migration_unchanged():
+    assert plan_migration(timeseries, deepcopy(timeseries)).is_empty
+
+
+def test_plan_migration_add_and_drop_fields():
+    new = deepcopy(timeseries)
+    new["fields"] = [f for f in new["fields"] if f["name"] != "year"]
+    new["timeFields"] = new["timeFields"][1:]
+    new["fields"].append({"name": "source", "type": "string"})
+
+    plan = plan_migration(timeseries, new)
+    assert not plan.errors
+    assert plan.statements == [
+        "ALTER TABLE generation ADD COLUMN source TEXT",
+        "DROP INDEX CONCURRENTLY IF EXISTS brin_generation_year",
+    ]
+    assert plan.backfills == []
+    assert plan.finalize == ["ALTER TABLE generation DROP COLUMN year"]
+
+
+def test_plan_migration_change_type():
+    new = deepcopy(timeseries)
+    new["fields"][3]["type"] = "integer"
+
+    plan = plan_migration(timeseries, new)
+    assert plan.statements[0] == (
+        "ALTER TABLE generation ADD COLUMN generation_new INTEGER"
+    )
+    # a trigger keeps the new column in sync with rows written meanwhile
+    assert (
+        "NEW.generation_new := CAST(NEW.generation AS INTEGER);" in (plan.statements[1])
+    )
+    assert plan.statements[3] == (
+        "CREATE TRIGGER generation_migrate BEFORE INSERT OR UPDATE ON generation "
+        "FOR EACH ROW EXECUTE FUNCTION generation_migrate()"
+    )
+    assert plan.backfills == [
+        Backfill(
+            table="generation",
+            column="generation_new",
+            expression="CAST(generation AS INTEGER)",
+            key_column="id_",
+        )
+    ]
+    assert plan.prepare == []
+    assert plan.swap == [
+        "DROP TRIGGER IF EXISTS generation_migrate ON generation",
+        "DROP FUNCTION IF EXISTS generation_migrate()",
+        "ALTER TABLE generation DROP COLUMN generation",
+        "ALTER TABLE generation RENAME COLUMN generation_new TO generation",
+    ]
+    # the covering index includes the value and is rebuilt after the swap
+    assert len(plan.finalize) == 1
+    assert plan.finalize[0].startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS")
+
+
+def test_plan_migration_change_type_of_key():
+    new = deepcopy(timeseries)
+    new["fields"][2]["type"] = "integer"
+
+    plan = plan_migration(timeseries, new)
+    assert not plan.errors
+    # NOT NULL and the key constraint are recreated on the new column
+    assert plan.prepare == [
+        "ALTER TABLE generation ADD CONSTRAINT generation_country_not_null "
+        "CHECK (country_new IS NOT NULL) NOT VALID",
+        "ALTER TABLE generation VALIDATE CONSTRAINT generation_country_not_null",
+        "ALTER TABLE generation ALTER COLUMN country_new SET NOT NULL",
+        "ALTER TABLE generation DROP CONSTRAINT generation_country_not_null",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "
+        "unique_generation_country_datetime_new ON generation (country_new, datetime)",
+    ]
+    assert plan.swap[2:] == [
+        "ALTER TABLE generation DROP COLUMN country",
+        "ALTER TABLE generation RENAME COLUMN country_new TO country",
+        "ALTER TABLE generation ADD CONSTRAINT unique_generation_country_datetime "
+        "UNIQUE USING INDEX unique_generation_country_datetime_new",
+    ]
+    sqlite_plan = plan_migration(timeseries, new, db_dialect="sqlite")
+    assert sqlite_plan.errors == [
+        "Fields of the primary key can only be retyped on PostgreSQL"
+    ]
+
+    partitioned = deepcopy(timeseries)
+    partitioned["fields"][1]["type"] = "date"
+    plan = plan_migration(timeseries, partitioned, partitioned=True)
+    assert plan.errors == ["The partitioning field datetime cannot be retyped"]
+
+
+def test_plan_migration_partitioned_and_primary_key():
+    new = deepcopy(timeseries)
+    new["primaryKey"] = ["country", "datetime", "year"]
+
+    plan = plan_migration(timeseries, new, partitioned=True)
+    assert plan.statements == []
+    # the key constraint is replaced together with the stored schema
+    # fields joining the key become NOT NULL
+    assert plan.prepare == [
+        "ALTER TABLE generation ALTER COLUMN year SET NOT NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS unique_generation_country_datetime_year_new "
+        "ON generation (country, datetime, year)",
+    ]
+    assert plan.swap == [
+        "ALTER TABLE generation DROP CONSTRAINT IF EXISTS "
+        "unique_generation_country_datetime",
+        "ALTER TABLE generation ADD CONSTRAINT unique_generation_country_datetime_year "
+        "UNIQUE USING INDEX unique_generation_country_datetime_year_new",
+    ]
+    assert plan.rollback == [
+        "ALTER TABLE generation DROP CONSTRAINT IF EXISTS generation_year_not_null",
+        "ALTER TABLE generation ALTER COLUMN year DROP NOT NULL",
+        "DROP INDEX IF EXISTS unique_generation_country_datetime_year_new",
+    ]
+    sqlite_plan = plan_migration(timeseries, new, db_dialect="sqlite")
+    assert sqlite_plan.errors
+
+
+def test_plan_migration_add_required_fields():
+    new = deepcopy(timeseries)
+    new["fields"] += [
+        {"name": "unit", "type": "string"},
+        {"name": "source", "type": "string", "constraints": {"required": True}},
+    ]
+    new["primaryKey"] = ["country", "datetime", "unit"]
+
+    plan = plan_migration(timeseries, new)
+    assert plan.statements == [
+        "ALTER TABLE generation ADD COLUMN unit TEXT",
+        "ALTER TABLE generation ADD COLUMN source TEXT",
+    ]
+    # the new key and required fields are NOT NULL and the key is unique
+    assert plan.prepare[2] == "ALTER TABLE generation ALTER COLUMN unit SET NOT NULL"
+    assert plan.prepare[6] == (
+        "ALTER TABLE generation ALTER COLUMN source SET NOT NULL"
+    )
+    assert plan.prepare[8] == (
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "
+        "unique_generation_country_datetime_unit_new "
+        "ON generation (country, datetime, unit)"
+    )
+    assert plan.swap[-1] == (
+        "ALTER TABLE generation ADD CONSTRAINT unique_generation_country_datetime_unit "
+        "UNIQUE USING INDEX unique_generation_country_datetime_unit_new"
+    )
+    assert plan.rollback == [
+        "DROP INDEX CONCURRENTLY IF EXISTS unique_generation_country_datetime_unit_new",
+        "ALTER TABLE generation DROP COLUMN unit",
+        "ALTER TABLE generation DROP COLUMN source",
+    ]
+
+    # existing fields that become required or optional
+    required = deepcopy(timeseries)
+    required["fields"][0]["constraints"] = {"required": True}
+    plan = plan_migration(timeseries, required)
+    assert plan.prepare[2] == "ALTER TABLE generation ALTER COLUMN year SET NOT NULL"
+    plan = plan_migration(required, timeseries)
+    assert plan.statements == ["ALTER TABLE generation ALTER COLUMN year DROP NOT NULL"]
+    assert plan_migration(required, timeseries, db_dialect="sqlite").errors == [
+        "Required fields can only become optional on PostgreSQL"
+    ]
+
+
+def test_plan_migration_missing_key_constraint():
+    plan = plan_migration(timeseries, deepcopy(timeseries), key_constraint=False)
+    assert plan.prepare == [
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "
+        "unique_generation_country_datetime_new ON generation (country, datetime)"
+    ]
+    assert plan.swap == [
+        "ALTER TABLE generation ADD CONSTRAINT unique_generation_country_datetime "
+        "UNIQUE USING INDEX unique_generation_country_datetime_new"
+    ]
+
+
+def test_plan_migration_errors():
+    renamed = {**deepcopy(timeseries), "name": "other"}
+    assert plan_migration(timeseries, renamed).errors
+
+    referenced = deepcopy(timeseries)
+    referenced["foreignKeys"] = [
+        {"fields": "country", "reference": {"resource": "country", "fields": "code"}}
+    ]
+    plan = plan_migration(timeseries, referenced)
+    assert plan.errors == ["Foreign keys cannot be changed"]
+
+
+def _sqlite_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migration.db'}")
+    DataVersion.__table__.create(engine)  # type: ignore[attr-defined]
+    TableMigration.__table__.create(engine)  # type: ignore[attr-defined]
+    with Session(engine) as session:
+        session.exec(
+            text(
+                "CREATE TABLE testsweet "
+                "(id_ INTEGER PRIMARY KEY, id INTEGER, name TEXT)"
+            )
+        )
+        for i in range(1, 26):
+            session.exec(text(f"INSERT INTO testsweet VALUES ({i}, {i}, 'n{i}')"))
+        session.commit()
+    return engine
+
+
+# without key, i.e., its fields can be retyped on sqlite
+sweet_unkeyed = {k: v for k, v in sweet_valid.items() if k != "primaryKey"}
+
+
+def test_apply_migration_sqlite(tmp_path):
+    engine = _sqlite_table(tmp_path)
+    new = deepcopy(sweet_unkeyed)
+    new["fields"][0]["type"] = "string"
+    new["fields"].append({"name": "comment", "type": "string"})
+    plan = plan_migration(sweet_unkeyed, new, db_dialect="sqlite")
+    apply_migration(engine, plan)
+    assert run_backfill(engine, plan.backfills[0], batch_size=10) == 25
+    # rows written after the backfill are synced by the triggers
+    with Session(engine) as session:
+        session.exec(text("INSERT INTO testsweet (id_, id, name) VALUES (26, 26, 'a')"))
+        session.exec(text("UPDATE testsweet SET id = 100 WHERE id_ = 2"))
+        session.commit()
+    complete_migration(engine, plan)
+
+    with Session(engine) as session:
+        rows = session.exec(text("SELECT * FROM testsweet ORDER BY id_")).all()
+        triggers = session.exec(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        ).all()
+    assert rows[0]._mapping == {"id_": 1, "name": "n1", "comment": None, "id": "1"}
+    assert rows[1].id == "100"
+    assert rows[25].id == "26"
+    assert triggers == []
+    # cached results of both steps are invalidated
+    with Session(engine) as session:
+        assert data_version(session, "testsweet") == 2
+    engine.dispose()
+
+
+def test_run_migration_records_status(tmp_path):
+    engine = _sqlite_table(tmp_path)
+    new = deepcopy(sweet_unkeyed)
+    new["fields"][1]["type"] = "integer"
+    plan = plan_migration(sweet_unkeyed, new, db_dialect="sqlite")
+    apply_migration(engine, plan)
+    # the swap fails after the old column was dropped
+    plan.swap.append("ALTER TABLE testsweet RENAME COLUMN missing TO other")
+    TableSchema.__table__.create(engine)  # type: ignore[attr-defined]
+    with Session(engine) as session:
+        schema = TableSchema(
+            name="testsweet", description="test", jsonschema=sweet_unkeyed
+        )
+        session.add(schema)
+        session.commit()
+        session.refresh(schema)
+    with Session(engine) as session:
+        migration_id = start_migration(session, "testsweet")
+        assert read_migration(session, "testsweet").status == "running"
+    run_migration(engine, plan, migration_id, schema.id, new)
+    with Session(engine) as session:
+        migration = read_migration(session, "testsweet")
+        assert migration.status == "failed"
+        assert "missing" in migration.error
+        # the swap is rolled back as a whole and the added column and triggers
+        # are dropped, i.e., the table and the stored schema are the old ones
+        columns = session.exec(text("SELECT * FROM testsweet")).keys()
+        assert set(columns) == {"id_", "id", "name"}
+        assert not session.exec(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        ).all()
+        assert session.get(TableSchema, schema.id).jsonschema == sweet_unkeyed
+
+    plan.swap.pop()
+    apply_migration(engine, plan)
+    with Session(engine) as session:
+        retry_id = start_migration(session, "testsweet")
+    run_migration(engine, plan, retry_id, schema.id, new)
+    with Session(engine) as session:
+        migration = read_migration(session, "testsweet")
+        assert migration.id == retry_id
+        assert migration.status == "succeeded"
+        assert migration.finished_at is not None
+        columns = session.exec(text("SELECT * FROM testsweet")).keys()
+        assert "name_new" not in columns
+        # the new version is stored once the columns are swapped
+        assert session.get(TableSchema, schema.id).jsonschema == new
+    engine.dispose()
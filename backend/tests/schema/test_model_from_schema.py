@@ -1,11 +1,13 @@
 from copy import deepcopy
 
 import pytest
-from sqlalchemy import ForeignKeyConstraint, Integer
+from sqlalchemy import ForeignKeyConstraint, Integer, MetaData, Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
 
 from app.schema_manager import SchemaManager
 
-from .settings import sweet_valid
+from .settings import sweet_valid, timeseries
 
 
 def test_column_from_field_no_constraint():
@@ -174,3 +176,67 @@ def test_model_from_schema_with_foreign_key_scalar(dialect):
         len([c for c in table["constraints"] if isinstance(c, ForeignKeyConstraint)])
         == 1
     )
+
+
+def _ddl(table: dict, dialect) -> list[str]:
+    metadata = MetaData()
+    tab = Table(
+        table["name"], metadata, *table["columns"], *table["indexes"], quote=False
+    )
+    return [str(CreateIndex(ix).compile(dialect=dialect)) for ix in tab.indexes]
+
+
+def test_model_from_schema_indexes_postgresql():
+    table = SchemaManager().model_from_schema(
+        timeseries, validate_schema=True, db_dialect="postgresql"
+    )
+    ddl = sorted(_ddl(table, postgresql.dialect()))
+    assert ddl == [
+        "CREATE INDEX brin_generation_datetime ON generation USING brin (datetime)",
+        "CREATE INDEX brin_generation_year ON generation USING brin (year)",
+        "CREATE INDEX ix_generation_country_datetime ON generation "
+        "(country, datetime) INCLUDE (generation)",
+    ]
+
+
+def test_model_from_schema_indexes_sqlite():
+    table = SchemaManager().model_from_schema(
+        timeseries, validate_schema=True, db_dialect="sqlite"
+    )
+    # (country, datetime) is already indexed by the primary key
+    assert sorted(_ddl(table, sqlite.dialect())) == [
+        "CREATE INDEX ix_generation_datetime ON generation (datetime)",
+        "CREATE INDEX ix_generation_year ON generation (year)",
+    ]
+    schema = deepcopy(sweet_valid)
+    assert SchemaManager().model_from_schema(schema)["indexes"] == []
+
+
+def test_index_name_length():
+    schema = deepcopy(timeseries)
+    schema["name"] = "a" * 60
+    indexes = SchemaManager.indexes_from_schema(schema, "postgresql")
+    names = [ix.name for ix in indexes]
+    assert all(len(name) <= 63 for name in names)
+    assert len(set(names)) == len(names)
+
+
+def test_model_from_schema_with_value_field():
+    schema = deepcopy(timeseries)
+    del schema["primaryKey"]
+    assert SchemaManager.natural_key(schema) == ["year", "datetime", "country"]
+    assert SchemaManager.natural_key(timeseries) == ["country", "datetime"]
+    assert SchemaManager.natural_key(sweet_valid) == ["id"]
+    assert SchemaManager.natural_key({"fields": []}) == []
+
+    # all fields but the value field are jointly unique and not nullable
+    table = SchemaManager().model_from_schema(schema, create_id_column="id_")
+    assert [c.name for c in table["columns"] if not c.nullable] == [
+        "id_",
+        "year",
+        "datetime",
+        "country",
+    ]
+    assert [c.name for c in table["constraints"]] == [
+        "unique_generation_year_datetime_country"
+    ]
@@ -0,0 +1,217 @@
+from copy import deepcopy
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import MetaData, Table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app.api.crud.partition import (
+    create_partitions,
+    detach_partitions,
+    ensure_partitions,
+    maintain_partitions,
+    partition_name,
+    partition_window,
+    shift,
+    truncate,
+)
+from app.schema_manager import SchemaManager
+
+from .settings import timeseries
+
+
+@pytest.mark.parametrize(
+    "interval, expected",
+    [
+        ("day", datetime(2024, 3, 13)),
+        ("week", datetime(2024, 3, 11)),
+        ("month", datetime(2024, 3, 1)),
+        ("year", datetime(2024, 1, 1)),
+    ],
+)
+def test_truncate(interval: str, expected: datetime):
+    assert truncate(datetime(2024, 3, 13, 17, 45), interval) == expected
+
+
+def test_shift():
+    assert shift(datetime(2024, 11, 1), "month", 3) == datetime(2025, 2, 1)
+    assert shift(datetime(2024, 1, 1), "month", -1) == datetime(2023, 12, 1)
+    assert shift(datetime(2024, 3, 11), "week", -1) == datetime(2024, 3, 4)
+    assert shift(datetime(2024, 1, 1), "year", 2) == datetime(2026, 1, 1)
+    with pytest.raises(ValueError):
+        shift(datetime(2024, 1, 1), "decade")
+
+
+def test_partition_window():
+    start, end = partition_window(
+        "month", now=datetime(2024, 1, 31, 12), ahead=2, behind=1
+    )
+    assert (start, end) == (datetime(2023, 12, 1), datetime(2024, 4, 1))
+
+
+def test_partition_name():
+    assert partition_name("generation", datetime(2024, 3, 1)) == "generation_p20240301"
+    assert len(partition_name("a" * 63, datetime(2024, 3, 1))) == 63
+
+
+def _db() -> MagicMock:
+    db = MagicMock()
+    db.bind.dialect = postgresql.dialect()
+    return db
+
+
+def _statements(db: MagicMock) -> list[str]:
+    return [str(call.args[0]) for call in db.exec.call_args_list]
+
+
+def test_create_partitions():
+    db = _db()
+    existing = [("generation_p20240201", datetime(2024, 2, 1), datetime(2024, 3, 1))]
+    with patch("app.api.crud.partition.list_partitions", return_value=existing):
+        created = create_partitions(
+            db, "generation", "month", date(2024, 1, 15), datetime(2024, 4, 1)
+        )
+    assert created == ["generation_p20240101", "generation_p20240301"]
+    assert _statements(db) == [
+        "CREATE TABLE IF NOT EXISTS generation_p20240101 PARTITION OF generation "
+        "FOR VALUES FROM ('2024-01-01 00:00:00') TO ('2024-02-01 00:00:00')",
+        "CREATE TABLE IF NOT EXISTS generation_p20240301 PARTITION OF generation "
+        "FOR VALUES FROM ('2024-03-01 00:00:00') TO ('2024-04-01 00:00:00')",
+    ]
+
+
+def test_ensure_partitions():
+    db = _db()
+    existing = [("generation_p20240201", datetime(2024, 2, 1), datetime(2024, 3, 1))]
+    known: set[datetime] = set()
+    times = [datetime(2024, 2, 3), datetime(2024, 5, 31, 23), None, date(2023, 1, 1)]
+    with patch(
+        "app.api.crud.partition.list_partitions", return_value=existing
+    ) as listed:
+        created = ensure_partitions(db, "generation", "month", times, known=known)
+        # partitions known from earlier chunks are not listed again
+        assert (
+            ensure_partitions(
+                db, "generation", "month", [datetime(2024, 5, 1)], known=known
+            )
+            == []
+        )
+    assert listed.call_count == 1
+    # only the partitions of the times are created, gaps are left
+    assert created == ["generation_p20230101", "generation_p20240501"]
+    assert _statements(db)[1] == (
+        "CREATE TABLE IF NOT EXISTS generation_p20240501 PARTITION OF generation "
+        "FOR VALUES FROM ('2024-05-01 00:00:00') TO ('2024-06-01 00:00:00')"
+    )
+    assert known == {datetime(2023, 1, 1), datetime(2024, 2, 1), datetime(2024, 5, 1)}
+
+
+def test_detach_partitions():
+    db = _db()
+    existing = [
+        (f"generation_p2024{m:02d}01", datetime(2024, m, 1), datetime(2024, m + 1, 1))
+        for m in (1, 2, 3)
+    ]
+    with patch("app.api.crud.partition.list_partitions", return_value=existing):
+        detached = detach_partitions(
+            db, "generation", datetime(2024, 3, 1), now=datetime(2024, 5, 2, 3)
+        )
+    assert detached == [
+        "generation_p20240101_detached_20240502030000",
+        "generation_p20240201_detached_20240502030000",
+    ]
+    # the detached tables are renamed, i.e., the partitions can be created again
+    assert _statements(db)[:2] == [
+        "ALTER TABLE generation DETACH PARTITION generation_p20240101",
+        "ALTER TABLE generation_p20240101 RENAME TO "
+        "generation_p20240101_detached_20240502030000",
+    ]
+
+
+def test_maintain_partitions():
+    db = _db()
+    with patch("app.api.crud.partition.list_partitions", return_value=[]):
+        result = maintain_partitions(
+            db,
+            "generation",
+            "year",
+            now=datetime(2024, 6, 1),
+            ahead=1,
+            behind=0,
+            retain=1,
+        )
+    assert result == {
+        "created": ["generation_p20240101", "generation_p20250101"],
+        "detached": [],
+    }
+    db.commit.assert_called_once()
+
+
+def test_maintain_partitions_detach():
+    db = _db()
+    existing = [("generation_p20230101", datetime(2023, 1, 1), datetime(2024, 1, 1))]
+    with (
+        patch("app.api.crud.partition.list_partitions", return_value=existing),
+        patch("app.api.crud.data.bump_data_version") as bump,
+    ):
+        result = maintain_partitions(
+            db,
+            "generation",
+            "year",
+            now=datetime(2024, 6, 1),
+            ahead=0,
+            behind=0,
+            retain=0,
+        )
+    assert result["detached"] == ["generation_p20230101_detached_20240601000000"]
+    # the version is bumped in the transaction of the detachment
+    bump.assert_called_once_with(db, "generation")
+    db.commit.assert_called_once()
+
+
+def test_partition_from_schema():
+    assert SchemaManager.partition_from_schema(timeseries) == {
+        "column": "datetime",
+        "interval": "month",
+    }
+    schema = deepcopy(timeseries)
+    schema["timeFields"][1]["frequency"] = "monthly"
+    with pytest.raises(ValueError):
+        SchemaManager.partition_from_schema(schema)
+    schema = deepcopy(timeseries)
+    schema["primaryKey"] = ["country"]
+    with pytest.raises(ValueError):
+        SchemaManager.partition_from_schema(schema)
+    schema = deepcopy(timeseries)
+    schema["timeFields"] = [{"field": "year", "frequency": "yearly"}]
+    with pytest.raises(ValueError):
+        SchemaManager.partition_from_schema(schema)
+
+
+def test_model_from_schema_partitioned():
+    table = SchemaManager().model_from_schema(
+        timeseries,
+        db_dialect="postgresql",
+        create_id_column="id_",
+        partitioned=True,
+    )
+    assert table["partition"] == {"column": "datetime", "interval": "month"}
+    tab = Table(
+        table["name"],
+        MetaData(),
+        *table["columns"],
+        *table["constraints"],
+        postgresql_partition_by="RANGE (datetime)",
+    )
+    ddl = str(CreateTable(tab).compile(dialect=postgresql.dialect()))
+    assert "id_ SERIAL NOT NULL" in ddl
+    assert "PRIMARY KEY (id_, datetime)" in ddl
+    assert ddl.rstrip().endswith("PARTITION BY RANGE (datetime)")
+
+    # partitioning only applies to PostgreSQL
+    table = SchemaManager().model_from_schema(
+        timeseries, db_dialect="sqlite", create_id_column="id_", partitioned=True
+    )
+    assert table["partition"] is None
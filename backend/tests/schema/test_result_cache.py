@@ -0,0 +1,131 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlmodel import Session, text
+
+from app.api.crud.data import data_version, ingest_rows
+from app.api.crud.result_cache import ResultCache, result_cache
+from app.api.crud.schema import create_schema, create_table_from_schema
+from app.api.routes.schema import router as schema_router
+from app.core.config import settings
+from app.filestorage import LocalFileStorage
+from app.main import app
+from app.schema_manager import SchemaManager
+
+from .settings import timeseries
+
+client = TestClient(app)
+
+url_schema = f"{settings.API_V1_STR}{schema_router.prefix}"
+
+
+def test_result_cache_key():
+    key = ResultCache.key(
+        1, "data", {"fields": ["a", "b"], "locations": {"c": ["DE", "CH"]}}, 1
+    )
+    # the order of the location values does not matter, the one of fields does
+    assert key == ResultCache.key(
+        1, "data", {"locations": {"c": ["CH", "DE"]}, "fields": ["a", "b"]}, 1
+    )
+    assert key != ResultCache.key(
+        1, "data", {"fields": ["b", "a"], "locations": {"c": ["CH", "DE"]}}, 1
+    )
+    assert key != ResultCache.key(
+        1, "data", {"fields": ["a", "b"], "locations": {"c": ["CH", "DE"]}}, 2
+    )
+
+
+def test_result_cache_shared(tmp_path):
+    storage = LocalFileStorage(str(tmp_path))
+    first, second = ResultCache(storage=storage), ResultCache(storage=storage)
+    key = ResultCache.key(1, "data", {}, 1)
+    assert first.get(1, key) is None
+    first.put(key, b"{}")
+    # the result is read from the shared storage and then cached in process
+    assert second.get(1, key) == b"{}"
+    assert second.get(1, key) == b"{}"
+    assert second.stats(1) == {
+        "schema_id": 1,
+        "hits": 1,
+        "shared_hits": 1,
+        "misses": 0,
+        "hit_rate": 1.0,
+    }
+    assert first.stats(1)["hit_rate"] == 0.0
+
+    disabled = ResultCache(maxsize=0, storage=storage)
+    assert not disabled.enabled
+    assert disabled.get(1, key) is None
+
+
+def test_result_cache_shared_eviction(tmp_path):
+    storage = LocalFileStorage(str(tmp_path))
+    first, second = ResultCache(storage=storage), ResultCache(storage=storage)
+    old = [ResultCache.key(1, "data", {"page": i}, 1) for i in range(3)]
+    other = ResultCache.key(2, "data", {}, 1)
+    for key in [*old, other]:
+        first.put(key, b"{}")
+    assert len(storage.list()) == 4
+
+    # the first result of a new version deletes the shared results of the older
+    # ones of the same table, no matter which process cached them
+    new = ResultCache.key(1, "data", {"page": 0}, 2)
+    second.put(new, b"[]")
+    assert sorted(storage.list()) == sorted([f"{new}.json", f"{other}.json"])
+    assert second.get(1, old[1]) is None
+    second.put(ResultCache.key(1, "data", {"page": 1}, 2), b"[]")
+    assert len(storage.list()) == 3
+
+    assert first.evict(1) == 2
+    assert storage.list() == [f"{other}.json"]
+
+
+def test_read_data_cached(
+    db: Session, schema_manager: SchemaManager, admin_token_header: dict[str, str]
+) -> None:
+    result_cache.clear()
+    schema = create_schema(db=db, data=timeseries, schema_manager=schema_manager)
+    create_table_from_schema(
+        db=db, schema_manager=schema_manager, schema_id=schema.id, id_column_name="id_"
+    )
+    version = data_version(db, "generation")
+    row = {"year": "2024", "country": "CH", "generation": "1"}
+    ingest_rows(
+        db=db,
+        schema=timeseries,
+        rows=[{**row, "datetime": "2024-01-01T00:00:00"}],
+    )
+    assert data_version(db, "generation") == version + 1
+    url = f"{url_schema}/{schema.id}/data"
+
+    first = client.get(url, params={"country": "CH"})
+    assert first.status_code == status.HTTP_200_OK
+    assert len(first.json()["rows"]) == 1
+    assert client.get(url, params={"country": "CH"}).content == first.content
+    client.get(f"{url}/aggregate", params={"interval": "day"})
+
+    # ingestion invalidates the cached results
+    ingest_rows(
+        db=db,
+        schema=timeseries,
+        rows=[{**row, "datetime": "2024-01-01T01:00:00"}],
+    )
+    assert len(client.get(url, params={"country": "CH"}).json()["rows"]) == 2
+    response = client.get(f"{url}/aggregate", params={"interval": "day"})
+    assert response.json()["columns"]["count"] == [2]
+
+    response = client.get(f"{url}/cache", headers=admin_token_header)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "schema_id": schema.id,
+        "hits": 1,
+        "shared_hits": 0,
+        "misses": 4,
+        "hit_rate": 0.2,
+    }
+    # invalid queries are not cached
+    response = client.get(url, params={"fields": "unknown"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    db.exec(text("DROP TABLE generation"))
+    db.delete(schema)
+    db.commit()
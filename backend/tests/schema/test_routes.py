@@ -1,17 +1,21 @@
+import io
 import json
+import tarfile
+import zipfile
+from copy import deepcopy
 from pathlib import Path
 
 import pytest
 import yaml
 from fastapi import status
 from fastapi.testclient import TestClient
-from sqlmodel import Session, text
+from sqlmodel import Session, delete, text
 
-from app.api.crud.schema import create_schema
+from app.api.crud.schema import create_schema, schemas_version, update_schema
 from app.api.routes.schema import router as schema_router
 from app.core.config import settings
 from app.main import app
-from app.models.schema.schema import TableSchema, TableSchemaPublic
+from app.models.schema.schema import TableMigration, TableSchema, TableSchemaPublic
 from app.schema_manager import SchemaManager
 
 # from app.models import RawJsonSchema
@@ -128,6 +132,78 @@ def test_get_schema_by_name(
     db.commit()
 
 
+def test_get_schema_etag(
+    db: Session, schema_manager: SchemaManager, admin_token_header: dict[str, str]
+) -> None:
+    schema = create_schema(db=db, data=sweet_valid, schema_manager=schema_manager)
+    response = client.get(f"{url_schema}/{schema.id}")
+    assert response.status_code == status.HTTP_200_OK
+    etag = response.headers["ETag"]
+
+    for key in (schema.id, schema.name):
+        response = client.get(f"{url_schema}/{key}", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["ETag"] == etag
+        assert not response.content
+    response = client.get(
+        f"{url_schema}/{schema.id}", headers={"If-None-Match": f'"x", W/{etag}'}
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # toggling changes the schema and thus its tag
+    client.post(f"{url_schema}/{schema.id}/toggle", headers=admin_token_header)
+    response = client.get(f"{url_schema}/{schema.id}", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    db.delete(schema)
+    db.commit()
+
+
+def test_list_schemas_etag(
+    db: Session, schema_manager: SchemaManager, admin_token_header: dict[str, str]
+) -> None:
+    schema = create_schema(db=db, data=sweet_valid, schema_manager=schema_manager)
+    response = client.get(url_schema)
+    etag = response.headers["ETag"]
+    version = response.headers["X-Schemas-Version"]
+
+    response = client.get(url_schema, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["X-Schemas-Version"] == version
+    # another query has another tag but the same version
+    response = client.get(
+        url_schema, params={"fields": "id"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    assert response.headers["X-Schemas-Version"] == version
+
+    client.post(f"{url_schema}/{schema.id}/toggle", headers=admin_token_header)
+    response = client.get(url_schema, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Schemas-Version"] != version
+    etag = response.headers["ETag"]
+
+    client.delete(f"{url_schema}/{schema.id}", headers=admin_token_header)
+    response = client.get(url_schema, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+
+
+def test_schemas_version_same_second(
+    db: Session, schema_manager: SchemaManager
+) -> None:
+    schema = create_schema(db=db, data=sweet_valid, schema_manager=schema_manager)
+    version = schemas_version(db=db)
+    # changes within the resolution of the update time change the version
+    changed = deepcopy(schema.jsonschema)
+    changed["description"] = "changed"
+    update_schema(db=db, schema_id=schema.id, schema=changed)
+    assert schemas_version(db=db) != version
+    db.delete(schema)
+    db.commit()
+
+
 def test_get_schema_not_found() -> None:
     response = client.get(f"{url_schema}/1")
     assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -168,11 +244,70 @@ def test_list_schemas(db: Session, schema_manager: SchemaManager) -> None:
     schema = create_schema(db=db, data=sweet_valid, schema_manager=schema_manager)
     response = client.get(url_schema)
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [schema.get_public().model_dump()]
+    public = schema.get_public().model_dump()
+    assert response.json() == [
+        {k: public[k] for k in ("id", "name", "description", "is_active")}
+    ]
+    assert "X-Next-After-Id" not in response.headers
+
+    response = client.get(url_schema, params={"fields": "id,jsonschema"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{"id": schema.id, "jsonschema": public["jsonschema"]}]
+
+    response = client.get(url_schema, params={"fields": "id,password"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
     db.delete(schema)
     db.commit()
 
 
+def test_list_schemas_filter_and_paginate(
+    db: Session, schema_manager: SchemaManager
+) -> None:
+    schemas = []
+    for name, tags in [
+        ("power_a", ["electricity", "timeseries"]),
+        ("power_b", ["electricity"]),
+        ("powerless", ["economic", "timeseries"]),
+    ]:
+        data = deepcopy(sweet_valid)
+        data["name"] = name
+        data["tags"] = tags
+        schemas.append(create_schema(db=db, data=data, schema_manager=schema_manager))
+    ids = [s.id for s in schemas]
+
+    def names(**params) -> list[str]:
+        response = client.get(url_schema, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        return [s["name"] for s in response.json()]
+
+    assert names(name_prefix="power") == ["power_a", "power_b", "powerless"]
+    # wildcards in the prefix are matched literally
+    assert names(name_prefix="power_") == ["power_a", "power_b"]
+    assert names(name_prefix="%") == []
+    assert names(tags=["electricity"]) == ["power_a", "power_b"]
+    assert names(tags=["electricity", "timeseries"]) == ["power_a"]
+    assert names(is_active=True) == []
+    assert names(is_active=False) == ["power_a", "power_b", "powerless"]
+
+    # walk through all pages
+    seen: list[int] = []
+    params: dict = {"limit": 2}
+    while True:
+        response = client.get(url_schema, params=params)
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(s["id"] for s in response.json())
+        if "X-Next-After-Id" not in response.headers:
+            break
+        params["after_id"] = response.headers["X-Next-After-Id"]
+    assert seen == ids
+
+    response = client.get(url_schema, params={"limit": 0})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    for schema in schemas:
+        db.delete(schema)
+    db.commit()
+
+
 def test_toggle_schema(
     db: Session, schema_manager: SchemaManager, admin_token_header: dict[str, str]
 ) -> None:
@@ -230,3 +365,215 @@ def test_create_table_from_schema2(
     db.exec(text(f"DROP TABLE {sweet_valid['name']}"))
     db.delete(schema)
     db.commit()
+
+
+def test_create_tables_for_schemas(
+    db: Session, schema_manager: SchemaManager, admin_token_header
+) -> None:
+    referencing = deepcopy(sweet_valid)
+    referencing["name"] = "sweet_notes"
+    referencing["foreignKeys"] = [
+        {"fields": ["id"], "reference": {"resource": "testsweet", "fields": ["id"]}}
+    ]
+    schemas = [
+        create_schema(db=db, data=data, schema_manager=schema_manager)
+        for data in [referencing, sweet_valid]
+    ]
+    url = f"{url_schema}/create_tables"
+    response = client.post(
+        url,
+        params={"schema_id": [s.id for s in schemas]},
+        headers=admin_token_header,
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {"levels": [["testsweet"], ["sweet_notes"]]}
+
+    response = client.post(
+        url, params={"schema_id": schemas[0].id}, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = client.post(
+        url, params={"schema_id": 1234234}, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    db.exec(text("DROP TABLE sweet_notes"))
+    db.exec(text("DROP TABLE testsweet"))
+    for schema in schemas:
+        db.delete(schema)
+    db.commit()
+
+
+def test_validate_schemas_batch(
+    db: Session, schema_manager: SchemaManager, admin_token_header: dict[str, str]
+) -> None:
+    stored = create_schema(db=db, data=sweet_valid, schema_manager=schema_manager)
+    schema = deepcopy(sweet_valid)
+    del schema["primaryKey"]
+    schema["name"] = "referencing"
+    schema["foreignKeys"] = [
+        {"fields": "id", "reference": {"resource": stored.name, "fields": "id"}}
+    ]
+    other = deepcopy(schema)
+    other["name"] = "other"
+    other["foreignKeys"][0]["reference"]["resource"] = "referencing"
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("schemas/other.yaml", yaml.dump(other))
+        zf.writestr("schemas/readme.txt", "not a schema")
+    files = [
+        ("files", ("referencing.json", json.dumps(schema).encode())),
+        ("files", ("invalid.json", json.dumps({"name": "test"}).encode())),
+        ("files", ("schemas.zip", archive.getvalue())),
+    ]
+    response = client.post(
+        f"{url_schema}/validate-batch", files=files, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_200_OK
+    reports = {r["source"]: r for r in response.json()}
+    assert set(reports) == {
+        "referencing.json",
+        "invalid.json",
+        "schemas.zip/schemas/other.yaml",
+    }
+    assert reports["referencing.json"]["valid"]
+    assert reports["schemas.zip/schemas/other.yaml"]["valid"]
+    assert not reports["invalid.json"]["valid"]
+    assert reports["invalid.json"]["errors"]
+    db.delete(stored)
+    db.commit()
+
+
+def test_validate_schemas_batch_invalid_files(
+    admin_token_header: dict[str, str], standard_token_header: dict[str, str]
+) -> None:
+    url = f"{url_schema}/validate-batch"
+    files = [("files", ("test.txt", b"test"))]
+    response = client.post(url, files=files, headers=admin_token_header)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    files = [("files", ("test.zip", b"no zip"))]
+    response = client.post(url, files=files, headers=admin_token_header)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("readme.txt", "not a schema")
+    files = [("files", ("test.zip", archive.getvalue()))]
+    response = client.post(url, files=files, headers=admin_token_header)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    files = [("files", ("test.json", json.dumps(sweet_valid).encode()))]
+    response = client.post(url, files=files, headers=standard_token_header)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.parametrize(
+    ("setting", "value"),
+    [
+        ("SCHEMA_ARCHIVE_MAX_MEMBERS", 1),
+        ("SCHEMA_ARCHIVE_MAX_MEMBER_SIZE", 512),
+        ("SCHEMA_ARCHIVE_MAX_SIZE", 1500),
+    ],
+)
+def test_validate_schemas_batch_archive_limits(
+    monkeypatch: pytest.MonkeyPatch,
+    admin_token_header: dict[str, str],
+    setting: str,
+    value: int,
+) -> None:
+    monkeypatch.setattr(settings, setting, value)
+    # highly compressible members, e.g., of a zip bomb
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("a.json", " " * 1000)
+        zf.writestr("b.json", " " * 1000)
+    tar = io.BytesIO()
+    with tarfile.open(fileobj=tar, mode="w:gz") as tf:
+        for name in ("a.json", "b.json"):
+            info = tarfile.TarInfo(name)
+            info.size = 1000
+            tf.addfile(info, io.BytesIO(b" " * 1000))
+    for name, content in (("test.zip", archive), ("test.tar.gz", tar)):
+        files = [("files", (name, content.getvalue()))]
+        response = client.post(
+            f"{url_schema}/validate-batch", files=files, headers=admin_token_header
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert name in response.json()["detail"]
+
+
+def test_update_schema(
+    db: Session, schema_manager: SchemaManager, admin_token_header: dict[str, str]
+) -> None:
+    schema = create_schema(db=db, data=sweet_valid, schema_manager=schema_manager)
+    response = client.post(
+        f"{url_schema}/{schema.id}/create_table", headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+
+    new = deepcopy(sweet_valid)
+    new["description"] = "updated"
+    new["fields"].append({"name": "comment", "type": "string"})
+    content = json.dumps(new).encode()
+
+    files = {"file": ("new.json", content)}
+    response = client.put(
+        f"{url_schema}/{schema.id}",
+        files=files,
+        params={"dry_run": True},
+        headers=admin_token_header,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["statements"] == [
+        "ALTER TABLE testsweet ADD COLUMN comment TEXT"
+    ]
+    assert not response.json()["applied"]
+
+    files = {"file": ("new.json", content)}
+    response = client.put(
+        f"{url_schema}/{schema.id}", files=files, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["applied"]
+    db.refresh(schema)
+    assert schema.description == "updated"
+    assert schema.jsonschema == new
+    columns = db.exec(text("SELECT name FROM pragma_table_info('testsweet')")).all()
+    assert "comment" in {c for (c,) in columns}
+    assert response.json()["migration_id"] is None
+    response = client.get(
+        f"{url_schema}/{schema.id}/migration", headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # dropped columns are dropped in the background
+    files = {"file": ("new.json", json.dumps(sweet_valid).encode())}
+    response = client.put(
+        f"{url_schema}/{schema.id}", files=files, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_200_OK
+    migration_id = response.json()["migration_id"]
+    response = client.get(
+        f"{url_schema}/{schema.id}/migration", headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["id"] == migration_id
+    assert response.json()["status"] == "succeeded"
+    columns = db.exec(text("SELECT name FROM pragma_table_info('testsweet')")).all()
+    assert "comment" not in {c for (c,) in columns}
+
+    renamed = {**new, "name": "other"}
+    files = {"file": ("new.json", json.dumps(renamed).encode())}
+    response = client.put(
+        f"{url_schema}/{schema.id}", files=files, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    files = {"file": ("new.json", content)}
+    response = client.put(
+        f"{url_schema}/1234234", files=files, headers=admin_token_header
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    db.exec(text(f"DROP TABLE {sweet_valid['name']}"))
+    db.exec(delete(TableMigration))
+    db.delete(schema)
+    db.commit()
@@ -0,0 +1,139 @@
+from datetime import datetime
+
+import pytest
+
+from app.schema_manager import SchemaManager
+from app.schema_manager.validator import (
+    ColumnChecker,
+    ValidationReport,
+    compile_validator,
+)
+
+from .settings import timeseries
+
+
+def check(checker: ColumnChecker, values: list) -> tuple[list, dict]:
+    report = ValidationReport(n_rows=len(values))
+    return checker(values, report), report.errors
+
+
+def test_column_checker_number():
+    checker = ColumnChecker(
+        {"name": "v", "type": "number", "constraints": {"minimum": 0}}
+    )
+    assert check(checker, ["1.5", 2, ""]) == ([1.5, 2.0, None], {})
+    values, errors = check(checker, ["-1", "x", True, "3"])
+    assert values[3] == 3.0
+    assert errors == {
+        ("v", "is not of type number"): [1, 2],
+        ("v", "is less than 0"): [0],
+    }
+
+
+def test_column_checker_string():
+    checker = ColumnChecker(
+        {
+            "name": "c",
+            "type": "string",
+            "constraints": {"enum": ["CH", "DE"], "pattern": "[A-Z]+", "maxLength": 2},
+        },
+        missing_values=["NA"],
+        required=True,
+    )
+    assert check(checker, ["CH", "DE"]) == (["CH", "DE"], {})
+    _, errors = check(checker, ["NA", None, "FR", "ch", "CH"])
+    assert errors == {
+        ("c", "value is required"): [0, 1],
+        ("c", "does not match [A-Z]+"): [3],
+        ("c", "is not one of ['CH', 'DE']"): [2, 3],
+    }
+
+
+def test_column_checker_length_of_other_types():
+    checker = ColumnChecker(
+        {"name": "n", "type": "integer", "constraints": {"maxLength": 2}}
+    )
+    values, errors = check(checker, ["12", "123"])
+    assert values == [12, 123]
+    assert errors == {("n", "is longer than 2"): [1]}
+
+
+def test_column_checker_datetime():
+    checker = ColumnChecker(
+        {"name": "t", "type": "datetime", "constraints": {"maximum": "2025-01-01"}}
+    )
+    values, errors = check(checker, ["2024-03-01T12:00:00", "2026-01-01T00:00:00"])
+    assert values[0] == datetime(2024, 3, 1, 12)
+    assert errors == {("t", "is greater than 2025-01-01"): [1]}
+    with pytest.raises(ValueError):
+        ColumnChecker({"name": "g", "type": "geopoint"})
+
+
+def test_column_checker_aware_and_naive_datetimes():
+    validator = compile_validator(
+        {
+            "fields": [
+                {
+                    "name": "t",
+                    "type": "datetime",
+                    "constraints": {"minimum": "2020-01-01T00:00:00"},
+                }
+            ]
+        }
+    )
+    # aware values are compared with naive bounds in UTC
+    rows, report = validator.validate_rows(
+        [
+            {"t": "2021-01-01T00:00:00+00:00"},
+            {"t": "2020-01-01T00:30:00+01:00"},
+            {"t": "2019-12-31T23:00:00"},
+        ]
+    )
+    assert report.errors == {("t", "is less than 2020-01-01T00:00:00"): [1, 2]}
+
+    checker = ColumnChecker(
+        {"name": "t", "type": "time", "constraints": {"maximum": "12:00:00"}}
+    )
+    # aware and naive times cannot be compared
+    _, errors = check(checker, ["13:00:00", "11:00:00+01:00"])
+    assert errors == {
+        ("t", "is greater than 12:00:00"): [0],
+        ("t", "cannot be compared with 12:00:00"): [1],
+    }
+
+
+def test_row_validator():
+    validator = compile_validator(timeseries, required=["country", "datetime"])
+    rows = [
+        {"year": "2024", "datetime": "2024-01-01", "country": "CH", "generation": 1},
+        {"year": "x", "datetime": ""},
+        {"year": 2024, "datetime": "2024-01-01", "country": "CH", "other": 1},
+    ]
+    values, report = validator.validate_rows(rows)
+    assert values[0] == (2024, datetime(2024, 1, 1), "CH", 1.0)
+    assert not report.valid
+    assert report.invalid_rows == [1, 2]
+    assert report.messages(offset=1) == [
+        "*: unknown fields ['other'] (row 3)",
+        "year: is not of type integer (row 2)",
+        "datetime: value is required (row 2)",
+        "country: value is required (row 2)",
+    ]
+
+    values, report = validator.validate_rows([])
+    assert values == [] and report.valid
+
+
+def test_validation_report_messages():
+    report = ValidationReport(n_rows=20)
+    report.add("v", "is less than 0", list(range(12)))
+    report.add("v", "is not of type number", [])
+    assert report.messages() == [
+        "v: is less than 0 (rows 0, 1, 2, 3, 4, 5, 6, 7, 8, 9 and 2 more)"
+    ]
+
+
+def test_row_validator_cache():
+    assert SchemaManager.row_validator(timeseries) is SchemaManager.row_validator(
+        dict(timeseries)
+    )
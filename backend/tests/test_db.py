@@ -0,0 +1,52 @@
+import json
+
+from sqlmodel import Session, SQLModel, create_engine, inspect, text
+
+from app.api.crud.schema import backfill_schemas
+from app.core.db import add_missing_columns
+from app.schema_manager import SchemaManager
+
+from .schema.settings import sweet_valid
+
+
+def test_add_missing_columns(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    # the tables of an earlier version without the columns added since
+    with engine.begin() as conn:
+        for table, column in [
+            ("tableschema", "schema_hash"),
+            ("tableschema", "updated_at"),
+            ("ingestionjob", "attempts"),
+            ("ingestionjob", "heartbeat_at"),
+        ]:
+            conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
+        conn.execute(
+            text(
+                "INSERT INTO tableschema (name, description, jsonschema, is_active) "
+                "VALUES (:name, :description, :jsonschema, 1)"
+            ),
+            {
+                "name": sweet_valid["name"],
+                "description": sweet_valid["description"],
+                "jsonschema": json.dumps(sweet_valid),
+            },
+        )
+
+    assert sorted(add_missing_columns(engine)) == [
+        "ingestionjob.attempts",
+        "ingestionjob.heartbeat_at",
+        "tableschema.schema_hash",
+        "tableschema.updated_at",
+    ]
+    columns = {c["name"]: c for c in inspect(engine).get_columns("ingestionjob")}
+    assert not columns["attempts"]["nullable"]
+    assert add_missing_columns(engine) == []
+
+    with Session(engine) as db:
+        assert backfill_schemas(db=db) == 1
+        schema = db.exec(text("SELECT * FROM tableschema")).one()
+        assert schema.schema_hash == SchemaManager.schema_hash(sweet_valid)
+        assert schema.updated_at is not None
+        assert backfill_schemas(db=db) == 0
+    engine.dispose()
@@ -0,0 +1,45 @@
+import asyncio
+from copy import deepcopy
+
+import pytest
+from jsonschema.exceptions import ValidationError
+
+from app.core import workers
+from app.core.config import settings
+from app.schema_manager import SchemaManager, SchemaReferenceError
+
+from .schema.settings import sweet_valid
+
+
+def test_get_process_pool(monkeypatch):
+    pool = workers.get_process_pool()
+    assert pool is not None
+    assert workers.get_process_pool() is pool
+    workers.shutdown_process_pool()
+    assert workers._pool is None
+    monkeypatch.setattr(settings, "SCHEMA_VALIDATION_WORKERS", 0)
+    assert workers.get_process_pool() is None
+
+
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_validate_schema_async(use_pool: bool):
+    executor = workers.get_process_pool() if use_pool else None
+    manager = SchemaManager()
+
+    async def validate(schema):
+        return await manager.validate_schema_async(schema, executor=executor)
+
+    assert asyncio.run(validate(str(sweet_valid).encode())) == sweet_valid
+
+    # errors are raised in the calling process
+    with pytest.raises(ValidationError):
+        asyncio.run(validate({"name": "test"}))
+    schema = deepcopy(sweet_valid)
+    schema["primaryKey"] = ["invalid", "id"]
+    schema["valueField"] = {"field": "invalid", "unit": "MWh"}
+    with pytest.raises(SchemaReferenceError) as exc_info:
+        asyncio.run(validate(schema))
+    assert len(exc_info.value.errors) == 2
+    with pytest.raises(ValueError):
+        asyncio.run(validate(b"{"))
+    workers.shutdown_process_pool()